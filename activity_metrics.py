@@ -0,0 +1,250 @@
+# activity_metrics.py
+# Метрики симулятора нагрузки (simulate_activity.py): задержка каждой операции
+# из QUERY_FUNCTION_MAP попадает в гистограмму с логарифмическими корзинами
+# (metrics.Histogram) под именем операции, ошибки считаются по классам
+# исключений. В конце прогона печатается таблица и пишется отчет JSON.
+# В открытом цикле задержка считается от запланированного момента запуска;
+# отдельно копится, насколько запуск отстал от расписания (start_delay).
+import collections
+import json
+import math
+import time
+
+from metrics import Histogram
+
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class OperationStats:
+    """Одна операция: гистограмма задержки успешных выполнений (секунды) и ошибки."""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = collections.Counter()   # имя класса исключения -> число
+
+    @property
+    def count(self):
+        return self.latency.count
+
+    @property
+    def error_count(self):
+        return sum(self.errors.values())
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.errors.update(other.errors)
+        return self
+
+    def to_dict(self, elapsed):
+        latency = self.latency
+        data = {
+            "count": self.count,
+            "errors": self.error_count,
+            "ops_per_sec": self.count / elapsed if elapsed > 0 else 0.0,
+            "mean_sec": latency.mean,
+            "min_sec": latency.min or 0.0,
+        }
+        data.update({f"p{q:g}_sec": latency.percentile(q) for q in REPORT_PERCENTILES})
+        data["max_sec"] = latency.max or 0.0
+        data["error_types"] = dict(self.errors)
+        data["latency_buckets"] = latency.to_dict()["buckets"]
+        return data
+
+
+class ActivityMetrics:
+    def __init__(self):
+        self.operations = {}
+        self.load_profile = {}         # режим нагрузки: замкнутый цикл пользователей или интенсивность открытого
+        self.start_delay = Histogram()  # открытый цикл: запуск операции позже запланированного (лимит в полете)
+        self.unstarted = 0              # открытый цикл: запланированные, но не запущенные к концу прогона
+        self.pool = None                # db_pool.PoolStats: очереди клиента - ожидание соединения и потока
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def merge(self, other):
+        """Добавляет метрики другого процесса нагрузки; окно измерения - от первого старта до последнего финиша."""
+        for name, stats in other.operations.items():
+            self.operation(name).merge(stats)
+        self.start_delay.merge(other.start_delay)
+        self.unstarted += other.unstarted
+        if other.pool is not None:
+            self.pool = other.pool if self.pool is None else self.pool.merge(other.pool)
+        # perf_counter - монотонные часы системы, общие для процессов одной машины
+        if other.started_at is not None:
+            self.started_at = other.started_at if self.started_at is None else min(self.started_at, other.started_at)
+        if other.finished_at is not None:
+            self.finished_at = other.finished_at if self.finished_at is None else max(self.finished_at, other.finished_at)
+        return self
+
+    def operation(self, name):
+        stats = self.operations.get(name)
+        if stats is None:
+            stats = self.operations[name] = OperationStats()
+        return stats
+
+    def record(self, name, seconds):
+        self.operation(name).latency.record(seconds)
+
+    def record_error(self, name, exc):
+        self.operation(name).errors[type(exc).__name__] += 1
+
+    def record_start_delay(self, seconds):
+        self.start_delay.record(seconds)
+
+    def total(self):
+        total = OperationStats()
+        for stats in self.operations.values():
+            total.merge(stats)
+        return total
+
+    def print_report(self):
+        elapsed = self.elapsed
+        header = (f"{'operation':<28} {'count':>8} {'errors':>7} {'ops/s':>9} "
+                  + " ".join(f"{f'p{q:g} ms':>10}" for q in REPORT_PERCENTILES) + f" {'max ms':>10}")
+        print(f"--- Operations over {elapsed:.1f}s ---")
+        print(header)
+        rows = sorted(self.operations.items(), key=lambda item: -item[1].count)
+        for name, stats in rows + [("TOTAL", self.total())]:
+            latency = stats.latency
+            print(f"{name:<28} {stats.count:>8} {stats.error_count:>7} {stats.count / max(elapsed, 1e-9):>9.1f} "
+                  + " ".join(f"{latency.percentile(q) * 1000:>10.1f}" for q in REPORT_PERCENTILES)
+                  + f" {(latency.max or 0.0) * 1000:>10.1f}")
+        target = self.load_profile.get("target_ops_per_sec")
+        if target:
+            total = self.total()
+            behind = f", {self.unstarted} scheduled operations not started (the database fell behind)" if self.unstarted else ""
+            print(f"Target {target:g} ops/s, completed {(total.count + total.error_count) / max(elapsed, 1e-9):.1f} ops/s{behind}")
+        if self.start_delay.count:
+            delay = self.start_delay
+            print(f"Start delay behind schedule: p50 {delay.percentile(50) * 1000:.1f} ms, "
+                  f"p99 {delay.percentile(99) * 1000:.1f} ms, max {(delay.max or 0.0) * 1000:.1f} ms")
+        if self.pool is not None:
+            self.pool.print_report()
+
+    def to_dict(self):
+        elapsed = self.elapsed
+        return {
+            "elapsed_sec": elapsed,
+            "load": self.load_profile,
+            "start_delay_sec": self.start_delay.summary() if self.start_delay.count else None,
+            "unstarted": self.unstarted,
+            "pool": self.pool.to_dict() if self.pool is not None else None,
+            "total": self.total().to_dict(elapsed),
+            "operations": {name: stats.to_dict(elapsed) for name, stats in sorted(self.operations.items())},
+        }
+
+    def write_report(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"Activity report written to {path}.")
+
+
+class CapacityCurve:
+    """
+    Ступенчатый подъем нагрузки (simulate_activity.py --ramp): пропускная способность
+    и хвост задержки на каждой ступени. Подъем останавливается, когда p99 превышает
+    p99_limit_sec или нагрузка перестала превращаться в пропускную способность:
+    для пользователей (замкнутый цикл) прирост ops/s над лучшей ступенью меньше
+    min_gain от относительного прироста числа пользователей; для интенсивности
+    (открытый цикл) выполнено меньше заданной на долю больше max_shortfall.
+    Точка насыщения - лучшая ступень до остановки.
+    """
+
+    def __init__(self, unit, p99_limit_sec, min_gain=0.5, max_shortfall=0.05):
+        self.unit = unit              # "users" или "ops/s" - что задает уровень ступени
+        self.p99_limit_sec = p99_limit_sec
+        self.min_gain = min_gain
+        self.max_shortfall = max_shortfall
+        self.steps = []               # словари ступеней в порядке подъема
+        self.saturation = None        # ступень насыщения или None, если не достигнута
+        self.stop_reason = None
+
+    @staticmethod
+    def _step(level, metrics):
+        total = metrics.total()
+        elapsed = max(metrics.elapsed, 1e-9)
+        step = {
+            "level": level,
+            "ops_per_sec": total.count / elapsed,
+            "errors_per_sec": total.error_count / elapsed,
+            "completed_per_sec": (total.count + total.error_count) / elapsed,
+        }
+        step.update({f"p{q:g}_sec": total.latency.percentile(q) for q in REPORT_PERCENTILES})
+        step["max_sec"] = total.latency.max or 0.0
+        step["start_delay_p99_sec"] = metrics.start_delay.percentile(99)
+        step["operations"] = metrics.to_dict()["operations"]
+        return step
+
+    def add_step(self, level, metrics, offered_rate=None):
+        """
+        Добавляет измеренную ступень; возвращает причину остановки подъема или None.
+        offered_rate - заданная интенсивность открытого цикла, ops/s.
+        """
+        step = self._step(level, metrics)
+        best = max(self.steps, key=lambda s: s["ops_per_sec"]) if self.steps else None
+        self.steps.append(step)
+        if step["p99_sec"] > self.p99_limit_sec:
+            self.stop_reason = f"p99 {step['p99_sec'] * 1000:.0f} ms exceeds {self.p99_limit_sec * 1000:.0f} ms"
+        elif offered_rate:
+            # Открытый цикл: база либо успевает за расписанием, либо отстает - сравнение
+            # с предыдущей ступенью не нужно, а фиксированный шаг на высоких уровнях мал.
+            # Допуск не меньше трех сигм пуассоновского числа прибытий за окно
+            expected = offered_rate * max(metrics.elapsed, 1e-9)
+            shortfall = max(self.max_shortfall, 3 / math.sqrt(expected))
+            if step["completed_per_sec"] < offered_rate * (1 - shortfall):
+                self.stop_reason = (f"completed {step['completed_per_sec']:.1f} of {offered_rate:g} offered ops/s "
+                                    f"(more than {shortfall:.0%} behind)")
+        elif best is not None and best["level"] > 0 and level > best["level"]:
+            # Требуемый прирост пропорционален относительному шагу: +10 пользователей к 100 - это +10% нагрузки
+            load_gain = level / best["level"] - 1
+            required = best["ops_per_sec"] * (1 + self.min_gain * load_gain)
+            if step["ops_per_sec"] < required:
+                self.stop_reason = (f"throughput {step['ops_per_sec']:.1f} ops/s grew less than "
+                                    f"{self.min_gain * load_gain:.1%} over {best['ops_per_sec']:.1f} ops/s "
+                                    f"for {load_gain:.0%} more {self.unit}")
+        if self.stop_reason:
+            self.saturation = best
+        return self.stop_reason
+
+    def print_report(self):
+        print(f"--- Capacity curve ({self.unit}) ---")
+        print(f"{'level':>8} {'ops/s':>9} {'err/s':>7} " + " ".join(f"{f'p{q:g} ms':>10}" for q in REPORT_PERCENTILES))
+        for step in self.steps:
+            marker = "  <- saturation point" if step is self.saturation else ""
+            print(f"{step['level']:>8g} {step['ops_per_sec']:>9.1f} {step['errors_per_sec']:>7.1f} "
+                  + " ".join(f"{step[f'p{q:g}_sec'] * 1000:>10.1f}" for q in REPORT_PERCENTILES) + marker)
+        if self.saturation is not None:
+            print(f"Saturation point: {self.saturation['level']:g} {self.unit}, {self.saturation['ops_per_sec']:.1f} ops/s, "
+                  f"p99 {self.saturation['p99_sec'] * 1000:.1f} ms. Stopped: {self.stop_reason}.")
+        elif self.stop_reason:
+            print(f"Stopped at the first step: {self.stop_reason}; start the ramp lower.")
+        else:
+            print("Saturation not reached at the last level; raise the ramp maximum.")
+
+    def to_dict(self):
+        return {
+            "unit": self.unit,
+            "p99_limit_sec": self.p99_limit_sec,
+            "min_gain": self.min_gain,
+            "max_shortfall": self.max_shortfall,
+            "steps": self.steps,
+            "saturation_level": self.saturation["level"] if self.saturation is not None else None,
+            "stop_reason": self.stop_reason,
+        }
+
+    def write_report(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"Capacity curve written to {path}.")
@@ -0,0 +1,123 @@
+# batch_tuner.py
+# Подбор числа строк в одном INSERT для каждой таблицы во время прогона.
+# Широкие строки (Review с комментарием до 500 символов) и узкие (OrdersItem)
+# требуют очень разных размеров, а один BATCH_SIZE на все таблицы оставляет
+# скорость неиспользованной. Тюнер удваивает размер, пока строки/с растут,
+# возвращается к лучшему размеру, когда рост кончился, и сокращает размер
+# при таймаутах, блокировках и превышении лимита параметров.
+from bulk_writer import MODE_VALUES, classify_error, max_rows_per_statement
+
+# fast_executemany не ограничен 2100 параметрами, но большой оператор держит
+# много блокировок строк: при ~5000 на таблицу SQL Server эскалирует их до блокировки таблицы
+MAX_EXECUTEMANY_ROWS = 4000
+
+
+class BatchTuner:
+    """
+    Размер одного INSERT для таблицы; общий для всех вставщиков таблицы.
+    Каждые samples операторов сравнивается скорость (строк/с) на текущем размере:
+    пока она растет больше чем на min_gain, размер удваивается (до потолка), потом
+    фиксируется лучший; если не помогло первое же удвоение, размер так же делится пополам. Раз в reprobe_every окон удвоение пробуется снова - условия
+    на сервере меняются. Оператор дольше latency_limit_sec или ошибка таймаута/блокировки
+    вдвое уменьшают размер; отказ по лимиту параметров еще и опускает потолок навсегда.
+    """
+
+    def __init__(self, table, num_columns, initial_size=100, mode=MODE_VALUES, samples=8,
+                 latency_limit_sec=2.0, min_gain=0.05, reprobe_every=50):
+        self.table = table
+        if mode == MODE_VALUES:
+            self.max_size = max_rows_per_statement(num_columns)
+        else:
+            self.max_size = MAX_EXECUTEMANY_ROWS
+        self.size = max(1, min(initial_size, self.max_size))
+        self.samples = samples
+        self.latency_limit_sec = latency_limit_sec
+        self.min_gain = min_gain
+        self.reprobe_every = reprobe_every
+        self.probing = True
+        self._step_up = True            # направление пробы: удвоение или деление пополам
+        self._probe_start = self.size
+        self.best_size = None
+        self.best_rate = 0.0
+        self.backoffs = 0
+        self._rows = 0
+        self._seconds = 0.0
+        self._count = 0
+        self._steady_windows = 0
+
+    def _reset_window(self):
+        self._rows = 0
+        self._seconds = 0.0
+        self._count = 0
+
+    def record(self, rows, seconds):
+        """Успешный оператор из rows строк, выполненный за seconds."""
+        if seconds > self.latency_limit_sec and self.size > 1:
+            self._back_off()
+            return
+        self._rows += rows
+        self._seconds += seconds
+        self._count += 1
+        if self._count >= self.samples:
+            self._evaluate(self._rows / max(self._seconds, 1e-9))
+            self._reset_window()
+
+    def _evaluate(self, rate):
+        if not self.probing:
+            self._steady_windows += 1
+            if self._steady_windows >= self.reprobe_every and self.size < self.max_size:
+                # Новый замер текущего размера - база для сравнения с удвоенным
+                self.best_size, self.best_rate = self.size, rate
+                self._probe_start = self.size
+                self._step_up = True
+                self.size = min(self.max_size, self.size * 2)
+                self.probing = True
+            return
+        if self.best_size is None or rate > self.best_rate * (1 + self.min_gain):
+            self.best_size, self.best_rate = self.size, rate
+            next_size = min(self.max_size, self.size * 2) if self._step_up else max(1, self.size // 2)
+            if next_size != self.size:
+                self.size = next_size
+                return
+        elif self._step_up and self.best_size == self._probe_start and self.best_size > 1:
+            # Удвоение сразу не помогло: начальный размер мог быть велик - пробуем вниз
+            self._step_up = False
+            self.size = self.best_size // 2
+            return
+        else:
+            self.size = self.best_size
+        self.probing = False
+        self._steady_windows = 0
+
+    def _back_off(self, ceiling=None):
+        if ceiling is not None:
+            self.max_size = max(1, min(self.max_size, ceiling))
+        self.size = max(1, min(self.size // 2, self.max_size))
+        if self.best_size is not None and self.best_size > self.size:
+            self.best_size, self.best_rate = self.size, 0.0
+        self.probing = False
+        self._steady_windows = 0
+        self.backoffs += 1
+        self._reset_window()
+
+    def record_failure(self, rows, exc):
+        """
+        Упавший оператор из rows строк. True - оператор не выполнялся (лимит параметров),
+        и те же строки можно сразу повторить с новым, меньшим размером.
+        """
+        kind = classify_error(exc)
+        if kind == "parameters" and rows > 1:
+            self._back_off(rows - 1)
+            return True
+        if kind == "contention" and rows > 1:
+            self._back_off()
+        return False
+
+    def to_dict(self):
+        return {
+            "size": self.size,
+            "max_size": self.max_size,
+            "best_rows_per_sec": self.best_rate,
+            "probing": self.probing,
+            "backoffs": self.backoffs,
+        }
@@ -0,0 +1,119 @@
+# booking_timeline.py
+# Бронирования без пересечений: для каждого столика ведется отсортированный
+# список занятых слотов (моменты начала, поиск через bisect), и новое
+# бронирование ставится только в свободный слот столика подходящей вместимости.
+# Слот длится столько же, сколько окно проверки занятости в симуляторе
+# (read_available_tables: +-2 часа), поэтому запрос доступности видит
+# реалистичную селективность. Брони одной пачки возвращаются в порядке времени.
+# Брони, уже лежащие в базе (прошлые прогоны, симулятор), передаются в place()
+# как занятые слоты: новые не пересекаются и с ними.
+import datetime
+from bisect import bisect_left, bisect_right, insort
+
+BOOKING_SLOT_MINUTES = 120
+
+# Размер компании -> вес. В Booking нет числа гостей: размер компании только
+# определяет, какие столики (RestaurantTable.max) ей подходят
+PARTY_SIZE_WEIGHTS = {1: 6, 2: 38, 3: 14, 4: 20, 5: 6, 6: 8, 7: 3, 8: 5}
+
+# Компанию сажают за столик с вместимостью не больше размера + CAPACITY_SLACK,
+# за большие - только если таких нет
+CAPACITY_SLACK = 2
+PLACEMENT_ATTEMPTS = 8
+
+
+class TableTimeline:
+    """Моменты начала броней одного столика (секунды от начала окна) в порядке возрастания."""
+
+    __slots__ = ("starts",)
+
+    def __init__(self):
+        self.starts = []
+
+    def is_free(self, t, slot):
+        i = bisect_left(self.starts, t)
+        if i and t - self.starts[i - 1] < slot:
+            return False
+        return i == len(self.starts) or self.starts[i] - t >= slot
+
+    def next_free(self, t, slot):
+        """Самый ранний момент >= t, в который слот свободен."""
+        i = bisect_right(self.starts, t - slot)
+        while i < len(self.starts) and self.starts[i] - t < slot:
+            t = max(t, self.starts[i] + slot)
+            i += 1
+        return t
+
+    def add(self, t):
+        insort(self.starts, t)
+
+
+class BookingPlanner:
+    """
+    table_capacities - {TableID: max}. place() раскладывает брони одного отрезка
+    времени; занятость хранится только внутри отрезка (плюс переданные брони из базы),
+    а последний слот отрезка заканчивается до его конца - поэтому отрезки (пачки)
+    независимы друг от друга, и пачку можно пересчитать после --resume без истории предыдущих.
+    """
+
+    def __init__(self, table_capacities, slot_minutes=BOOKING_SLOT_MINUTES, party_size_weights=PARTY_SIZE_WEIGHTS):
+        ordered = sorted(table_capacities.items(), key=lambda item: (item[1], item[0]))
+        self.table_ids = [table_id for table_id, _ in ordered]
+        self.capacities = [capacity for _, capacity in ordered]
+        self.slot = slot_minutes * 60
+        self.party_sizes = list(party_size_weights)
+        self.party_weights = list(party_size_weights.values())
+        self.skipped = 0   # брони, для которых в отрезке не нашлось свободного слота
+
+    def _candidate_range(self, party_size):
+        """Индексы столиков по размеру: от наименьшей подходящей вместимости до нее же + CAPACITY_SLACK."""
+        low = bisect_left(self.capacities, party_size)
+        if low == len(self.capacities):
+            # Компания больше любого столика: самые вместительные
+            low = bisect_left(self.capacities, self.capacities[-1])
+        high = bisect_right(self.capacities, self.capacities[low] + CAPACITY_SLACK)
+        return low, high
+
+    def place(self, rng, count, start, end, occupied=()):
+        """
+        До count броней в [start, end): список (момент, TableID) по возрастанию времени.
+        rng - random.Random отрезка. occupied - уже существующие брони [(момент, TableID)],
+        начинающиеся в (start - слот, end): их слоты заняты. Брони начинаются не позже
+        end - слот, поэтому отрезок должен быть в несколько слотов; в отрезок короче
+        слота не ставится ни одна - все считаются в skipped.
+        """
+        if not self.table_ids:
+            return []
+        start = start.replace(microsecond=0)
+        last_start = int((end - start).total_seconds()) - self.slot
+        if last_start < 0:
+            self.skipped += count
+            return []
+        timelines = {}
+        for moment, table_id in occupied:
+            timelines.setdefault(table_id, TableTimeline()).add((moment - start) // datetime.timedelta(seconds=1))
+        placed = []
+        party_sizes = rng.choices(self.party_sizes, self.party_weights, k=count)
+        for t, party_size in zip(sorted(rng.randint(0, last_start) for _ in range(count)), party_sizes):
+            low, high = self._candidate_range(party_size)
+            table_id = None
+            for attempt in range(PLACEMENT_ATTEMPTS):
+                # Половина попыток - среди столиков по размеру, остальные - среди всех подходящих
+                upper = high if attempt < PLACEMENT_ATTEMPTS // 2 else len(self.table_ids)
+                candidate = self.table_ids[rng.randrange(low, upper)]
+                timeline = timelines.get(candidate)
+                if timeline is None or timeline.is_free(t, self.slot):
+                    table_id = candidate
+                    break
+            slot_start = t
+            if table_id is None:
+                # Все попытки заняты: ближайший свободный слот последнего кандидата в пределах отрезка
+                slot_start = timelines[candidate].next_free(t, self.slot)
+                if slot_start > last_start:
+                    self.skipped += 1
+                    continue
+                table_id = candidate
+            timelines.setdefault(table_id, TableTimeline()).add(slot_start)
+            placed.append((slot_start, table_id))
+        placed.sort()
+        return [(start + datetime.timedelta(seconds=s), table_id) for s, table_id in placed]
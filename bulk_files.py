@@ -0,0 +1,319 @@
+# bulk_files.py
+# Режим выгрузки в файлы: генератор пишет каждую таблицу в секционированные
+# текстовые файлы в формате bcp -c (поля через TAB, строки через \n, UTF-8)
+# с заранее выданными ключами, без ODBC. Загрузчик (load_directory, скрипт
+# load_files.py) вливает секции на сервере через BULK INSERT ... TABLOCK.
+# Параллельно (несколькими потоками) грузятся только кучи: блокировки BU
+# совместимы лишь для таблиц без кластерного индекса, а в таблицу с ним
+# BULK INSERT с TABLOCK берет X-блокировку и потоки все равно идут по одному.
+# Такие таблицы грузятся одним потоком, а секции, в которых строки идут по
+# возрастанию ключа, - с подсказкой ORDER: серверу не нужна сортировка.
+# Снимки (snapshot.py) пишутся без потерь (lossless=True): разделители -
+# управляющие символы ASCII, а пустая строка - один символ NUL, как ее пишет
+# bcp -c (пустое поле при KEEPNULLS - это NULL). Текст с такими символами
+# не выгружается вовсе, а не искажается.
+import asyncio
+import datetime
+import gzip
+import json
+import ntpath
+import os
+import posixpath
+import time
+
+FIELD_TERMINATOR = "\t"
+ROW_TERMINATOR = "\n"
+LOSSLESS_FIELD_TERMINATOR = "\x1f"    # разделитель элементов (US)
+LOSSLESS_ROW_TERMINATOR = "\x1e\n"   # разделитель записей (RS); перевод строки - для чтения глазами
+EMPTY_STRING_FIELD = "\0"
+# Запись терминатора в файле формата
+_FORMAT_FILE_ESCAPES = {"\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"}
+MANIFEST_NAME = "manifest.json"
+COMPRESSED_SUFFIX = ".gz"   # сжатые секции (снимки snapshot.py); BULK INSERT читает только распакованные
+
+# Порядок загрузки: родительские таблицы раньше дочерних
+LOAD_ORDER = (
+    "dbo.Booking_status", "dbo.Client", "dbo.Restaraunt", "dbo.RestaurantTable", "dbo.Menu",
+    "dbo.Booking", "dbo.Orders", "dbo.OrdersItem", "dbo.Payments", "dbo.Review",
+)
+
+BULK_INSERT_SQL = (
+    "BULK INSERT {table} FROM '{data_file}' WITH ("
+    "FORMATFILE = '{format_file}', DATAFILETYPE = 'char', CODEPAGE = '65001', "
+    "KEEPIDENTITY, KEEPNULLS, TABLOCK, BATCHSIZE = {batch_size}{order})"
+)
+# Ключ кластерного индекса; пусто - куча
+CLUSTERED_KEY_SQL = (
+    "SELECT c.name, ic.is_descending_key FROM sys.index_columns ic "
+    "JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id "
+    "WHERE ic.object_id = OBJECT_ID(?) AND ic.index_id = 1 AND ic.key_ordinal > 0 ORDER BY ic.key_ordinal"
+)
+
+
+def format_field(value, lossless=False):
+    """
+    Значение -> поле файла. None - пустое поле (NULL при KEEPNULLS).
+    lossless=True - пустая строка пишется как NUL, а текст с разделителями
+    снимка или NUL вызывает ValueError.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        if value.microsecond:
+            # Миллисекунды - точность DATETIME; больше знаков DATETIME из строки не примет
+            return value.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    text = str(value)
+    if lossless:
+        if not text:
+            return EMPTY_STRING_FIELD
+        if "\x1f" in text or "\x1e" in text or "\0" in text:
+            raise ValueError(f"Value {text!r} contains a snapshot terminator or NUL and cannot be written losslessly")
+        return text
+    # В формате bcp -c нет экранирования: разделители внутри текста заменяются пробелом
+    if "\t" in text or "\n" in text or "\r" in text:
+        text = text.replace("\t", " ").replace("\r", " ").replace("\n", " ")
+    return text
+
+
+def _table_dir_name(table):
+    return table.replace("dbo.", "")
+
+
+def data_file_path(rel_path):
+    """Путь секции, которую читает BULK INSERT: сжатая секция сначала распаковывается рядом."""
+    return rel_path[:-len(COMPRESSED_SUFFIX)] if rel_path.endswith(COMPRESSED_SUFFIX) else rel_path
+
+
+class FileEmitPool:
+    """
+    Заменяет пул соединений в режиме выгрузки. Курсор копит строки транзакции до
+    commit (rollback их отбрасывает), так что в файлы попадают только "закоммиченные"
+    пачки - как и в базе. Пачки каждой таблицы раскладываются по partitions файлам
+    по кругу: секции потом грузятся параллельными потоками. Для каждой секции в манифесте
+    отмечается, идут ли ее строки строго по возрастанию первого столбца (ключа), -
+    тогда загрузчик дает BULK INSERT подсказку ORDER.
+    compress=True - секции пишутся сжатыми gzip (снимки snapshot.py).
+    lossless=True - разделители и пустые строки снимка (см. format_field);
+    разделители записываются в манифест, и загрузчик строит по ним файл формата.
+    """
+
+    def __init__(self, directory, partitions=4, compress=False, lossless=False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.partitions = max(1, partitions)
+        self.compress = compress
+        self.lossless = lossless
+        if lossless:
+            self.field_terminator, self.row_terminator = LOSSLESS_FIELD_TERMINATOR, LOSSLESS_ROW_TERMINATOR
+        else:
+            self.field_terminator, self.row_terminator = FIELD_TERMINATOR, ROW_TERMINATOR
+        self.tables = {}    # table -> {"columns": [...], "files": [...], "rows": n} (манифест)
+        self._handles = {}  # table -> [открытые файлы секций]
+        self._next_part = {}
+        self._last_keys = {}  # table -> [первый столбец последней строки каждой секции]
+
+    def acquire(self):
+        return FileConnection(self)
+
+    def write_batch(self, table, columns, rows):
+        info = self.tables.get(table)
+        if info is None:
+            info = self.tables[table] = {"columns": list(columns), "files": [], "sorted": [], "rows": 0}
+            self._handles[table] = []
+            self._last_keys[table] = []
+            self._next_part[table] = 0
+        elif list(columns) != info["columns"]:
+            raise ValueError(f"{table}: columns {columns} differ from {info['columns']} written earlier")
+        part = self._next_part[table]
+        self._next_part[table] = (part + 1) % self.partitions
+        handles = self._handles[table]
+        if part == len(handles):
+            name = _table_dir_name(table)
+            os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+            rel_path = f"{name}/{name}.{part:05d}.tsv"
+            if self.compress:
+                rel_path += COMPRESSED_SUFFIX
+                # Уровень 1: сжатие в несколько раз при скорости, сравнимой с чтением из базы
+                handles.append(gzip.open(os.path.join(self.directory, rel_path), "wt", compresslevel=1,
+                                         encoding="utf-8", newline=""))
+            else:
+                handles.append(open(os.path.join(self.directory, rel_path), "w", encoding="utf-8", newline=""))
+            info["files"].append(rel_path)
+            info["sorted"].append(True)
+            self._last_keys[table].append(None)
+        if rows and info["sorted"][part]:
+            last_keys = self._last_keys[table]
+            keys = [row[0] for row in rows]
+            info["sorted"][part] = (last_keys[part] is None or last_keys[part] < keys[0]) and all(
+                a < b for a, b in zip(keys, keys[1:]))
+            last_keys[part] = keys[-1]
+        lossless, field_terminator, row_terminator = self.lossless, self.field_terminator, self.row_terminator
+        handles[part].writelines(
+            field_terminator.join(format_field(value, lossless) for value in row) + row_terminator for row in rows)
+        info["rows"] += len(rows)
+
+    def write_manifest(self):
+        with open(os.path.join(self.directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump({"tables": self.tables, "terminators": [self.field_terminator, self.row_terminator]},
+                      f, ensure_ascii=False, indent=2)
+
+    def close(self):
+        for handles in self._handles.values():
+            for f in handles:
+                f.close()
+        self._handles = {}
+        self.write_manifest()
+
+    async def wait_closed(self):
+        pass
+
+
+class FileConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self._pending = []   # (table, columns, rows) текущей транзакции
+
+    def cursor(self):
+        return FileCursor(self)
+
+    def buffer_rows(self, table, columns, rows):
+        self._pending.append((table, columns, rows))
+
+    async def commit(self):
+        for table, columns, rows in self._pending:
+            self.pool.write_batch(table, columns, rows)
+        self._pending = []
+
+    async def rollback(self):
+        self._pending = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._pending = []
+
+
+class FileCursor:
+    """Курсор режима выгрузки: принимает только пачки строк от bulk_writer.bulk_insert."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write_rows(self, table, columns, rows):
+        self.connection.buffer_rows(table, columns, rows)
+
+    async def execute(self, sql, *params):
+        raise RuntimeError("SQL statements are not available in file-emit mode")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+        return json.load(f)["tables"]
+
+
+def read_terminators(directory):
+    """(разделитель полей, разделитель строк) выгрузки; у выгрузок без записи в манифесте - TAB и \\n."""
+    with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+        return tuple(json.load(f).get("terminators", (FIELD_TERMINATOR, ROW_TERMINATOR)))
+
+
+def _format_file_terminator(terminator):
+    return "".join(_FORMAT_FILE_ESCAPES.get(char, char) for char in terminator)
+
+
+def build_format_file(columns, server_ordinals, field_terminator=FIELD_TERMINATOR, row_terminator=ROW_TERMINATOR):
+    """
+    Неформатированный (non-XML) файл формата: поле i файла -> столбец таблицы по его
+    порядковому номеру на сервере, так что порядок столбцов в файле может отличаться от таблицы.
+    """
+    lines = ["10.0", str(len(columns))]
+    for i, column in enumerate(columns, start=1):
+        terminator = _format_file_terminator(row_terminator if i == len(columns) else field_terminator)
+        lines.append(f'{i}\tSQLCHAR\t0\t0\t"{terminator}"\t{server_ordinals[column]}\t{column}\t""')
+    return "\n".join(lines) + "\n"
+
+
+async def _server_ordinals(cur, table):
+    await cur.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?) ORDER BY column_id", table)
+    return {row[0]: ordinal for ordinal, row in enumerate(await cur.fetchall(), start=1)}
+
+
+async def _clustered_key(cur, table):
+    await cur.execute(CLUSTERED_KEY_SQL, table)
+    return await cur.fetchall()
+
+
+async def _load_file(pool, semaphore, table, data_file, format_file, batch_size, order=""):
+    async with semaphore:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute(BULK_INSERT_SQL.format(
+                        table=table, data_file=data_file.replace("'", "''"),
+                        format_file=format_file.replace("'", "''"), batch_size=batch_size, order=order))
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+
+async def load_directory(pool, directory, server_directory=None, streams=4, batch_size=100000):
+    """
+    Загружает выгрузку directory в порядке LOAD_ORDER. Секции кучи идут
+    параллельно (streams соединений), секции таблицы с кластерным индексом - по
+    одной; таблицы - по очереди, чтобы внешние ключи всегда ссылались на уже
+    загруженные строки. server_directory - тот же каталог,
+    как его видит SQL Server (по умолчанию совпадает с локальным путем).
+    Сжатые секции грузятся из распакованных рядом копий (см. snapshot.py).
+    Возвращает {table: (строк, секунд)}.
+    """
+    tables = read_manifest(directory)
+    field_terminator, row_terminator = read_terminators(directory)
+    server_directory = server_directory or os.path.abspath(directory)
+    # Пути собираются в стиле сервера: Windows-каталог - через обратную косую черту
+    server_join = ntpath.join if "\\" in server_directory else posixpath.join
+    timings = {}
+    for table in LOAD_ORDER:
+        info = tables.get(table)
+        if not info or not info["files"]:
+            continue
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                ordinals = await _server_ordinals(cur, table)
+                clustered_key = await _clustered_key(cur, table)
+        missing = [c for c in info["columns"] if c not in ordinals]
+        if missing:
+            raise ValueError(f"{table}: columns {missing} not found on the server")
+        format_name = f"{_table_dir_name(table)}.fmt"
+        with open(os.path.join(directory, format_name), "w", encoding="utf-8") as f:
+            f.write(build_format_file(info["columns"], ordinals, field_terminator, row_terminator))
+
+        table_streams = max(1, streams) if not clustered_key else 1
+        # ORDER - только если кластерный ключ - первый столбец файла по возрастанию
+        ordered_key = (len(clustered_key) == 1 and not clustered_key[0][1]
+                       and clustered_key[0][0] == info["columns"][0])
+        sorted_files = info.get("sorted", [False] * len(info["files"]))
+        print(f"Loading {info['rows']} rows into {table} from {len(info['files'])} files "
+              f"({'heap, ' + str(table_streams) + ' streams' if not clustered_key else 'clustered index, 1 stream'})...")
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(table_streams)
+        await asyncio.gather(*(
+            _load_file(pool, semaphore, table,
+                       server_join(server_directory, *data_file_path(rel_path).split("/")),
+                       server_join(server_directory, format_name),
+                       batch_size,
+                       f", ORDER ([{info['columns'][0]}] ASC)" if ordered_key and is_sorted else "")
+            for rel_path, is_sorted in zip(info["files"], sorted_files)
+        ))
+        elapsed = time.perf_counter() - started
+        timings[table] = (info["rows"], elapsed)
+        print(f"  {table}: {info['rows']} rows in {elapsed:.2f}s ({info['rows'] / max(elapsed, 1e-9):.0f} rows/s)")
+    return timings
@@ -0,0 +1,256 @@
+# bulk_writer.py
+# Общий слой пакетной вставки для генератора данных.
+# Строки отправляются пачками (многострочный VALUES или fast_executemany),
+# а если пачка падает целиком - она повторяется построчно, чтобы найти
+# конкретные "плохие" строки и не терять остальные. Построчный повтор возможен,
+# только пока транзакция жива и упавший оператор не оставил частичных строк;
+# иначе ошибка поднимается, и вызывающий откатывает всю пачку.
+import asyncio
+import time
+
+from bulk_files import FileCursor
+
+# Ограничения SQL Server
+SQLSERVER_MAX_PARAMS = 2100       # параметров в одном запросе
+SQLSERVER_MAX_VALUES_ROWS = 1000  # строк в одном конструкторе VALUES
+
+MODE_VALUES = "values"              # INSERT ... VALUES (...), (...), ...
+MODE_EXECUTEMANY = "executemany"    # pyodbc fast_executemany (массивы параметров)
+
+# Признаки ошибок (текст сообщения ODBC): отказ по лимиту параметров и конфликты блокировок
+PARAMETER_LIMIT_MARKERS = ("too many parameters", "1000 row values")
+CONTENTION_MARKERS = ("HYT00", "timeout", "timed out", "1205", "deadlock", "1222", "lock request")
+
+
+def classify_error(exc):
+    """'parameters' - оператор отклонен до выполнения; 'contention' - таймаут или блокировки; None - ошибка данных."""
+    text = str(exc).lower()
+    if any(marker.lower() in text for marker in PARAMETER_LIMIT_MARKERS):
+        return "parameters"
+    if any(marker.lower() in text for marker in CONTENTION_MARKERS):
+        return "contention"
+    return None
+
+
+def max_rows_per_statement(num_columns):
+    """Сколько строк помещается в один INSERT ... VALUES с учетом лимита параметров."""
+    # Один параметр оставляем в запасе: драйвер иногда добавляет свой
+    by_params = (SQLSERVER_MAX_PARAMS - 1) // max(1, num_columns)
+    return max(1, min(SQLSERVER_MAX_VALUES_ROWS, by_params))
+
+
+def build_insert_sql(table, columns, num_rows=1):
+    row_placeholder = "(" + ", ".join("?" * len(columns)) + ")"
+    values_clause = ", ".join([row_placeholder] * num_rows)
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values_clause};"
+
+
+class BulkInsertResult:
+    """Итог пакетной вставки: что дошло до БД и что упало (строка, исключение)."""
+
+    def __init__(self):
+        self.inserted = []
+        self.failed = []
+        self.statements = 0
+
+
+async def _execute_batch(cur, table, columns, batch, mode):
+    if mode == MODE_EXECUTEMANY:
+        # aioodbc хранит исходный курсор pyodbc в _impl
+        impl = getattr(cur, "_impl", None)
+        if impl is not None:
+            impl.fast_executemany = True
+        await cur.executemany(build_insert_sql(table, columns), batch)
+    else:
+        flat_params = [value for row in batch for value in row]
+        await cur.execute(build_insert_sql(table, columns, len(batch)), *flat_params)
+
+
+async def _transaction_survived(cur, exc):
+    """
+    True - после ошибки exc транзакция жива и отменен только упавший оператор.
+    Взаимоблокировка (1205) откатывает всю транзакцию, таймаут оставляет ее в
+    неизвестном состоянии, а XACT_STATE() <> 1 - транзакция откачена или обречена:
+    строки предыдущих операторов пачки уже потеряны.
+    """
+    if classify_error(exc) == "contention":
+        return False
+    try:
+        await cur.execute("SELECT XACT_STATE();")
+        row = await cur.fetchone()
+    except Exception:
+        return False
+    return bool(row) and row[0] == 1
+
+
+async def _insert_row_by_row(cur, table, columns, batch, result):
+    single_row_sql = build_insert_sql(table, columns)
+    for row in batch:
+        try:
+            await cur.execute(single_row_sql, *row)
+            result.inserted.append(row)
+        except Exception as e:
+            if not await _transaction_survived(cur, e):
+                raise
+            result.failed.append((row, e))
+        result.statements += 1
+
+
+async def bulk_insert(cur, table, columns, rows, batch_size=100, mode=MODE_VALUES, identity_insert=False, tuner=None):
+    """
+    Вставляет rows пачками по batch_size строк (но не больше, чем позволяет лимит
+    параметров SQL Server). Упавшая пачка повторяется построчно, так что одна
+    ошибочная строка не отменяет всю пачку. Коммит остается за вызывающим кодом.
+    Если ошибка могла отменить уже вставленные строки (взаимоблокировка, таймаут,
+    откаченная транзакция) или оставила частичную вставку (executemany), она
+    поднимается: вызывающий должен откатить транзакцию целиком.
+    identity_insert=True - строки содержат заранее выданные IDENTITY-ключи
+    (см. key_allocator.py), на время вставки включается IDENTITY_INSERT.
+    tuner (batch_tuner.BatchTuner) - размер каждого оператора берется у него вместо batch_size.
+    """
+    result = BulkInsertResult()
+    if not rows:
+        return result
+    if isinstance(cur, FileCursor):
+        # Режим выгрузки в файлы (bulk_files.py): строки уходят в файл при коммите соединения
+        cur.write_rows(table, columns, rows)
+        result.inserted.extend(rows)
+        result.statements += 1
+        return result
+    if identity_insert:
+        # IDENTITY_INSERT действует на сессию и только для одной таблицы сразу
+        await cur.execute(f"SET IDENTITY_INSERT {table} ON;")
+        try:
+            return await _bulk_insert_batches(cur, table, columns, rows, batch_size, mode, result, tuner)
+        finally:
+            await cur.execute(f"SET IDENTITY_INSERT {table} OFF;")
+    return await _bulk_insert_batches(cur, table, columns, rows, batch_size, mode, result, tuner)
+
+
+async def _bulk_insert_batches(cur, table, columns, rows, batch_size, mode, result, tuner=None):
+    step = max(1, batch_size)
+    if mode == MODE_VALUES:
+        step = min(step, max_rows_per_statement(len(columns)))
+
+    start = 0
+    while start < len(rows):
+        if tuner is not None:
+            step = tuner.size
+        batch = rows[start:start + step]
+        started = time.perf_counter()
+        try:
+            await _execute_batch(cur, table, columns, batch, mode)
+        except Exception as e:
+            if tuner is not None and tuner.record_failure(len(batch), e):
+                # Оператор отклонен целиком до выполнения: те же строки - с меньшим размером
+                continue
+            # Многострочный INSERT атомарен: пачка не вставлена, ищем виновные строки.
+            # executemany выполняет строки по одной, и часть могла успеть вставиться -
+            # тогда повторять нельзя, как и после отката транзакции
+            if mode == MODE_EXECUTEMANY or not await _transaction_survived(cur, e):
+                raise
+            await _insert_row_by_row(cur, table, columns, batch, result)
+        else:
+            if tuner is not None:
+                tuner.record(len(batch), time.perf_counter() - started)
+            result.inserted.extend(batch)
+            result.statements += 1
+        start += len(batch)
+    return result
+
+
+async def stream_insert(pool, batches, insert_batch, num_workers=1, queue_size=2, on_commit=None, metrics=None):
+    """
+    Потоковая вставка с обратным давлением: batches (асинхронный генератор пачек строк)
+    кладет пачки в ограниченную очередь asyncio.Queue(queue_size), а num_workers
+    вставщиков, каждый на своем соединении, забирают их и вызывают
+    insert_batch(cur, batch) с коммитом после каждой пачки. Когда очередь полна,
+    генератор ждет, поэтому в памяти одновременно не больше
+    queue_size + num_workers пачек - независимо от общего числа строк.
+    Ошибка пачки откатывает только ее, остальные пачки продолжают вставляться; вставщик,
+    потерявший соединение, выходит, а его пачки достаются остальным.
+    on_commit(batch, result) вызывается после успешного коммита пачки с результатом
+    insert_batch - туда относится все, что можно учитывать только для записанных строк.
+    metrics (metrics.PhaseMetrics) получает время синтеза, ожидания очереди и пула,
+    задержку каждой пачки и ошибки.
+    """
+    queue = asyncio.Queue(maxsize=max(1, queue_size))
+    num_workers = max(1, num_workers)
+    failed_batches = 0
+    live_workers = num_workers
+    stops_taken = 0   # взятые из очереди сигналы остановки (None)
+
+    async def next_batch():
+        nonlocal stops_taken
+        batch = await queue.get()
+        if batch is None:
+            stops_taken += 1
+        return batch
+
+    async def insert_batches():
+        nonlocal failed_batches
+        started = time.perf_counter()
+        async with pool.acquire() as conn:
+            if metrics is not None: metrics.record_pool_wait(time.perf_counter() - started)
+            async with conn.cursor() as cur:
+                while True:
+                    started = time.perf_counter()
+                    batch = await next_batch()
+                    if metrics is not None: metrics.record_idle(time.perf_counter() - started)
+                    if batch is None:
+                        return
+                    started = time.perf_counter()
+                    try:
+                        result = await insert_batch(cur, batch)
+                        await conn.commit()
+                    except Exception as e:
+                        failed_batches += 1
+                        if metrics is not None: metrics.record_failed_batch(time.perf_counter() - started, e)
+                        print(f"  Batch failed and was rolled back: {e}")
+                        try: await conn.rollback()
+                        except Exception as rb_exc: print(f"  Rollback error: {rb_exc}")
+                        continue
+                    if metrics is not None: metrics.record_batch(time.perf_counter() - started)
+                    if on_commit is not None:
+                        on_commit(batch, result)
+
+    async def worker():
+        nonlocal failed_batches, live_workers
+        try:
+            await insert_batches()
+        except Exception as e:
+            # Пачки упавшего вставщика берут оставшиеся
+            print(f"  Insert worker lost its connection: {e}")
+            if metrics is not None: metrics.record_error(e)
+        live_workers -= 1
+        if live_workers == 0:
+            # Последний вышедший дочитывает очередь до всех сигналов остановки, иначе генератор
+            # пачек зависнет на put; пачки, которые уже некому записать, считаются упавшими
+            while stops_taken < num_workers:
+                if await next_batch() is not None:
+                    failed_batches += 1
+
+    workers = [asyncio.create_task(worker()) for _ in range(num_workers)]
+    batch_iter = aiter(batches)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                batch = await anext(batch_iter)
+            except StopAsyncIteration:
+                break
+            if metrics is not None: metrics.record_synth(time.perf_counter() - started)
+            if batch:
+                started = time.perf_counter()
+                await queue.put(batch)
+                if metrics is not None: metrics.record_backpressure(time.perf_counter() - started)
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    return failed_batches
+
+
+async def delete_key_range(cur, table, key_column, first_key, last_key):
+    """Удаляет строки с ключами first_key..last_key - повторная вставка пачки с заранее выданными ключами становится идемпотентной."""
+    await cur.execute(f"DELETE FROM {table} WHERE {key_column} BETWEEN ? AND ?", first_key, last_key)
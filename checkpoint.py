@@ -0,0 +1,209 @@
+# checkpoint.py
+# Контрольная точка генерации: после сбоя запуск с --resume продолжает с того
+# места, где остановился предыдущий, не перечитывая таблицы и не дублируя строки.
+# В файле хранятся параметры генерации, базовое семя прогона, состояние фаз
+# (выданные ключи, номера закоммиченных пачек) и снимок состояния генератора
+# (реестры ключей, кэши, счетчики ключей). Полный снимок пишется только на
+# границах фаз; между ними раз в interval_sec в журнал (файл .journal рядом)
+# дописываются приращения: новые номера пачек, хвосты реестров и новые записи
+# кэшей. Так сохранение стоит O(строк с прошлого сохранения), а не O(всех строк).
+import itertools
+import os
+import pickle
+import time
+
+from id_registry import IdRegistry
+
+CHECKPOINT_FORMAT_VERSION = 2
+JOURNAL_SUFFIX = ".journal"
+
+
+def _is_list_dict(value):
+    return isinstance(value, dict) and isinstance(next(iter(value.values()), None), list)
+
+
+def _size(value):
+    """Отметка для приращений; None - значение мелкое и пишется целиком."""
+    if _is_list_dict(value):
+        return sum(map(len, value.values()))
+    if isinstance(value, (IdRegistry, dict)):
+        return len(value)
+    return None
+
+
+def _delta(value, mark):
+    """
+    Приращение значения с отметки mark: хвост реестра, новые записи словаря
+    (между снимками словари только пополняются, порядок вставки сохраняется)
+    или значение целиком. None - не изменилось.
+    """
+    size = _size(value)
+    if size is None or mark is None or _is_list_dict(value):
+        return None if size is not None and size == mark else ("full", value)
+    if size == mark:
+        return None
+    if isinstance(value, IdRegistry):
+        return ("tail", value.tail(mark))
+    return ("tail", dict(reversed(list(itertools.islice(reversed(value.items()), size - mark)))))
+
+
+def _apply(current, delta):
+    kind, value = delta
+    if kind == "full":
+        return value
+    if isinstance(current, IdRegistry):
+        current.append_registry(value)
+    else:
+        current.update(value)
+    return current
+
+
+def _read_journal(path):
+    records = []
+    try:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    records.append(pickle.load(f))
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, AttributeError):
+                    # Запись, оборванная сбоем: ее пачки не отмечены и будут записаны заново
+                    break
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class GenerationCheckpoint:
+    """
+    collect_state() возвращает плоский словарь состояния генератора для сохранения.
+    Все изменения делаются синхронно (без await), поэтому снимок всегда
+    согласован с номерами пачек: пачка отмечается в том же шаге, в котором
+    ее ключи попадают в реестры, - сразу после коммита. Записи журнала несут
+    номер снимка (generation): записи от прежнего снимка при чтении пропускаются.
+    path=None - контрольная точка ведется только в памяти.
+    """
+
+    def __init__(self, path, params, seed, collect_state, interval_sec=10.0):
+        self.path = path
+        self.params = params
+        self.seed = seed
+        self.phases = {}
+        self.saved_state = None       # снимок, прочитанный из файла (при --resume)
+        self._loaded_phases = set()   # фазы, начатые предыдущим запуском
+        self._collect_state = collect_state
+        self._interval_sec = interval_sec
+        self._last_save = time.monotonic()
+        self._generation = 0
+        self._marks = None            # отметки значений на момент последней записи; None - нужен снимок
+        self._new_batches = []        # (фаза, номер пачки), отмеченные после последней записи
+
+    @classmethod
+    def load(cls, path, params, collect_state, interval_sec=10.0):
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != CHECKPOINT_FORMAT_VERSION:
+            raise ValueError(f"Checkpoint {path} has format version {data.get('version')}, expected {CHECKPOINT_FORMAT_VERSION}")
+        # params=None - параметры берутся из файла (их нельзя пересчитать заново, см. --incremental)
+        if params is not None and data.get("params") != params:
+            raise ValueError(f"Checkpoint {path} was written with other generation parameters; start a new run without --resume")
+        checkpoint = cls(path, data["params"], data["seed"], collect_state, interval_sec)
+        checkpoint.phases = data["phases"]
+        checkpoint._generation = data["generation"]
+        state = data["state"]
+        for record in _read_journal(path + JOURNAL_SUFFIX):
+            if record["generation"] != checkpoint._generation:
+                continue
+            for name, index in record["batches"]:
+                checkpoint.phases[name]["batches_done"].add(index)
+            for name, delta in record["state"].items():
+                state[name] = _apply(state.get(name), delta)
+        checkpoint.saved_state = state
+        checkpoint._loaded_phases = set(data["phases"])
+        return checkpoint
+
+    def save(self):
+        """Полный снимок; журнал начинается заново."""
+        self._last_save = time.monotonic()
+        self._new_batches = []
+        if not self.path:
+            return
+        self._generation += 1
+        state = self._collect_state()
+        data = {
+            "version": CHECKPOINT_FORMAT_VERSION,
+            "params": self.params,
+            "seed": self.seed,
+            "generation": self._generation,
+            "phases": self.phases,
+            "state": state,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        # Сбой до очистки журнала безопасен: его записи относятся к прежнему снимку
+        open(self.path + JOURNAL_SUFFIX, "wb").close()
+        self._marks = {name: _size(value) for name, value in state.items()}
+
+    def flush(self):
+        """Дописывает в журнал приращения с последней записи (или пишет снимок, если отметок нет)."""
+        self._last_save = time.monotonic()
+        if not self.path:
+            self._new_batches = []
+            return
+        if self._marks is None:
+            self.save()
+            return
+        deltas = {}
+        marks = {}
+        for name, value in self._collect_state().items():
+            delta = _delta(value, self._marks.get(name))
+            if delta is not None:
+                deltas[name] = delta
+            marks[name] = _size(value)
+        record = {"generation": self._generation, "batches": self._new_batches, "state": deltas}
+        with open(self.path + JOURNAL_SUFFIX, "ab") as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._marks = marks
+        self._new_batches = []
+
+    def maybe_save(self):
+        """Пишет приращения в журнал не чаще раза в interval_sec секунд."""
+        if time.monotonic() - self._last_save >= self._interval_sec:
+            self.flush()
+
+    def phase_state(self, name):
+        return self.phases.get(name)
+
+    def start_phase(self, name, target, keys):
+        """
+        Запоминает объем фазы и выданные ей ключи и сразу сохраняется: любая пачка,
+        закоммиченная дальше, принадлежит фазе, о которой знает файл.
+        """
+        state = self.phases.setdefault(name, {"done": False, "batches_done": set()})
+        state["target"] = target
+        state["keys"] = keys
+        self.save()
+        return state
+
+    def is_phase_done(self, name):
+        return self.phases.get(name, {}).get("done", False)
+
+    def mark_phase_done(self, name):
+        self.phases.setdefault(name, {"done": False, "batches_done": set()})["done"] = True
+        self.save()
+
+    def is_replaying(self, name):
+        """Фаза начата предыдущим запуском и не завершена: часть ее незаписанных пачек могла успеть закоммититься."""
+        return name in self._loaded_phases and not self.is_phase_done(name)
+
+    def batch_done(self, name, index):
+        state = self.phases.get(name)
+        return state is not None and index in state["batches_done"]
+
+    def mark_batch_done(self, name, index):
+        self.phases[name]["batches_done"].add(index)
+        self._new_batches.append((name, index))
+        self.maybe_save()
@@ -0,0 +1,89 @@
+# columnar.py
+# Колоночная генерация случайных значений: даты, цены в копейках, рейтинги и
+# индексы внешних ключей создаются сразу целыми столбцами (массивы NumPy),
+# а в строки (кортежи) склеиваются только перед вставкой.
+# Без NumPy те же функции работают через random и возвращают списки.
+import datetime
+import hashlib
+import random
+
+from id_registry import IdRegistry
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def derive_seed(*parts):
+    """Семя из базового семени и меток (фаза, номер пачки, ...): у каждой пачки свой независимый поток."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1
+
+
+def chunk_ranges(total, chunk_size):
+    """(смещение, размер) кусков по chunk_size строк."""
+    for start in range(0, total, chunk_size):
+        yield start, min(chunk_size, total - start)
+
+
+def id_column(ids):
+    """Готовит список ключей к многократной выборке: с NumPy - массив int64.
+    Реестр ключей (id_registry.IdRegistry) уже умеет выборку по рангу и возвращается как есть."""
+    if isinstance(ids, IdRegistry):
+        return ids
+    if np is not None:
+        return np.asarray(ids, dtype=np.int64)
+    return list(ids)
+
+
+def to_py(column):
+    """Столбец -> список Python-значений (datetime64 -> datetime, int64 -> int)."""
+    if np is not None and isinstance(column, np.ndarray):
+        return column.tolist()
+    return list(column)
+
+
+def cents_to_str(cents):
+    """Цена в копейках -> строка для DECIMAL-столбца ('12.05')."""
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+class ColumnGenerator:
+    """Генератор столбцов с собственным потоком случайных чисел."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed) if np is not None else None
+
+    def integers(self, low, high, count):
+        """count целых из [low, high] включительно."""
+        if self.np_rng is not None:
+            return self.np_rng.integers(low, high + 1, size=count)
+        return [self.rng.randint(low, high) for _ in range(count)]
+
+    def choice(self, values, count):
+        """count случайных элементов values (values может быть столбцом id_column)."""
+        if isinstance(values, IdRegistry):
+            return values.take(self.integers(0, len(values) - 1, count))
+        if self.np_rng is not None:
+            return np.asarray(values)[self.np_rng.integers(0, len(values), size=count)]
+        return self.rng.choices(values, k=count)
+
+    def prices_cents(self, low_cents, high_cents, count):
+        return self.integers(low_cents, high_cents, count)
+
+    def datetimes(self, start, end, count):
+        """count моментов времени из [start, end] с точностью до секунды."""
+        start = start.replace(microsecond=0)
+        span_seconds = max(0, int((end - start).total_seconds()))
+        if self.np_rng is not None:
+            base = np.datetime64(start, "s")
+            return base + self.np_rng.integers(0, span_seconds + 1, size=count).astype("timedelta64[s]")
+        return [start + datetime.timedelta(seconds=self.rng.randint(0, span_seconds)) for _ in range(count)]
+
+
+def date_window(years_back, reference_time=None):
+    """Окно дат [reference_time - years_back лет, reference_time], как в DATE_RANGE_YEARS; по умолчанию от текущего времени."""
+    now = (reference_time or datetime.datetime.now()).replace(microsecond=0)
+    return now - datetime.timedelta(days=years_back * 365), now
@@ -11,6 +11,7 @@ DB_CONN_STR = (
 # Максимальное кол-во подключений в пуле для aioodbc
 DB_POOL_MIN_SIZE = 10
 DB_POOL_MAX_SIZE = 50
+DB_EXECUTOR_WORKERS = None  # Потоки для вызовов pyodbc (None - по умолчанию ThreadPoolExecutor); см. db_pool.py
 
 
 # Базовое количество сущностей для ПЕРВОГО запуска
@@ -38,6 +39,25 @@ SIMULATION_DURATION_SECONDS = 180 # Как долго работает симу
 NUM_CONCURRENT_USERS = 50       # Количество "одновременных" пользователей
 MIN_USER_WAIT_SECONDS = 0.5     # Минимальная пауза между действиями пользователя
 MAX_USER_WAIT_SECONDS = 3.0     # Максимальная пауза
+ACTIVITY_REPORT_PATH = "activity_metrics.json"  # Отчет задержек по операциям (None - не писать)
+
+# Открытый цикл (python simulate_activity.py --rate N): операции запускаются по расписанию
+# с заданной интенсивностью, а не после ответа на предыдущую; задержка - от запланированного момента
+TARGET_OPS_PER_SEC = None       # None - замкнутый цикл NUM_CONCURRENT_USERS пользователей
+ARRIVAL_PROCESS = "poisson"     # "poisson" - случайные интервалы, "fixed" - равные
+MAX_IN_FLIGHT_OPERATIONS = 500  # Сколько операций открытого цикла выполняется одновременно
+SIMULATION_PROCESSES = 1        # Процессы нагрузки (--processes): пользователи и интенсивность делятся между ними
+
+# Поиск точки насыщения (python simulate_activity.py --ramp users|rate): нагрузка поднимается
+# ступенями (начало, шаг, максимум), пока p99 не превысит предел или рост пропускной способности не остановится
+RAMP_USER_LEVELS = (10, 10, 200)   # Пользователи замкнутого цикла
+RAMP_RATE_LEVELS = (50, 50, 2000)  # Операций/с открытого цикла
+RAMP_WARMUP_SECONDS = 10           # Прогрев каждой ступени (не учитывается)
+RAMP_STEP_SECONDS = 30             # Измерение каждой ступени
+RAMP_P99_LIMIT_MS = 500            # p99 выше этого - насыщение
+RAMP_MIN_GAIN = 0.5                # Пользователи: прирост ops/s меньше этой доли прироста нагрузки - насыщение
+RAMP_MAX_SHORTFALL = 0.05          # Интенсивность: выполнено меньше заданной на эту долю - насыщение
+RAMP_REPORT_PATH = "capacity_curve.json"  # None - не писать
 
 # Веса для разных типов операций (чем выше вес, тем чаще операция)
 QUERY_WEIGHTS = {
@@ -13,28 +13,89 @@ DB_CONN_STR = (
 
 DB_POOL_MIN_SIZE = 5
 DB_POOL_MAX_SIZE = 20
+DB_EXECUTOR_WORKERS = None   # Потоки для вызовов pyodbc (None - по умолчанию ThreadPoolExecutor); см. db_pool.py
+GENERATOR_SHARDS = 8   # Сколько соединений пула параллельно вставляют строки одной фазы
 
 
 # Диапазон лет в прошлом для генерации дат (например, регистрации, создания ресторана)
 # DATA_START_DATE из вашего второго конфига соответствует 25 годам назад
 DATE_RANGE_YEARS = 25
 
-BATCH_SIZE = 100       # Количество записей для одного executemany (оставим как есть, если генератор это учитывает)
+BATCH_SIZE = 100       # Количество строк в одной пачке INSERT (см. bulk_writer.py); при BATCH_AUTOTUNE - начальный размер
+BATCH_AUTOTUNE = True  # Подбирать размер INSERT для каждой таблицы во время прогона (см. batch_tuner.py)
+BATCH_TUNE_SAMPLES = 8              # Операторов в одном замере скорости
+BATCH_TUNE_LATENCY_LIMIT_SEC = 2.0  # Оператор дольше этого - размер уменьшается вдвое
+BULK_INSERT_MODE = "values"  # "values" - многострочный INSERT ... VALUES, "executemany" - pyodbc fast_executemany
+
+SYNTH_PROCESSES = 4       # Процессы для синтеза строк Faker (0 - синтез в основном процессе)
+SYNTH_CHUNK_ROWS = 1000   # Строк в одном куске синтеза; кусок - единица очереди вставки и коммита
+STREAM_QUEUE_BATCHES = 16 # Сколько готовых кусков может ждать вставки; ограничивает память генератора
+FETCH_BATCH_ROWS = 50000  # Строк за один fetchmany при загрузке существующих ключей
+
+# Брони (booking_timeline.py): окно дат делится на отрезки времени не короче BOOKING_SLICE_MIN_SLOTS
+# слотов; несколько кусков подряд делят один отрезок
+BOOKING_SLICE_MIN_SLOTS = 12       # 12 слотов по 2 часа - сутки
+BOOKING_MAX_SKIPPED_SHARE = 0.05   # Доля броней без свободного слота, при которой фаза падает
+
+# Метрики фаз (metrics.py): строки прогресса во время прогона и отчет JSON в конце
+METRICS_PROGRESS_SEC = 10                     # 0 - без строк прогресса
+METRICS_REPORT_PATH = "generation_metrics.json"  # None - не писать отчет
+
+# Контрольная точка для продолжения прерванного прогона (python generate_data.py --resume)
+GENERATOR_SEED = None     # Базовое семя прогона (None - случайное, сохраняется в контрольной точке)
+GENERATOR_REFERENCE_TIME = None  # "Сейчас" генерируемых данных (datetime); None - время запуска. С тем же семенем данные повторяются
+CHECKPOINT_PATH = "generation_checkpoint.pkl"  # None - не писать контрольную точку
+CHECKPOINT_INTERVAL_SEC = 10  # Как часто сохранять прогресс пачек
+
+# Выгрузка в файлы (generate_data.py --emit-files DIR) и ее загрузка (python load_files.py DIR)
+EMIT_FILE_PARTITIONS = 8       # На сколько файлов-секций делится каждая таблица
+BULK_LOAD_STREAMS = 4          # Сколько секций одной таблицы грузится параллельно
+BULK_LOAD_BATCH_ROWS = 100000  # BATCHSIZE для BULK INSERT
+
+# Быстрая загрузка (generate_data.py --fast-load, load_files.py --fast-load, см. fast_load.py):
+# некластерные индексы и ограничения этих таблиц отключаются на время загрузки
+FAST_LOAD_TABLES = ("dbo.Booking", "dbo.Orders", "dbo.OrdersItem", "dbo.Review")
+FAST_LOAD_REBUILD_STREAMS = 4          # Сколько таблиц перестраивают индексы одновременно
+FAST_LOAD_RECOVERY_MODEL = "BULK_LOGGED"  # Модель на время загрузки из FULL (None - не менять)
+FAST_LOAD_STATE_PATH = "fast_load_state.txt"  # Исходная модель восстановления до --fast-load-finish (None - только в памяти)
+
+# Снимок набора данных для повторяемых прогонов simulate_activity.py (python snapshot.py capture|restore,
+# generate_data.py --snapshot): "files" - сжатые секции таблиц и BULK INSERT, "database" - снимок базы SQL Server
+SNAPSHOT_MODE = "files"
+SNAPSHOT_DIR = "snapshot"
+SNAPSHOT_PARTITIONS = 8        # Секций на таблицу - столько файлов таблицы грузится параллельно
+SNAPSHOT_COMPRESS = True       # Сжимать секции gzip
+SNAPSHOT_DATABASE_NAME = None  # Имя снимка базы (None - <база>_snapshot)
+
+# Режим словаря: пулы значений Faker строятся один раз и сохраняются на диск,
+# строки собираются выборкой из пулов (см. vocab_cache.py)
+USE_VOCAB_CACHE = False
+VOCAB_POOL_SIZE = 10000
+VOCAB_SEED = 12345
+VOCAB_CACHE_PATH = "vocab_cache.pkl"
 
 
 # --- Параметры для первоначальной генерации (аналогично INITIAL_... из второго конфига) ---
-NUM_CLIENTS_TO_GENERATE = 1000        # Соответствует INITIAL_CLIENTS
-NUM_RESTAURANTS_TO_GENERATE = 50      # Соответствует INITIAL_RESTAURANTS
+# Объемы задаются одним коэффициентом масштаба (см. sizing.py): клиенты и рестораны -
+# это значения для SCALE_FACTOR = 1, остальные таблицы выводятся из соотношений ниже.
+# python generate_data.py --estimate [--scale-factor N] печатает оценку без запуска.
+SCALE_FACTOR = 1
+NUM_CLIENTS_TO_GENERATE = 1000        # Клиентов на единицу масштаба (INITIAL_CLIENTS)
+NUM_RESTAURANTS_TO_GENERATE = 50      # Ресторанов на единицу масштаба (INITIAL_RESTAURANTS)
 
 AVG_TABLES_PER_RESTAURANT = 5         # Соответствует INITIAL_TABLES_PER_RESTAURANT
 AVG_MENU_ITEMS_PER_RESTAURANT = 40    # Оставим текущее значение или можно подстроить, если есть аналог в "втором конфиге"
 
 
-AVG_BOOKINGS_PER_CLIENT_OR_TABLE = 5 # Попытка приблизить, но это ОЧЕНЬ грубая оценка.
+AVG_BOOKINGS_PER_CLIENT_OR_TABLE = 5  # Бронирований на нового клиента
 
-CHANCE_BOOKING_HAS_ORDER = 0.90       # Соответствует AVG_ORDERS_PER_BOOKING
+CHANCE_BOOKING_HAS_ORDER = 0.90       # Заказов на бронирование (AVG_ORDERS_PER_BOOKING)
 AVG_ITEMS_PER_ORDER = 3               # Соответствует AVG_ITEMS_PER_ORDER
 
 
-AVG_REVIEWS_PER_RESTAURANT_OR_CLIENT = 0.3 # Компромиссное значение, настройте.
+AVG_REVIEWS_PER_RESTAURANT_OR_CLIENT = 0.3 # Отзывов на нового клиента
+
+# Скорости для оценки времени загрузки (--estimate); стоит подставить замеренные на своем сервере
+ESTIMATE_INSERT_ROWS_PER_SEC = 20000   # Вставка через ODBC
+ESTIMATE_BULK_ROWS_PER_SEC = 200000    # --emit-files + BULK INSERT
 
@@ -0,0 +1,230 @@
+# db_pool.py
+# Пул aioodbc с замерами очередей на стороне клиента. Задержка операции складывается
+# из ожидания свободного соединения (acquire_wait), ожидания свободного потока
+# исполнителя (queue_delay: каждый вызов pyodbc - execute, fetch, commit - aioodbc
+# отправляет в пул потоков) и собственно работы драйвера и базы. Первые две части -
+# очереди клиента: если они растут вместе с нагрузкой, упор в пул или в потоки,
+# а не в базу. Дополнительно замеряется открытие соединений и раз в sample_interval
+# снимаются датчики: соединений занято, свободно, и сколько задач ждет соединения.
+# Используется в generate_data.py и simulate_activity.py.
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import aioodbc
+import pyodbc
+
+from metrics import Histogram
+
+
+class PoolStats:
+    """
+    Замеры одного или нескольких пулов (слияние - для процессов нагрузки). Без ссылок на пул: сериализуется.
+    Вызовы драйвера замеряются в потоках исполнителя, поэтому гистограммы queue_delay и connect
+    пишутся и читаются под блокировкой; остальные замеры делаются в цикле событий.
+    """
+
+    def __init__(self, maxsize=0, executor_workers=0):
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+        self.executor_workers = executor_workers
+        self.acquires = 0
+        self.acquire_wait = Histogram()   # секунды от acquire() до выдачи соединения
+        self.queue_delay = Histogram()    # секунды от отправки вызова pyodbc в исполнитель до его начала
+        self.connect = Histogram()        # секунды pyodbc.connect (без ожидания потока)
+        self.in_use = Histogram()         # снятые значения датчиков: распределение по времени
+        self.idle = Histogram()
+        self.waiting = Histogram()
+        self.peak_in_use = 0
+        self.peak_waiting = 0
+        self.timelines = []               # на каждый пул: [(секунды от создания, занято, свободно, ждут), ...]
+
+    def __getstate__(self):
+        with self._lock:
+            state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record_driver_call(self, queue_delay, connect=None):
+        """Замер вызова pyodbc из потока исполнителя."""
+        with self._lock:
+            self.queue_delay.record(queue_delay)
+            if connect is not None:
+                self.connect.record(connect)
+
+    def merge(self, other):
+        self.maxsize += other.maxsize
+        self.executor_workers += other.executor_workers
+        self.acquires += other.acquires
+        with self._lock:
+            for name in ("acquire_wait", "queue_delay", "connect", "in_use", "idle", "waiting"):
+                getattr(self, name).merge(getattr(other, name))
+        # Пики процессов достигаются в разные моменты: сумма - верхняя оценка
+        self.peak_in_use += other.peak_in_use
+        self.peak_waiting += other.peak_waiting
+        self.timelines.extend(other.timelines)
+        return self
+
+    def print_report(self):
+        with self._lock:
+            self._print_report()
+
+    def _print_report(self):
+        wait, queue = self.acquire_wait, self.queue_delay
+        print(f"--- Connection pool (max {self.maxsize} connections, {self.executor_workers} executor threads) ---")
+        print(f"Acquire wait over {self.acquires} acquires: p50 {wait.percentile(50) * 1000:.1f} ms, "
+              f"p99 {wait.percentile(99) * 1000:.1f} ms, max {(wait.max or 0.0) * 1000:.1f} ms")
+        print(f"Executor queue delay over {queue.count} driver calls: p50 {queue.percentile(50) * 1000:.2f} ms, "
+              f"p99 {queue.percentile(99) * 1000:.2f} ms, max {(queue.max or 0.0) * 1000:.1f} ms")
+        if self.connect.count:
+            print(f"Connection open: {self.connect.count} opened, p50 {self.connect.percentile(50) * 1000:.1f} ms, "
+                  f"max {(self.connect.max or 0.0) * 1000:.1f} ms")
+        print(f"In use: p50 {self.in_use.percentile(50):.0f}, peak {self.peak_in_use}; "
+              f"tasks waiting for a connection: p99 {self.waiting.percentile(99):.0f}, peak {self.peak_waiting}")
+
+    def to_dict(self):
+        with self._lock:
+            return self._to_dict()
+
+    def _to_dict(self):
+        return {
+            "maxsize": self.maxsize,
+            "executor_workers": self.executor_workers,
+            "acquires": self.acquires,
+            "acquire_wait_sec": self.acquire_wait.to_dict(),
+            "executor_queue_delay_sec": self.queue_delay.to_dict(),
+            "connect_sec": self.connect.to_dict(),
+            "in_use": self.in_use.summary(),
+            "idle": self.idle.summary(),
+            "waiting": self.waiting.summary(),
+            "peak_in_use": self.peak_in_use,
+            "peak_waiting": self.peak_waiting,
+            "timelines": self.timelines,
+        }
+
+
+class InstrumentedExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Пул потоков для вызовов pyodbc: замеряет, сколько вызов ждал свободного потока."""
+
+    def __init__(self, stats, max_workers=None):
+        super().__init__(max_workers=max_workers, thread_name_prefix="odbc")
+        self.stats = stats
+        stats.executor_workers = self._max_workers
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued = time.perf_counter()
+        # aioodbc передает вызовы как functools.partial; открытие соединения - partial(pyodbc.connect, ...)
+        is_connect = getattr(fn, "func", None) is pyodbc.connect
+
+        def timed():
+            started = time.perf_counter()
+            if not is_connect:
+                self.stats.record_driver_call(started - queued)
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.stats.record_driver_call(started - queued, time.perf_counter() - started)
+
+        return super().submit(timed)
+
+
+class _Acquire:
+    """Результат InstrumentedPool.acquire(): как у aioodbc, и await, и async with."""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+
+    def __await__(self):
+        return self._pool._acquire().__await__()
+
+    async def __aenter__(self):
+        self._conn = await self._pool._acquire()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._pool.release(self._conn)
+
+
+class InstrumentedPool:
+    """Обертка над aioodbc.Pool: тот же интерфейс (acquire, release, close, wait_closed) плюс stats."""
+
+    def __init__(self, pool, executor, stats, sample_interval):
+        self._pool = pool
+        self._executor = executor
+        self.stats = stats
+        self._waiting = 0
+        self._created = time.perf_counter()
+        self._timeline = []
+        stats.timelines.append(self._timeline)
+        self._sampler = asyncio.create_task(self._sample(sample_interval)) if sample_interval else None
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    @property
+    def in_use(self):
+        return self._pool.size - self._pool.freesize
+
+    def _take_sample(self):
+        in_use, idle = self.in_use, self._pool.freesize
+        self.stats.in_use.record(in_use)
+        self.stats.idle.record(idle)
+        self.stats.waiting.record(self._waiting)
+        self._timeline.append((round(time.perf_counter() - self._created, 3), in_use, idle, self._waiting))
+
+    async def _sample(self, interval):
+        while True:
+            self._take_sample()
+            await asyncio.sleep(interval)
+
+    async def _acquire(self):
+        started = time.perf_counter()
+        self._waiting += 1
+        self.stats.peak_waiting = max(self.stats.peak_waiting, self._waiting)
+        try:
+            conn = await self._pool.acquire()
+        finally:
+            self._waiting -= 1
+        self.stats.acquire_wait.record(time.perf_counter() - started)
+        self.stats.acquires += 1
+        self.stats.peak_in_use = max(self.stats.peak_in_use, self.in_use)
+        return conn
+
+    def acquire(self):
+        return _Acquire(self)
+
+    async def release(self, conn):
+        await self._pool.release(conn)
+
+    def close(self):
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+        self._pool.close()
+
+    async def wait_closed(self):
+        await self._pool.wait_closed()
+        self._executor.shutdown(wait=False)
+
+
+async def create_pool(dsn, minsize, maxsize, executor_workers=None, sample_interval=1.0, **kwargs):
+    """
+    aioodbc.create_pool со своим исполнителем на executor_workers потоков
+    (None - размер по умолчанию ThreadPoolExecutor, как у исполнителя цикла событий).
+    Потоков меньше, чем соединений, - вызовы занятых соединений ждут в очереди исполнителя.
+    """
+    stats = PoolStats(maxsize)
+    executor = InstrumentedExecutor(stats, executor_workers)
+    try:
+        pool = await aioodbc.create_pool(dsn=dsn, minsize=minsize, maxsize=maxsize, executor=executor, **kwargs)
+    except BaseException:
+        executor.shutdown(wait=False)
+        raise
+    return InstrumentedPool(pool, executor, stats, sample_interval)
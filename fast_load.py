@@ -0,0 +1,190 @@
+# fast_load.py
+# Режим быстрой загрузки: на время тяжелых фаз некластерные индексы и
+# ограничения (внешние ключи, CHECK) тяжелых таблиц отключаются, модель
+# восстановления переключается на BULK_LOGGED (минимально протоколируются
+# BULK INSERT ... TABLOCK в load_files.py и перестройка индексов; многострочный
+# INSERT ... VALUES - никогда, поэтому вставщики генератора идут без TABLOCK
+# и не блокируют друг друга), а после загрузки индексы
+# перестраиваются параллельно (по таблицам), и ограничения заново проверяются
+# WITH CHECK CHECK CONSTRAINT, чтобы оптимизатор снова им доверял.
+# Все операторы идут через pool.acquire() -> conn.cursor() -> cur.execute(),
+# так что последовательность можно проверить на записывающем фейковом пуле.
+import asyncio
+import os
+import time
+
+# Таблицы, индексы и ограничения которых отключаются на время загрузки
+FAST_LOAD_TABLES = ("dbo.Booking", "dbo.Orders", "dbo.OrdersItem", "dbo.Review")
+
+# Только неуникальные некластерные индексы: уникальный индекс может быть целью
+# внешнего ключа, и его отключение отключает ссылающиеся ключи
+NONCLUSTERED_INDEXES_SQL = """
+SELECT name, is_disabled FROM sys.indexes
+WHERE object_id = OBJECT_ID(?) AND type = 2
+  AND is_unique = 0 AND is_primary_key = 0 AND is_unique_constraint = 0
+ORDER BY index_id
+"""
+
+CONSTRAINTS_SQL = """
+SELECT name, is_disabled, is_not_trusted FROM sys.foreign_keys WHERE parent_object_id = OBJECT_ID(?)
+UNION ALL
+SELECT name, is_disabled, is_not_trusted FROM sys.check_constraints WHERE parent_object_id = OBJECT_ID(?)
+ORDER BY name
+"""
+
+RECOVERY_MODEL_SQL = "SELECT recovery_model_desc FROM sys.databases WHERE database_id = DB_ID()"
+
+
+def _quote(name):
+    return "[" + name.replace("]", "]]") + "]"
+
+
+class FastLoad:
+    """
+    prepare() перед тяжелыми фазами, finish() после них. finish() смотрит на
+    каталог, а не на то, что отключил prepare(): он включает все отключенные
+    неуникальные индексы и проверяет все отключенные или непроверенные
+    ограничения таблиц - поэтому его можно повторить после сбоя (--fast-load-finish).
+    recovery_model=None - модель восстановления не меняется.
+    state_path - файл, куда prepare() записывает исходную модель восстановления:
+    finish() нового объекта (после падения процесса) возвращает ее оттуда.
+    """
+
+    def __init__(self, pool, tables=FAST_LOAD_TABLES, rebuild_streams=4, recovery_model="BULK_LOGGED",
+                 state_path=None):
+        self.pool = pool
+        self.tables = tuple(tables)
+        self.rebuild_streams = max(1, rebuild_streams)
+        self.recovery_model = recovery_model
+        self.state_path = state_path
+        self.original_recovery_model = None
+        self.timings = {}          # шаг -> секунды, в порядке выполнения
+        self._prepared_at = None
+
+    async def _query(self, sql, *params):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, *params)
+                rows = await cur.fetchall()
+                await conn.commit()
+        return rows
+
+    async def _run(self, sql):
+        # ALTER DATABASE нельзя выполнять внутри транзакции, а пул открыт с autocommit=False
+        async with self.pool.acquire() as conn:
+            conn.autocommit = True
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute(sql)
+            finally:
+                conn.autocommit = False
+
+    async def _run_per_table(self, statements_by_table):
+        """Операторы одной таблицы идут по очереди (REBUILD берет блокировку схемы), таблицы - параллельно."""
+        semaphore = asyncio.Semaphore(self.rebuild_streams)
+
+        async def run_table(statements):
+            async with semaphore:
+                for sql in statements:
+                    await self._run(sql)
+
+        await asyncio.gather(*(run_table(s) for s in statements_by_table.values() if s))
+
+    async def _timed(self, step, coro):
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.timings[step] = self.timings.get(step, 0.0) + time.perf_counter() - started
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.original_recovery_model)
+        os.replace(tmp_path, self.state_path)
+
+    def _load_state(self):
+        if self.original_recovery_model is None and self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                self.original_recovery_model = f.read().strip() or None
+
+    def _clear_state(self):
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    async def _switch_recovery_model(self):
+        rows = await self._query(RECOVERY_MODEL_SQL)
+        current = rows[0][0] if rows else None
+        # В SIMPLE минимальное протоколирование уже доступно; меняется только FULL
+        if current == "FULL":
+            # Исходная модель записывается до переключения: процесс может упасть сразу после него
+            self.original_recovery_model = current
+            self._save_state()
+            await self._run(f"ALTER DATABASE CURRENT SET RECOVERY {self.recovery_model}")
+            print(f"  Recovery model switched from {current} to {self.recovery_model} for the load.")
+
+    async def _disable(self):
+        disabled_indexes = disabled_constraints = 0
+        for table in self.tables:
+            for name, is_disabled in await self._query(NONCLUSTERED_INDEXES_SQL, table):
+                if not is_disabled:
+                    await self._run(f"ALTER INDEX {_quote(name)} ON {table} DISABLE")
+                    disabled_indexes += 1
+            for name, is_disabled, _ in await self._query(CONSTRAINTS_SQL, table, table):
+                if not is_disabled:
+                    await self._run(f"ALTER TABLE {table} NOCHECK CONSTRAINT {_quote(name)}")
+                    disabled_constraints += 1
+        print(f"  Disabled {disabled_indexes} nonclustered indexes and {disabled_constraints} constraints "
+              f"on {', '.join(self.tables)}.")
+
+    async def prepare(self):
+        print("Fast load: deferring index and constraint maintenance "
+              "(if the run stops early, repeat the last step with --fast-load-finish).")
+        if self.recovery_model:
+            await self._timed("recovery model", self._switch_recovery_model())
+        await self._timed("disable", self._disable())
+        self._prepared_at = time.perf_counter()
+
+    async def _rebuild_indexes(self):
+        statements = {}
+        for table in self.tables:
+            statements[table] = [
+                f"ALTER INDEX {_quote(name)} ON {table} REBUILD WITH (SORT_IN_TEMPDB = ON)"
+                for name, is_disabled in await self._query(NONCLUSTERED_INDEXES_SQL, table) if is_disabled
+            ]
+        print(f"  Rebuilding {sum(map(len, statements.values()))} indexes ({self.rebuild_streams} tables at a time)...")
+        await self._run_per_table(statements)
+
+    async def _check_constraints(self):
+        statements = {}
+        for table in self.tables:
+            statements[table] = [
+                f"ALTER TABLE {table} WITH CHECK CHECK CONSTRAINT {_quote(name)}"
+                for name, is_disabled, is_not_trusted in await self._query(CONSTRAINTS_SQL, table, table)
+                if is_disabled or is_not_trusted
+            ]
+        print(f"  Re-validating {sum(map(len, statements.values()))} constraints...")
+        await self._run_per_table(statements)
+
+    async def finish(self):
+        if self._prepared_at is not None:
+            self.timings["load"] = time.perf_counter() - self._prepared_at
+            self._prepared_at = None
+        print("Fast load: rebuilding indexes and re-validating constraints.")
+        await self._timed("rebuild indexes", self._rebuild_indexes())
+        await self._timed("check constraints", self._check_constraints())
+        self._load_state()
+        if self.original_recovery_model:
+            await self._timed("recovery model", self._run(
+                f"ALTER DATABASE CURRENT SET RECOVERY {self.original_recovery_model}"))
+            print(f"  Recovery model restored to {self.original_recovery_model} "
+                  "(take a log backup: the minimally logged interval has no point-in-time restore).")
+            self.original_recovery_model = None
+        self._clear_state()
+
+    def print_report(self):
+        print("--- Fast load steps ---")
+        for step, seconds in self.timings.items():
+            print(f"  {step:<18} {seconds:8.2f}s")
@@ -1,24 +1,56 @@
 import asyncio
-import aioodbc
+import argparse
+import inspect
+import os
 import random
 import time
 import datetime
 import traceback
-from faker import Faker
+import collections
+import concurrent.futures
 from decimal import Decimal
+from bulk_writer import BulkInsertResult, bulk_insert, stream_insert, delete_key_range
+from checkpoint import GenerationCheckpoint
+from key_allocator import KeyRangeAllocator, LocalKeyAllocator
+from bulk_files import FileEmitPool
+from phase_scheduler import PhaseScheduler
+from row_synth import synthesize_chunk
+from vocab_cache import load_or_build_vocabulary, sample_chunk
+from id_registry import IdRegistry, load_key_range, load_registry
+from order_engine import OrderEngine
+from booking_timeline import BOOKING_SLOT_MINUTES, BookingPlanner
+from sizing import build_plan, print_estimate
+from incremental import build_incremental_plan, incremental_window, read_last_booking_date
+from fast_load import FastLoad
+from snapshot import capture_snapshot
+from metrics import GeneratorMetrics
+from db_pool import create_pool
+from batch_tuner import BatchTuner
+from columnar import ColumnGenerator, chunk_ranges, derive_seed, id_column, to_py, cents_to_str, date_window
 
 # КОНФИГУРАЦИЯ 
 try:
     from config_generator import (
-        DB_CONN_STR, DATE_RANGE_YEARS, NUM_CLIENTS_TO_GENERATE,
+        DB_CONN_STR, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_EXECUTOR_WORKERS, GENERATOR_SHARDS, DATE_RANGE_YEARS, NUM_CLIENTS_TO_GENERATE,
         NUM_RESTAURANTS_TO_GENERATE, AVG_TABLES_PER_RESTAURANT,
         AVG_MENU_ITEMS_PER_RESTAURANT, AVG_BOOKINGS_PER_CLIENT_OR_TABLE,
         CHANCE_BOOKING_HAS_ORDER, AVG_ITEMS_PER_ORDER,
-        AVG_REVIEWS_PER_RESTAURANT_OR_CLIENT, BATCH_SIZE
+        AVG_REVIEWS_PER_RESTAURANT_OR_CLIENT, BATCH_SIZE, BULK_INSERT_MODE,
+        SYNTH_PROCESSES, SYNTH_CHUNK_ROWS, STREAM_QUEUE_BATCHES, BOOKING_SLICE_MIN_SLOTS, BOOKING_MAX_SKIPPED_SHARE,
+        USE_VOCAB_CACHE, VOCAB_POOL_SIZE,
+        VOCAB_SEED, VOCAB_CACHE_PATH, FETCH_BATCH_ROWS, GENERATOR_SEED, GENERATOR_REFERENCE_TIME, CHECKPOINT_PATH,
+        CHECKPOINT_INTERVAL_SEC, EMIT_FILE_PARTITIONS, SCALE_FACTOR, ESTIMATE_INSERT_ROWS_PER_SEC,
+        ESTIMATE_BULK_ROWS_PER_SEC, FAST_LOAD_TABLES, FAST_LOAD_REBUILD_STREAMS, FAST_LOAD_RECOVERY_MODEL,
+        FAST_LOAD_STATE_PATH, METRICS_PROGRESS_SEC, METRICS_REPORT_PATH, BATCH_AUTOTUNE, BATCH_TUNE_SAMPLES,
+        BATCH_TUNE_LATENCY_LIMIT_SEC
     )
 except ImportError:
     print("WARNING: config_generator.py not found or incomplete. Using default generation parameters.")
     DB_CONN_STR = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=ACER;DATABASE=TestDB;Trusted_Connection=yes;"
+    DB_POOL_MIN_SIZE = 2
+    DB_POOL_MAX_SIZE = 10
+    DB_EXECUTOR_WORKERS = None
+    GENERATOR_SHARDS = 4
     DATE_RANGE_YEARS = 25
     NUM_CLIENTS_TO_GENERATE = 500
     NUM_RESTAURANTS_TO_GENERATE = 500
@@ -29,23 +61,66 @@ except ImportError:
     AVG_ITEMS_PER_ORDER = 1
     AVG_REVIEWS_PER_RESTAURANT_OR_CLIENT = 1
     BATCH_SIZE = 100
-
-fake = Faker('ru_RU')
-
-#  Глобальные списки для хранения ID 
-existing_client_ids = []
-existing_restaurant_ids = []
-existing_table_ids = []
-existing_menu_ids = []
+    BULK_INSERT_MODE = "values"
+    SYNTH_PROCESSES = 0
+    SYNTH_CHUNK_ROWS = 1000
+    STREAM_QUEUE_BATCHES = 8
+    BOOKING_SLICE_MIN_SLOTS = 12
+    BOOKING_MAX_SKIPPED_SHARE = 0.05
+    USE_VOCAB_CACHE = False
+    VOCAB_POOL_SIZE = 10000
+    VOCAB_SEED = 12345
+    VOCAB_CACHE_PATH = "vocab_cache.pkl"
+    FETCH_BATCH_ROWS = 50000
+    GENERATOR_SEED = None
+    GENERATOR_REFERENCE_TIME = None
+    CHECKPOINT_PATH = "generation_checkpoint.pkl"
+    CHECKPOINT_INTERVAL_SEC = 10
+    EMIT_FILE_PARTITIONS = 4
+    SCALE_FACTOR = 1
+    ESTIMATE_INSERT_ROWS_PER_SEC = 20000
+    ESTIMATE_BULK_ROWS_PER_SEC = 200000
+    FAST_LOAD_TABLES = ("dbo.Booking", "dbo.Orders", "dbo.OrdersItem", "dbo.Review")
+    FAST_LOAD_REBUILD_STREAMS = 4
+    FAST_LOAD_RECOVERY_MODEL = "BULK_LOGGED"
+    FAST_LOAD_STATE_PATH = "fast_load_state.txt"
+    METRICS_PROGRESS_SEC = 10
+    METRICS_REPORT_PATH = "generation_metrics.json"
+    BATCH_AUTOTUNE = False
+    BATCH_TUNE_SAMPLES = 8
+    BATCH_TUNE_LATENCY_LIMIT_SEC = 2.0
+
+# Параметры инкрементального режима (--incremental) - из общего с симулятором config.py
+try:
+    from config import (
+        INCREMENTAL_CLIENTS, INCREMENTAL_RESTAURANTS, DATA_START_DATE, DATA_END_DATE,
+        AVG_BOOKINGS_PER_CLIENT_PER_YEAR, AVG_ORDERS_PER_BOOKING, REVIEW_PROBABILITY_PER_BOOKING
+    )
+except ImportError:
+    print("WARNING: config.py not found or incomplete. Using default incremental parameters.")
+    INCREMENTAL_CLIENTS = 200
+    INCREMENTAL_RESTAURANTS = 5
+    DATA_END_DATE = datetime.datetime.now()
+    DATA_START_DATE = DATA_END_DATE - datetime.timedelta(days=25 * 365)
+    AVG_BOOKINGS_PER_CLIENT_PER_YEAR = 30
+    AVG_ORDERS_PER_BOOKING = 0.9
+    REVIEW_PROBABILITY_PER_BOOKING = 0.15
+
+#  Глобальные реестры ID (отрезки подряд идущих ключей, см. id_registry.py) 
+existing_client_ids = IdRegistry()
+existing_restaurant_ids = IdRegistry()
+existing_table_ids = IdRegistry()
+existing_menu_ids = IdRegistry()
 existing_booking_status_ids = {}
-existing_booking_ids = []
-existing_order_ids = []
-existing_review_ids = []
+existing_booking_ids = IdRegistry(payload_typecode='i') # payload - RestaurantID бронирования (INT, 4 байта; 0 - неизвестен)
+existing_order_ids = IdRegistry()
+existing_review_ids = IdRegistry()
 
 
-client_registration_dates_cache = {}
 restaurant_menu_items_cache = {}
 menu_item_prices_cache = {} # menu_id: Decimal price
+table_restaurant_cache = {}   # table_id: restaurant_id
+table_capacity_cache = {}     # table_id: max (вместимость столика)
 
 #  Счетчики для ID 
 next_available_client_id_counter = 1
@@ -53,6 +128,29 @@ next_available_restaurant_id_counter = 1
 next_available_table_id_counter = 1
 next_available_booking_status_id_counter = 1
 
+# Выдача диапазонов IDENTITY-ключей (Menu, Booking, Orders, Review), создается в main_generate
+id_allocator = None
+# Контрольная точка прогона (checkpoint.py), создается в main_generate
+checkpoint = None
+# Пул процессов для синтеза строк Faker (None - синтез в основном процессе)
+synth_executor = None
+# Пулы значений для режима словаря (USE_VOCAB_CACHE), загружаются в main_generate
+vocabulary = None
+# Режим быстрой загрузки (fast_load.py, --fast-load), None - обычная вставка
+fast_load = None
+# Метрики фаз (metrics.py), создаются в main_generate
+generator_metrics = GeneratorMetrics()
+# Период дат инкрементальной дельты (start, end); None - последние DATE_RANGE_YEARS лет
+generation_window = None
+# "Сейчас" прогона: все окна дат отсчитываются от него, а не от часов - данные не зависят от дня запуска
+reference_time = None
+
+
+def phase_window():
+    """Окно дат для бронирований, отзывов (и регистраций клиентов в инкрементальном режиме)."""
+    return generation_window or date_window(DATE_RANGE_YEARS, reference_time)
+
+
 #  Константы для длины полей 
 DB_BOOKING_STATUS_NAME_MAX_LEN = 10
 DB_CLIENT_NAME_MAX_LEN = 50
@@ -66,6 +164,28 @@ DB_PAYMENT_METHOD_MAX_LEN = 20
 DB_PAYMENT_STATUS_MAX_LEN = 20
 DB_REVIEW_COMMENT_MAX_LEN = 500
 
+# Ограничения длины в виде словаря - передаются в процессы синтеза (row_synth.py)
+TEXT_MAX_LENS = {
+    "client_name": DB_CLIENT_NAME_MAX_LEN, "client_phone": DB_CLIENT_PHONE_MAX_LEN,
+    "client_email": DB_CLIENT_EMAIL_MAX_LEN, "restaurant_name": DB_RESTAURANT_NAME_MAX_LEN,
+    "restaurant_addres": DB_RESTAURANT_ADDRES_MAX_LEN, "restaurant_cuisine": DB_RESTAURANT_CUISINE_MAX_LEN,
+    "menu_dishname": DB_MENU_DISHNAME_MAX_LEN, "review_comment": DB_REVIEW_COMMENT_MAX_LEN,
+}
+
+#  Колонки таблиц для пакетной вставки (порядок совпадает с кортежами строк) 
+BOOKING_STATUS_COLUMNS = ("StatusID", "status_name")
+CLIENT_COLUMNS = ("ClientID", "Name", "phone", "email", "registration_date")
+RESTAURANT_COLUMNS = ("RestarauntID", "Name", "addres", "cuisine")
+TABLE_COLUMNS = ("TableID", "RestaurantID", "max")
+MENU_COLUMNS = ("MenuID", "RestaurantID", "DishName", "Price")
+BOOKING_COLUMNS = ("BookingID", "ClientID", "StatusID", "TableID", "BookingDate")
+ORDER_COLUMNS = ("OrderID", "BookingID", "StatusOrder", "total_price")
+ORDER_ITEM_COLUMNS = ("OrderID", "MenuID", "Price_At_Order")
+PAYMENT_COLUMNS = ("OrderID", "Method", "Payment_Status")
+REVIEW_COLUMNS = ("ReviewID", "ClientID", "RestaurantID", "Rating", "Comment", "ReviewDate")
+
+TABLE_CAPACITIES = [2, 4, 6, 8, 10]
+
 # Глобальный словарь target_statuses для использования в populate и generate_bookings
 target_statuses = {
     "В ожидании": 1, "Подтвержено": 2, "Отменено": 3, "Завершено": 4
@@ -73,7 +193,9 @@ target_statuses = {
 
 async def get_db_pool():
     try:
-        pool = await aioodbc.create_pool(dsn=DB_CONN_STR, autocommit=False, minsize=2, maxsize=10)
+        # Каждому шарду нужно свое соединение, плюс одно для резервирования ключей
+        pool = await create_pool(DB_CONN_STR, DB_POOL_MIN_SIZE, max(DB_POOL_MAX_SIZE, GENERATOR_SHARDS + 1),
+                                 DB_EXECUTOR_WORKERS, autocommit=False)
         print("Connection pool created successfully.")
         return pool
     except Exception as e:
@@ -81,10 +203,27 @@ async def get_db_pool():
         traceback.print_exc()
         exit(1)
 
-async def fetch_existing_ids_and_cache(pool):
+async def fetch_rows(cur, fetch_rows_count=FETCH_BATCH_ROWS):
+    """Строки результата потоком, по fetch_rows_count за раз - без fetchall на всю таблицу."""
+    while True:
+        rows = await cur.fetchmany(fetch_rows_count)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+
+async def fetch_existing_ids_and_cache(pool, incremental=False):
+    """
+    Загружает реестры ключей и кэши. incremental=True - из больших таблиц читаются
+    только отметки уровня: диапазон ClientID без COUNT_BIG, дата последнего бронирования
+    (возвращается), а ключи Booking/Orders/Review не читаются - заказы дельты
+    ссылаются только на бронирования дельты.
+    """
+    last_booking_date = None
     global existing_client_ids, existing_restaurant_ids, existing_table_ids, existing_menu_ids
     global existing_booking_status_ids, existing_booking_ids, existing_order_ids, existing_review_ids
-    global client_registration_dates_cache, restaurant_menu_items_cache, menu_item_prices_cache
+    global restaurant_menu_items_cache, menu_item_prices_cache, table_restaurant_cache, table_capacity_cache
     global next_available_client_id_counter, next_available_restaurant_id_counter
     global next_available_table_id_counter, next_available_booking_status_id_counter
     print("Fetching existing IDs and caching data...")
@@ -107,99 +246,104 @@ async def fetch_existing_ids_and_cache(pool):
                     next_available_booking_status_id_counter = 1 # Начнется с 1, если target_statuses пуст или не совпадает
                 print(f"  Found {len(temp_bs_cache)} booking statuses in DB. Next potential StatusID: {next_available_booking_status_id_counter}. Cache size: {len(existing_booking_status_ids)}")
 
+                # Клиентам и ресторанам нужны только ключи: плотный диапазон
+                # регистрируется по MIN/MAX/COUNT без чтения столбца
+                load_keys = load_key_range if incremental else load_registry
+                max_client_id = await load_keys(existing_client_ids, cur, "dbo.Client", "ClientID", FETCH_BATCH_ROWS)
+                next_available_client_id_counter = (max_client_id or 0) + 1
+                print(f"  Found {len(existing_client_ids)} clients ({existing_client_ids.run_count} key runs). Next ClientID: {next_available_client_id_counter}")
 
-                await cur.execute("SELECT ClientID, registration_date FROM dbo.Client")
-                current_client_ids_in_db = []
-                for row in await cur.fetchall():
-                    current_client_ids_in_db.append(row[0])
-                    client_registration_dates_cache[row[0]] = row[1]
-                existing_client_ids.extend(current_client_ids_in_db)
-                if current_client_ids_in_db:
-                    next_available_client_id_counter = max(current_client_ids_in_db) + 1
-                else:
-                    next_available_client_id_counter = 1
-                print(f"  Found and cached {len(existing_client_ids)} clients. Next ClientID: {next_available_client_id_counter}")
-
-                await cur.execute("SELECT RestarauntID FROM dbo.Restaraunt")
-                current_restaurant_ids_in_db = [row[0] for row in await cur.fetchall()]
-                existing_restaurant_ids.extend(current_restaurant_ids_in_db)
-                if current_restaurant_ids_in_db:
-                    next_available_restaurant_id_counter = max(current_restaurant_ids_in_db) + 1
-                else:
-                    next_available_restaurant_id_counter = 1
+                max_restaurant_id = await load_registry(existing_restaurant_ids, cur, "dbo.Restaraunt", "RestarauntID", FETCH_BATCH_ROWS)
+                next_available_restaurant_id_counter = (max_restaurant_id or 0) + 1
                 print(f"  Found {len(existing_restaurant_ids)} restaurants. Next RestarauntID: {next_available_restaurant_id_counter}")
 
-                await cur.execute("SELECT TableID FROM dbo.RestaurantTable")
-                current_table_ids_in_db = [row[0] for row in await cur.fetchall()]
-                existing_table_ids.extend(current_table_ids_in_db)
-                if current_table_ids_in_db:
-                    next_available_table_id_counter = max(current_table_ids_in_db) + 1
-                else:
-                    next_available_table_id_counter = 1
+                await cur.execute("SELECT TableID, RestaurantID, max FROM dbo.RestaurantTable ORDER BY TableID")
+                async for table_id, rest_id, capacity in fetch_rows(cur):
+                    existing_table_ids.append(table_id)
+                    table_restaurant_cache[table_id] = rest_id
+                    table_capacity_cache[table_id] = capacity
+                next_available_table_id_counter = (existing_table_ids.max_id() or 0) + 1
                 print(f"  Found {len(existing_table_ids)} restaurant tables. Next TableID: {next_available_table_id_counter}")
 
-                await cur.execute("SELECT MenuID, RestaurantID, Price FROM dbo.Menu")
-                for row in await cur.fetchall():
-                    menu_id, rest_id, price = row[0], row[1], Decimal(row[2])
+                await cur.execute("SELECT MenuID, RestaurantID, Price FROM dbo.Menu ORDER BY MenuID")
+                async for menu_id, rest_id, price in fetch_rows(cur):
                     existing_menu_ids.append(menu_id)
-                    menu_item_prices_cache[menu_id] = price # Храним Decimal
+                    menu_item_prices_cache[menu_id] = Decimal(price) # Храним Decimal
                     if rest_id not in restaurant_menu_items_cache:
                         restaurant_menu_items_cache[rest_id] = []
                     restaurant_menu_items_cache[rest_id].append(menu_id)
                 print(f"  Found and cached {len(existing_menu_ids)} menu items.")
 
-                await cur.execute("SELECT BookingID FROM dbo.Booking")
-                existing_booking_ids = [row[0] for row in await cur.fetchall()]
+                if incremental:
+                    last_booking_date = await read_last_booking_date(cur, DATA_END_DATE)
+                    print(f"  Last booking date: {last_booking_date}. Booking, order and review keys are not loaded.")
+                    return last_booking_date
+
+                # Ресторан бронирования нужен заказам; он хранится в payload реестра (array по рангу)
+                await cur.execute(
+                    "SELECT b.BookingID, ISNULL(t.RestaurantID, 0) FROM dbo.Booking b "
+                    "LEFT JOIN dbo.RestaurantTable t ON t.TableID = b.TableID ORDER BY b.BookingID"
+                )
+                async for booking_id, rest_id in fetch_rows(cur):
+                    existing_booking_ids.append(booking_id, rest_id)
                 print(f"  Found {len(existing_booking_ids)} bookings.")
 
-                await cur.execute("SELECT OrderID FROM dbo.Orders")
-                existing_order_ids = [row[0] for row in await cur.fetchall()]
+                await load_registry(existing_order_ids, cur, "dbo.Orders", "OrderID", FETCH_BATCH_ROWS)
                 print(f"  Found {len(existing_order_ids)} orders from dbo.Orders.")
 
-                await cur.execute("SELECT ReviewID FROM dbo.Review")
-                existing_review_ids = [row[0] for row in await cur.fetchall()]
+                await load_registry(existing_review_ids, cur, "dbo.Review", "ReviewID", FETCH_BATCH_ROWS)
                 print(f"  Found {len(existing_review_ids)} reviews.")
     except Exception as e:
         print(f"Error fetching/caching: {e}")
         traceback.print_exc()
-
-def generate_random_date(start_year_offset=DATE_RANGE_YEARS, end_year_offset=0, past_only=True):
-    if start_year_offset == 0 and end_year_offset == 0 and past_only: # Для дат "в этом году"
-        return fake.date_time_this_decade(before_now=True, after_now=False) # Ближе к date_time_this_year
+    return last_booking_date
+
+async def synth_chunks(kind, phase_name, total):
+    """
+    Асинхронный генератор (номер пачки, смещение, куски полей) для сущности kind
+    по SYNTH_CHUNK_ROWS строк. Пачки, уже закоммиченные по контрольной точке,
+    не синтезируются. При SYNTH_PROCESSES > 0 куски синтезируются в процессах
+    synth_executor, а цикл событий только забирает готовые результаты и вставляет их.
+    Впереди считается не больше 2 * SYNTH_PROCESSES кусков, так что память ограничена.
+    """
+    # Семя куска зависит только от семени прогона, фазы и номера пачки, поэтому
+    # пачка после --resume синтезируется так же, как в прерванном запуске
+    chunks = [(index, offset, count, batch_seed(phase_name, index, "synth"))
+              for index, offset, count in pending_batches(phase_name, total)]
+    if vocabulary is not None:
+        # Режим словаря: выборка по индексам дешевле пересылки кусков между процессами
+        for index, offset, count, seed in chunks:
+            yield index, offset, sample_chunk(vocabulary, kind, count, seed, reference_time)
+        return
+    if synth_executor is None:
+        for index, offset, count, seed in chunks:
+            yield index, offset, synthesize_chunk(kind, count, seed, TEXT_MAX_LENS, reference_time)
+        return
+
+    loop = asyncio.get_running_loop()
+    pending_chunks = iter(chunks)
+    in_flight = collections.deque()
+
+    def submit(chunk):
+        index, offset, count, seed = chunk
+        future = loop.run_in_executor(synth_executor, synthesize_chunk, kind, count, seed, TEXT_MAX_LENS, reference_time)
+        in_flight.append((index, offset, future))
+
+    for chunk in pending_chunks:
+        submit(chunk)
+        if len(in_flight) >= 2 * SYNTH_PROCESSES:
+            break
     try:
-        now = datetime.datetime.now()
-        current_year = now.year
-        effective_start_offset = max(0, start_year_offset)
-        start_date_dt = datetime.datetime(current_year - effective_start_offset, 1, 1)
-
-        if past_only:
-            effective_end_offset = max(0, end_year_offset)
-            end_date_dt = now - datetime.timedelta(days=effective_end_offset * 365)
-        else:
-            effective_end_offset_days = end_year_offset
-            end_date_dt = now + datetime.timedelta(days=effective_end_offset_days * 365 if effective_end_offset_days > 0 else effective_end_offset_days)
-
-        if start_date_dt > end_date_dt:
-            if past_only:
-                end_date_dt = now
-                if start_date_dt > end_date_dt : start_date_dt = end_date_dt - datetime.timedelta(days=1)
-            else:
-                temp = start_date_dt
-                start_date_dt = end_date_dt
-                end_date_dt = temp
-                if start_date_dt > end_date_dt:
-                     start_date_dt = now - datetime.timedelta(days=1)
-                     end_date_dt = now + datetime.timedelta(days=1)
-
-        time_between_dates = end_date_dt - start_date_dt
-        if time_between_dates.total_seconds() < 0:
-            return fake.date_time_this_decade(before_now=True, after_now=False)
-
-        random_seconds_offset = random.uniform(0, time_between_dates.total_seconds())
-        random_date_dt = start_date_dt + datetime.timedelta(seconds=random_seconds_offset)
-        return random_date_dt.replace(microsecond=0)
-    except Exception:
-        return fake.date_time_this_decade(before_now=True, after_now=False)
+        while in_flight:
+            index, offset, future = in_flight.popleft()
+            fields_chunk = await future
+            next_chunk = next(pending_chunks, None)
+            if next_chunk is not None:
+                submit(next_chunk)
+            yield index, offset, fields_chunk
+    finally:
+        for _, _, future in in_flight:
+            future.cancel()
 
 
 async def populate_booking_statuses(pool):
@@ -274,403 +418,780 @@ async def populate_booking_statuses(pool):
             print(f"  Cache Info: Target status '{name_key}' (expected ID {id_val}) is cached with ID {existing_booking_status_ids[name_key]}. This can happen if name exists with different ID in DB or generated new ID.")
 
 
-async def generate_clients(pool, num_clients):
-    # ... (код без изменений) ...
-    global next_available_client_id_counter
-    if num_clients == 0: return []
-    print(f"Generating {num_clients} clients...")
-    clients_data_with_ids = []
-    newly_generated_ids = []
-
-    for _ in range(num_clients):
-        reg_date = fake.date_time_this_decade(before_now=True, after_now=False) 
-        raw_phone_number = fake.msisdn() 
-        display_phone = raw_phone_number[:DB_CLIENT_PHONE_MAX_LEN] # Обрезка
-        current_client_id = next_available_client_id_counter
-        clients_data_with_ids.append((
-            current_client_id,
-            fake.name()[:DB_CLIENT_NAME_MAX_LEN],
-            display_phone,
-            fake.email()[:DB_CLIENT_EMAIL_MAX_LEN],
-            reg_date
-        ))
-        next_available_client_id_counter += 1
-
+async def emit_booking_statuses(pool):
+    """Режим выгрузки в файлы: статусы пишутся с ID из target_statuses (целевая БД пустая)."""
+    print("Writing Booking_status rows...")
+    rows = [(id_val, name_key[:DB_BOOKING_STATUS_NAME_MAX_LEN].strip()) for name_key, id_val in target_statuses.items()]
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            inserted_count = 0
-            for client_tuple_with_id in clients_data_with_ids:
-                try:
-                    await cur.execute(
-                        "INSERT INTO dbo.Client (ClientID, Name, phone, email, registration_date) VALUES (?, ?, ?, ?, ?);",
-                        *client_tuple_with_id
-                    )
-                    new_id = client_tuple_with_id[0]
-                    newly_generated_ids.append(new_id)
-                    existing_client_ids.append(new_id)
-                    client_registration_dates_cache[new_id] = client_tuple_with_id[4]
-                    inserted_count +=1
-                except Exception as e:
-                    print(f"  Error inserting client with explicit ID {client_tuple_with_id[0]} (Phone: {client_tuple_with_id[2]}, Email: {client_tuple_with_id[3]}): {e}")
-            if inserted_count > 0: await conn.commit()
-            else: await conn.rollback()
-    print(f"  Generated/inserted {len(newly_generated_ids)} clients with explicit IDs.")
-    return newly_generated_ids
+            await bulk_insert(cur, "dbo.Booking_status", BOOKING_STATUS_COLUMNS, rows)
+            await conn.commit()
+    existing_booking_status_ids.update(target_statuses)
+
+
+def batch_seed(phase_name, batch_index, stream):
+    """Семя потока stream ("synth", "columns", ...) пачки batch_index фазы phase_name."""
+    return derive_seed(checkpoint.seed, phase_name, batch_index, stream)
+
+
+def pending_batches(phase_name, total):
+    """(номер, смещение, размер) пачек фазы по SYNTH_CHUNK_ROWS строк, еще не закоммиченных по контрольной точке."""
+    for index, (offset, count) in enumerate(chunk_ranges(total, SYNTH_CHUNK_ROWS)):
+        if not checkpoint.batch_done(phase_name, index):
+            yield index, offset, count
+
+
+async def begin_phase(phase_name, target, reserve_keys):
+    """
+    Объем и ключи фазы: из контрольной точки, если фаза уже начиналась, иначе target и
+    ключи reserve_keys() (range или корутина, возвращающая range), которые сразу
+    записываются в контрольную точку.
+    """
+    state = checkpoint.phase_state(phase_name)
+    if state is None or "keys" not in state:
+        keys = reserve_keys()
+        if inspect.isawaitable(keys):
+            keys = await keys
+        state = checkpoint.start_phase(phase_name, target, keys)
+    elif checkpoint.is_replaying(phase_name):
+        print(f"  Resuming phase '{phase_name}': {len(state['batches_done'])} batches already committed.")
+    generator_metrics.phase(phase_name).target = state["target"]
+    return state["target"], state["keys"]
+
+
+# Подбор размера INSERT по таблицам (batch_tuner.py, BATCH_AUTOTUNE): {table: BatchTuner}
+batch_tuners = {}
+
+
+def tuner_for(table, columns):
+    """Тюнер размера оператора для таблицы; None - фиксированный BATCH_SIZE."""
+    if not BATCH_AUTOTUNE:
+        return None
+    tuner = batch_tuners.get(table)
+    if tuner is None:
+        tuner = batch_tuners[table] = BatchTuner(table, len(columns), BATCH_SIZE, BULK_INSERT_MODE,
+                                                 BATCH_TUNE_SAMPLES, BATCH_TUNE_LATENCY_LIMIT_SEC)
+    return tuner
+
+
+def insert_results(result):
+    """Результат insert_batch -> список BulkInsertResult (у заказов это заказы плюс позиции и платежи)."""
+    if isinstance(result, BulkInsertResult):
+        return [result]
+    return [r for part in result for r in insert_results(part)]
+
+
+async def insert_stream(pool, phase_name, batches, insert_batch, on_commit):
+    """
+    Фаза пишет пачки (номер, строки...) через ограниченную очередь (bulk_writer.stream_insert)
+    на GENERATOR_SHARDS соединениях. on_commit учитывает записанные строки; в том же шаге
+    пачка отмечается в контрольной точке. Если хоть одна пачка откатилась, фаза падает:
+    она не отмечается завершенной, и --resume повторит только неотмеченные пачки.
+    """
+    metrics = generator_metrics.phase(phase_name)
+
+    def committed(batch, result):
+        on_commit(batch, result)
+        checkpoint.mark_batch_done(phase_name, batch[0])
+        parts = insert_results(result)
+        metrics.record_rows(len(parts[0].inserted), sum(len(part.inserted) for part in parts[1:]))
+        for part in parts:
+            for _, e in part.failed:
+                metrics.record_error(e)
+
+    metrics.start()
+    try:
+        failed_batches = await stream_insert(pool, batches, insert_batch, GENERATOR_SHARDS, STREAM_QUEUE_BATCHES,
+                                             on_commit=committed, metrics=metrics)
+    finally:
+        metrics.finish()
+    if failed_batches:
+        raise RuntimeError(f"{failed_batches} batches of phase '{phase_name}' were rolled back; "
+                           f"rerun with --resume to insert them")
 
 
-async def generate_restaurants(pool, num_restaurants):
-    global next_available_restaurant_id_counter
-    if num_restaurants == 0: return []
-    print(f"Generating {num_restaurants} restaurants...")
-    restaurants_data_with_ids = []
-    newly_generated_ids = []
-    cuisines = ["итальянская", "китайская", "мексиканская", "японская", "французская", "индийская"] 
-    for _ in range(num_restaurants):
-        current_restaurant_id = next_available_restaurant_id_counter
-        restaurants_data_with_ids.append((
-            current_restaurant_id,
-            fake.company()[:DB_RESTAURANT_NAME_MAX_LEN],
-            fake.address().replace("\n", ", ")[:DB_RESTAURANT_ADDRES_MAX_LEN], 
-            random.choice(cuisines)[:DB_RESTAURANT_CUISINE_MAX_LEN] 
-        ))
-        next_available_restaurant_id_counter += 1
-
-    if not restaurants_data_with_ids: return []
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            inserted_count = 0
-            for rest_tuple_with_id in restaurants_data_with_ids:
-                try:
-                    await cur.execute(
-                        "INSERT INTO dbo.Restaraunt (RestarauntID, Name, addres, cuisine) VALUES (?, ?, ?, ?);",
-                        *rest_tuple_with_id
-                    )
-                    new_id = rest_tuple_with_id[0]
-                    newly_generated_ids.append(new_id)
-                    existing_restaurant_ids.append(new_id)
-                    inserted_count += 1
-                except Exception as e:
-                    print(f"  Error inserting restaurant with explicit ID {rest_tuple_with_id[0]} (Name: {rest_tuple_with_id[1]}, Addr: {rest_tuple_with_id[2]}): {e}")
-            if inserted_count > 0: await conn.commit()
-            else: await conn.rollback()
-    print(f"  Generated/inserted {len(newly_generated_ids)} restaurants with explicit IDs.")
-    return newly_generated_ids
-
-
-async def generate_restaurant_tables(pool, avg_tables_per_restaurant):
-    global next_available_table_id_counter
-    if not existing_restaurant_ids or avg_tables_per_restaurant == 0: return []
-
-    num_tables_target = NUM_CLIENTS_TO_GENERATE 
-    if num_tables_target == 0 and avg_tables_per_restaurant > 0: 
-        num_tables_target = int(len(existing_restaurant_ids) * avg_tables_per_restaurant)
-    if num_tables_target == 0 : return []
+async def generate_clients(pool, num_clients):
+    if num_clients == 0: return 0
+    print(f"Generating {num_clients} clients...")
+    inserted_count = 0
+
+    # Блок ключей забирается из счетчика до первого await, поэтому параллельные
+    # корутины никогда не получат пересекающиеся ClientID
+    def reserve_client_ids():
+        global next_available_client_id_counter
+        first_client_id = next_available_client_id_counter
+        next_available_client_id_counter += num_clients
+        return range(first_client_id, first_client_id + num_clients)
+
+    num_clients, client_ids = await begin_phase("clients", num_clients, reserve_client_ids)
+    # Пачки, которые прерванный запуск мог закоммитить после последнего сохранения,
+    # перед повторной вставкой удаляются по диапазону ключей
+    replay = checkpoint.is_replaying("clients")
+
+    async def client_batches():
+        async for index, offset, fields_chunk in synth_chunks("client", "clients", num_clients):
+            if generation_window is not None:
+                # Инкрементальная дельта: клиенты регистрируются в периоде дельты
+                reg_dates = to_py(ColumnGenerator(batch_seed("clients", index, "columns")).datetimes(*generation_window, len(fields_chunk)))
+                fields_chunk = [fields[:3] + (reg_date,) for fields, reg_date in zip(fields_chunk, reg_dates)]
+            clients_data_with_ids = []
+            for current_client_id, (name, display_phone, email, reg_date) in zip(client_ids[offset:], fields_chunk):
+                clients_data_with_ids.append((current_client_id, name, display_phone, email, reg_date))
+            yield index, clients_data_with_ids
+
+    async def insert_clients(cur, batch):
+        _, clients_data_with_ids = batch
+        if replay:
+            await delete_key_range(cur, "dbo.Client", "ClientID", clients_data_with_ids[0][0], clients_data_with_ids[-1][0])
+        result = await bulk_insert(cur, "dbo.Client", CLIENT_COLUMNS, clients_data_with_ids, BATCH_SIZE, BULK_INSERT_MODE,
+                                   tuner=tuner_for("dbo.Client", CLIENT_COLUMNS))
+        for client_tuple_with_id, e in result.failed:
+            print(f"  Error inserting client with explicit ID {client_tuple_with_id[0]} (Phone: {client_tuple_with_id[2]}, Email: {client_tuple_with_id[3]}): {e}")
+        return result
+
+    def clients_committed(batch, result):
+        nonlocal inserted_count
+        for client_tuple_with_id in result.inserted:
+            existing_client_ids.append(client_tuple_with_id[0])
+        inserted_count += len(result.inserted)
+
+    await insert_stream(pool, "clients", client_batches(), insert_clients, clients_committed)
+    print(f"  Generated/inserted {inserted_count} clients with explicit IDs.")
+    return inserted_count
 
 
+async def generate_restaurants(pool, num_restaurants):
+    if num_restaurants == 0: return 0
+    print(f"Generating {num_restaurants} restaurants...")
+    inserted_count = 0
+
+    def reserve_restaurant_ids():
+        global next_available_restaurant_id_counter
+        first_restaurant_id = next_available_restaurant_id_counter
+        next_available_restaurant_id_counter += num_restaurants
+        return range(first_restaurant_id, first_restaurant_id + num_restaurants)
+
+    num_restaurants, restaurant_ids = await begin_phase("restaurants", num_restaurants, reserve_restaurant_ids)
+    replay = checkpoint.is_replaying("restaurants")
+
+    async def restaurant_batches():
+        async for index, offset, fields_chunk in synth_chunks("restaurant", "restaurants", num_restaurants):
+            restaurants_data_with_ids = []
+            for current_restaurant_id, (name, addres, cuisine) in zip(restaurant_ids[offset:], fields_chunk):
+                restaurants_data_with_ids.append((current_restaurant_id, name, addres, cuisine))
+            yield index, restaurants_data_with_ids
+
+    async def insert_restaurants(cur, batch):
+        _, restaurants_data_with_ids = batch
+        if replay:
+            await delete_key_range(cur, "dbo.Restaraunt", "RestarauntID", restaurants_data_with_ids[0][0], restaurants_data_with_ids[-1][0])
+        result = await bulk_insert(cur, "dbo.Restaraunt", RESTAURANT_COLUMNS, restaurants_data_with_ids, BATCH_SIZE, BULK_INSERT_MODE,
+                                   tuner=tuner_for("dbo.Restaraunt", RESTAURANT_COLUMNS))
+        for rest_tuple_with_id, e in result.failed:
+            print(f"  Error inserting restaurant with explicit ID {rest_tuple_with_id[0]} (Name: {rest_tuple_with_id[1]}, Addr: {rest_tuple_with_id[2]}): {e}")
+        return result
+
+    def restaurants_committed(batch, result):
+        nonlocal inserted_count
+        for rest_tuple_with_id in result.inserted:
+            existing_restaurant_ids.append(rest_tuple_with_id[0])
+        inserted_count += len(result.inserted)
+
+    await insert_stream(pool, "restaurants", restaurant_batches(), insert_restaurants, restaurants_committed)
+    print(f"  Generated/inserted {inserted_count} restaurants with explicit IDs.")
+    return inserted_count
+
+
+async def generate_restaurant_tables(pool, num_tables_target):
+    if not existing_restaurant_ids or num_tables_target == 0: return 0
+
+    def reserve_table_ids():
+        global next_available_table_id_counter
+        first_table_id = next_available_table_id_counter
+        next_available_table_id_counter += num_tables_target
+        return range(first_table_id, first_table_id + num_tables_target)
+
+    num_tables_target, table_ids = await begin_phase("tables", num_tables_target, reserve_table_ids)
+    replay = checkpoint.is_replaying("tables")
     print(f"Generating approximately {num_tables_target} restaurant tables...")
-    tables_data_with_ids = []
-    newly_generated_table_ids_total = []
-
-    for _ in range(num_tables_target):
-        if not existing_restaurant_ids: break 
-        current_table_id = next_available_table_id_counter
-        rest_id = random.choice(existing_restaurant_ids)
-        tables_data_with_ids.append((current_table_id, rest_id, random.choice([2, 4, 6, 8, 10])))
-        next_available_table_id_counter += 1
-
-
-    if not tables_data_with_ids: return []
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            inserted_count = 0
-            for table_tuple_with_id in tables_data_with_ids:
-                try:
-                    await cur.execute(
-                        "INSERT INTO dbo.RestaurantTable (TableID, RestaurantID, max) VALUES (?, ?, ?);",
-                        *table_tuple_with_id
-                    )
-                    new_id = table_tuple_with_id[0]
-                    newly_generated_table_ids_total.append(new_id)
-                    existing_table_ids.append(new_id)
-                    inserted_count += 1
-                except Exception as e:
-                    print(f"  Error inserting restaurant table with explicit ID {table_tuple_with_id[0]}: {e}")
-            if inserted_count > 0: await conn.commit()
-            else: await conn.rollback()
-    print(f"  Generated/inserted {len(newly_generated_table_ids_total)} restaurant tables with explicit IDs.")
-    return newly_generated_table_ids_total
-
-
-async def generate_menu_items(pool, avg_items_per_restaurant):
-    if not existing_restaurant_ids or avg_items_per_restaurant == 0: return []
-    
-    num_menu_items_target = NUM_CLIENTS_TO_GENERATE 
-    if num_menu_items_target == 0 and avg_items_per_restaurant > 0 :
-        num_menu_items_target = int(len(existing_restaurant_ids) * avg_items_per_restaurant)
-    if num_menu_items_target == 0 : return []
+    inserted_count = 0
+    restaurant_ids_col = id_column(existing_restaurant_ids)
+
+    async def table_batches():
+        for index, offset, count in pending_batches("tables", num_tables_target):
+            columns = ColumnGenerator(batch_seed("tables", index, "columns"))
+            yield index, list(zip(
+                table_ids[offset:offset + count],
+                to_py(columns.choice(restaurant_ids_col, count)),
+                to_py(columns.choice(TABLE_CAPACITIES, count)),
+            ))
+
+    async def insert_tables(cur, batch):
+        _, tables_data_with_ids = batch
+        if replay:
+            await delete_key_range(cur, "dbo.RestaurantTable", "TableID", tables_data_with_ids[0][0], tables_data_with_ids[-1][0])
+        result = await bulk_insert(cur, "dbo.RestaurantTable", TABLE_COLUMNS, tables_data_with_ids, BATCH_SIZE, BULK_INSERT_MODE,
+                                   tuner=tuner_for("dbo.RestaurantTable", TABLE_COLUMNS))
+        for table_tuple_with_id, e in result.failed:
+            print(f"  Error inserting restaurant table with explicit ID {table_tuple_with_id[0]}: {e}")
+        return result
+
+    def tables_committed(batch, result):
+        nonlocal inserted_count
+        for table_id, rest_id, capacity in result.inserted:
+            existing_table_ids.append(table_id)
+            table_restaurant_cache[table_id] = rest_id
+            table_capacity_cache[table_id] = capacity
+        inserted_count += len(result.inserted)
+
+    await insert_stream(pool, "tables", table_batches(), insert_tables, tables_committed)
+    print(f"  Generated/inserted {inserted_count} restaurant tables with explicit IDs.")
+    return inserted_count
+
+
+async def generate_menu_items(pool, num_menu_items_target):
+    if not existing_restaurant_ids or num_menu_items_target == 0: return 0
 
     print(f"Generating approximately {num_menu_items_target} menu items...")
-    menu_data_to_insert = []
-    newly_generated_menu_ids_total = []
-    
-    generated_count = 0
-    while generated_count < num_menu_items_target and existing_restaurant_ids :
-        rest_id = random.choice(existing_restaurant_ids)
-        price_decimal = Decimal(round(random.uniform(5, 100), 2))
-        price_str = str(price_decimal)
-        dish_name = fake.word().capitalize()[:DB_MENU_DISHNAME_MAX_LEN]
-        menu_data_to_insert.append((rest_id, dish_name, price_str)) 
-        generated_count +=1
-        if generated_count >= num_menu_items_target : break
-
-    if not menu_data_to_insert: return []
+    num_menu_items_target, menu_ids = await begin_phase("menu", num_menu_items_target, lambda: id_allocator.reserve("dbo.Menu", num_menu_items_target))
+    replay = checkpoint.is_replaying("menu")
+    inserted_count = 0
+    restaurant_ids_col = id_column(existing_restaurant_ids)
+
+    async def menu_batches():
+        async for index, offset, fields_chunk in synth_chunks("menu", "menu", num_menu_items_target):
+            count = len(fields_chunk)
+            columns = ColumnGenerator(batch_seed("menu", index, "columns"))
+            # Цены считаются в копейках (целые), строка для DECIMAL собирается только здесь
+            yield index, list(zip(
+                menu_ids[offset:offset + count],
+                to_py(columns.choice(restaurant_ids_col, count)),
+                (dish_name for (dish_name,) in fields_chunk),
+                map(cents_to_str, to_py(columns.prices_cents(500, 10000, count))),
+            ))
+
+    async def insert_menu(cur, batch):
+        _, menu_data_to_insert = batch
+        if replay:
+            await delete_key_range(cur, "dbo.Menu", "MenuID", menu_data_to_insert[0][0], menu_data_to_insert[-1][0])
+        result = await bulk_insert(cur, "dbo.Menu", MENU_COLUMNS, menu_data_to_insert, BATCH_SIZE, BULK_INSERT_MODE,
+                                   identity_insert=True, tuner=tuner_for("dbo.Menu", MENU_COLUMNS))
+        for item_tuple, e in result.failed:
+            print(f"  Error inserting menu item (RestID: {item_tuple[1]}, Name: {item_tuple[2]}, PriceStr: {item_tuple[3]}): {e}")
+        return result
+
+    def menu_committed(batch, result):
+        nonlocal inserted_count
+        for new_id, rest_id_for_menu, _, price_str in result.inserted:
+            existing_menu_ids.append(new_id)
+            menu_item_prices_cache[new_id] = Decimal(price_str)
+            if rest_id_for_menu not in restaurant_menu_items_cache:
+                restaurant_menu_items_cache[rest_id_for_menu] = []
+            restaurant_menu_items_cache[rest_id_for_menu].append(new_id)
+        inserted_count += len(result.inserted)
+
+    await insert_stream(pool, "menu", menu_batches(), insert_menu, menu_committed)
+    print(f"  Generated/inserted {inserted_count} menu items.")
+    return inserted_count
+
+async def read_booked_slots(pool, start, end, own_keys):
+    """
+    Брони из базы, чьи слоты задевают отрезок [start, end), кроме ключей самой фазы
+    (own_keys: после --resume пачка пересчитывается так же, как в первый раз): [(момент, TableID)].
+    """
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            inserted_count = 0
-            for item_tuple in menu_data_to_insert: 
-                try:
- 
-                    await cur.execute(
-                        "SET NOCOUNT ON; INSERT INTO dbo.Menu (RestaurantID, DishName, Price) VALUES (?, ?, ?); SELECT SCOPE_IDENTITY();",
-                        item_tuple[0], item_tuple[1], item_tuple[2] 
-                    )
-                    new_id_row = await cur.fetchone()
-                    if new_id_row and new_id_row[0] is not None:
-                        new_id = int(new_id_row[0])
-                        newly_generated_menu_ids_total.append(new_id)
-                        existing_menu_ids.append(new_id)
-                        menu_item_prices_cache[new_id] = Decimal(item_tuple[2])
-                        rest_id_for_menu = item_tuple[0]
-                        if rest_id_for_menu not in restaurant_menu_items_cache:
-                            restaurant_menu_items_cache[rest_id_for_menu] = []
-                        restaurant_menu_items_cache[rest_id_for_menu].append(new_id)
-                        inserted_count += 1
-                except Exception as e:
-                    print(f"  Error inserting menu item (RestID: {item_tuple[0]}, Name: {item_tuple[1]}, PriceStr: {item_tuple[2]}): {e}")
-            if inserted_count > 0: await conn.commit()
-            else: await conn.rollback()
-    print(f"  Generated/inserted {len(newly_generated_menu_ids_total)} menu items.")
-    return newly_generated_menu_ids_total
-
-async def generate_bookings(pool, avg_bookings_param):
-    if not existing_client_ids or not existing_table_ids or not existing_booking_status_ids: return []
-    num_bookings_target = NUM_CLIENTS_TO_GENERATE
-    if num_bookings_target == 0 and avg_bookings_param > 0:
-        num_bookings_target = int(min(len(existing_client_ids) * 5, len(existing_table_ids) * 3) * avg_bookings_param)
-    if num_bookings_target == 0: return []
+            await cur.execute(
+                "SELECT BookingDate, TableID FROM dbo.Booking "
+                "WHERE BookingDate > ? AND BookingDate < ? AND BookingID NOT BETWEEN ? AND ?",
+                start - datetime.timedelta(minutes=BOOKING_SLOT_MINUTES), end, own_keys[0], own_keys[-1])
+            rows = [(booking_date, table_id) for booking_date, table_id in await cur.fetchall()]
+            await conn.commit()
+    return rows
+
+
+async def generate_bookings(pool, num_bookings_target):
+    if not existing_client_ids or not existing_table_ids or not existing_booking_status_ids: return 0
+    if num_bookings_target == 0: return 0
 
 
     print(f"Generating {num_bookings_target} bookings...")
-    bookings_data = []
-    newly_generated_booking_ids_total = []
+    inserted_count = 0
 
     status_ids_for_choice = [existing_booking_status_ids[name] for name in target_statuses.keys() if name in existing_booking_status_ids]
     if not status_ids_for_choice:
         print("  Error: No valid status IDs found in cache for booking generation. Check populate_booking_statuses.")
-        return []
-
-    for _ in range(num_bookings_target):
-        if not existing_client_ids or not status_ids_for_choice or not existing_table_ids: break
-        client_id = random.choice(existing_client_ids)
-        status_id = random.choice(status_ids_for_choice)
-        table_id = random.choice(existing_table_ids)
-        booking_date = fake.date_time_this_decade(before_now=True, after_now=False) 
-        bookings_data.append((client_id, status_id, table_id, booking_date))
-
-    if not bookings_data: return []
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            inserted_count = 0
-            for book_tuple in bookings_data:
-                try:
-                    await cur.execute(
-                        "SET NOCOUNT ON; INSERT INTO dbo.Booking (ClientID, StatusID, TableID, BookingDate) VALUES (?, ?, ?, ?); SELECT SCOPE_IDENTITY();",
-                        *book_tuple
-                    )
-                    new_id_row = await cur.fetchone()
-                    if new_id_row and new_id_row[0] is not None:
-                        new_id = int(new_id_row[0])
-                        newly_generated_booking_ids_total.append(new_id)
-                        existing_booking_ids.append(new_id)
-                        inserted_count +=1
-                except Exception as e:
-                     print(f"  Error inserting booking: {e}")
-            if inserted_count > 0: await conn.commit()
-            else: await conn.rollback()
-    print(f"  Generated/inserted {len(newly_generated_booking_ids_total)} bookings.")
-    return newly_generated_booking_ids_total
-
-
-async def generate_orders_and_related(pool, chance_booking_has_order, avg_items_per_order):
-    num_orders_target = NUM_CLIENTS_TO_GENERATE # Ориентир
-    if not existing_booking_ids or not existing_menu_ids: return
-    if num_orders_target == 0 and chance_booking_has_order > 0:
-        num_orders_target = int(len(existing_booking_ids) * chance_booking_has_order)
-    if num_orders_target == 0: return
+        return 0
+
+    num_bookings_target, booking_ids = await begin_phase("bookings", num_bookings_target, lambda: id_allocator.reserve("dbo.Booking", num_bookings_target))
+    replay = checkpoint.is_replaying("bookings")
+    client_ids_col = id_column(existing_client_ids)
+    window_start, window_end = phase_window()
+    # Брони раскладываются по свободным слотам столиков (booking_timeline.py).
+    # Окно делится на отрезки времени не короче BOOKING_SLICE_MIN_SLOTS слотов (в отрезке
+    # бронь начинается не позже чем за слот до его конца: на коротких отрезках брони
+    # теснились бы в начале или не помещались вовсе). Пачки подряд делят отрезок: он
+    # раскладывается целиком, и пачка берет свою часть по времени - поэтому ключи и даты
+    # растут вместе и кластерный индекс Booking заполняется с конца
+    planner = BookingPlanner({table_id: table_capacity_cache.get(table_id, max(TABLE_CAPACITIES))
+                              for table_id in existing_table_ids})
+    num_batches = max(1, -(-num_bookings_target // SYNTH_CHUNK_ROWS))
+    window_span = window_end - window_start
+    min_slice = datetime.timedelta(minutes=BOOKING_SLOT_MINUTES * BOOKING_SLICE_MIN_SLOTS)
+    num_slices = max(1, min(num_batches, window_span // min_slice))
+
+    def slice_rows(slice_index):
+        """(смещение, строк) отрезка: пачки с index * num_slices // num_batches == slice_index."""
+        first = -(-slice_index * num_batches // num_slices)
+        last = -(-(slice_index + 1) * num_batches // num_slices)
+        offset = first * SYNTH_CHUNK_ROWS
+        return offset, min(num_bookings_target, last * SYNTH_CHUNK_ROWS) - offset
+
+    async def booking_batches():
+        placed_slice, placed, slice_offset = None, [], 0
+        for index, offset, count in pending_batches("bookings", num_bookings_target):
+            slice_index = index * num_slices // num_batches
+            if slice_index != placed_slice:
+                slice_start = window_start + window_span * slice_index / num_slices
+                slice_end = window_start + window_span * (slice_index + 1) / num_slices
+                slice_offset, slice_count = slice_rows(slice_index)
+                # Брони в базе (прошлые прогоны, симулятор) занимают слоты: один запрос на отрезок.
+                # В режиме выгрузки таблицы пусты
+                occupied = [] if isinstance(pool, FileEmitPool) else await read_booked_slots(
+                    pool, slice_start, slice_end, booking_ids)
+                placed = planner.place(random.Random(batch_seed("bookings", slice_index, "timeline")), slice_count,
+                                       slice_start, slice_end, occupied)
+                placed_slice = slice_index
+            # Не поместившиеся брони отрезка срезают его хвост: последним пачкам достается меньше строк
+            batch_placed = placed[offset - slice_offset:offset - slice_offset + count]
+            columns = ColumnGenerator(batch_seed("bookings", index, "columns"))
+            yield index, [
+                (booking_id, client_id, status_id, table_id, booking_date)
+                for booking_id, client_id, status_id, (booking_date, table_id) in zip(
+                    booking_ids[offset:offset + len(batch_placed)],
+                    to_py(columns.choice(client_ids_col, len(batch_placed))),
+                    to_py(columns.choice(status_ids_for_choice, len(batch_placed))),
+                    batch_placed,
+                )
+            ]
+
+    async def insert_bookings(cur, batch):
+        _, bookings_data = batch
+        if not bookings_data:
+            # Брони отрезка кончились раньше его последних пачек: вставлять нечего
+            return BulkInsertResult()
+        if replay:
+            await delete_key_range(cur, "dbo.Booking", "BookingID", bookings_data[0][0], bookings_data[-1][0])
+        result = await bulk_insert(cur, "dbo.Booking", BOOKING_COLUMNS, bookings_data, BATCH_SIZE, BULK_INSERT_MODE,
+                                   identity_insert=True,
+                                   tuner=tuner_for("dbo.Booking", BOOKING_COLUMNS))
+        for book_tuple, e in result.failed:
+            print(f"  Error inserting booking {book_tuple[0]}: {e}")
+        return result
+
+    def bookings_committed(batch, result):
+        nonlocal inserted_count
+        for booking_id, _, _, table_id, _ in result.inserted:
+            existing_booking_ids.append(booking_id, table_restaurant_cache.get(table_id, 0))
+        inserted_count += len(result.inserted)
+
+    await insert_stream(pool, "bookings", booking_batches(), insert_bookings, bookings_committed)
+    print(f"  Generated/inserted {inserted_count} bookings.")
+    if planner.skipped:
+        share = planner.skipped / num_bookings_target
+        print(f"  WARNING: {planner.skipped} of {num_bookings_target} bookings ({share:.1%}) were not placed: "
+              f"no free table slot in their time slice.")
+        if share > BOOKING_MAX_SKIPPED_SHARE:
+            raise RuntimeError(f"{share:.1%} of bookings could not be placed (limit {BOOKING_MAX_SKIPPED_SHARE:.0%}): "
+                               f"add tables, widen the date window or generate fewer bookings")
+    return inserted_count
+
+
+async def generate_orders_and_related(pool, num_orders_target, avg_items_per_order):
+    if not existing_booking_ids or not existing_menu_ids: return 0
+    if num_orders_target == 0: return 0
 
 
     print(f"Attempting to generate {num_orders_target} orders...")
 
     order_status_choices = [1, 2, 3] 
-    payment_methods = ["Наличные", "Карта", "Онлайн"]
-    payment_statuses = ["Оплачено", "В ожидании", "Не прошло"]
-
+    payment_methods = [m[:DB_PAYMENT_METHOD_MAX_LEN] for m in ["Наличные", "Карта", "Онлайн"]]
+    payment_statuses = [st[:DB_PAYMENT_STATUS_MAX_LEN] for st in ["Оплачено", "В ожидании", "Не прошло"]]
+
+    # Ключи заказов выданы заранее, поэтому позиции и платежи собираются
+    # сразу с настоящими OrderID - до какой-либо вставки
+    num_orders_target, order_ids = await begin_phase("orders", num_orders_target, lambda: id_allocator.reserve("dbo.Orders", num_orders_target))
+    replay = checkpoint.is_replaying("orders")
+    engine = OrderEngine(restaurant_menu_items_cache, menu_item_prices_cache, avg_items_per_order)
     orders_created_count = 0
-    generated_order_data = []
-    generated_orderitem_data = []
-    generated_payment_data = []
-    temp_order_index = 0
-
-    for _ in range(num_orders_target):
-        if not existing_booking_ids or not existing_menu_ids: break
-        booking_id = random.choice(existing_booking_ids)
-        status_order = random.choice(order_status_choices)
-        
-        menu_id_for_item = random.choice(existing_menu_ids)
-        # Price_At_Order в OrdersItem в int
-        price_at_order_for_item = random.randint(1, 10) 
-
-        # total_price в Orders у  int
-        total_price_for_order = price_at_order_for_item 
-
-        generated_order_data.append((booking_id, status_order, total_price_for_order))
-        generated_orderitem_data.append((temp_order_index, menu_id_for_item, price_at_order_for_item))
-
-        method = random.choice(payment_methods)[:DB_PAYMENT_METHOD_MAX_LEN]
-        pay_status = random.choice(payment_statuses)[:DB_PAYMENT_STATUS_MAX_LEN]
-        generated_payment_data.append((temp_order_index, method, pay_status))
-        temp_order_index +=1
-
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            final_orderitem_data = []
-            final_payment_data = []
-            for idx, order_data_tuple in enumerate(generated_order_data):
-                new_order_id = None
-                try:
-                    await cur.execute(
-                        "SET NOCOUNT ON; INSERT INTO dbo.Orders (BookingID, StatusOrder, total_price) VALUES (?, ?, ?); SELECT SCOPE_IDENTITY();",
-                        *order_data_tuple
-                    )
-                    new_order_id_row = await cur.fetchone()
-                    if not (new_order_id_row and new_order_id_row[0] is not None):
-                        print(f"  Skipped order item/payment due to failed Order insert for booking {order_data_tuple[0]}")
-                        continue
-                    new_order_id = int(new_order_id_row[0])
-                    existing_order_ids.append(new_order_id)
-                    orders_created_count +=1
-
-                    for oi_idx, oi_menu_id, oi_price in generated_orderitem_data:
-                        if oi_idx == idx:
-                            final_orderitem_data.append((new_order_id, oi_menu_id, oi_price))
-                    for p_idx, p_method, p_status in generated_payment_data:
-                        if p_idx == idx:
-                            final_payment_data.append((new_order_id, p_method, p_status))
-                except Exception as e_order:
-                    print(f"  Error inserting order for booking {order_data_tuple[0]}: {e_order}")
-
-            if final_orderitem_data:
-                try:
-                    await cur.executemany(
-                        "INSERT INTO dbo.OrdersItem (OrderID, MenuID, Price_At_Order) VALUES (?, ?, ?)",
-                        final_orderitem_data
-                    )
-                    print(f"    Inserted {len(final_orderitem_data)} order items.")
-                except Exception as e_oi:
-                    print(f"    Error inserting order items: {e_oi}")
-            if final_payment_data:
-                try:
-                    await cur.executemany(
-                        "INSERT INTO dbo.Payments (OrderID, Method, Payment_Status) VALUES (?, ?, ?)",
-                        final_payment_data
-                    )
-                    print(f"    Inserted {len(final_payment_data)} payments.")
-                except Exception as e_p:
-                    print(f"    Error inserting payments: {e_p}")
-
-            if orders_created_count > 0 or final_orderitem_data or final_payment_data:
-                 await conn.commit()
-            else:
-                 await conn.rollback()
+    items_created_count = 0
+    payments_created_count = 0
+
+    async def order_batches():
+        for index, offset, count in pending_batches("orders", num_orders_target):
+            columns = ColumnGenerator(batch_seed("orders", index, "columns"))
+            chunk_order_ids = order_ids[offset:offset + count]
+            # Бронирование выбирается по рангу: тот же ранг дает его ресторан из payload
+            booking_ranks = columns.integers(0, len(existing_booking_ids) - 1, count)
+            yield index, chunk_order_ids, engine.build(
+                batch_seed("orders", index, "items"),
+                chunk_order_ids,
+                to_py(existing_booking_ids.take(booking_ranks)),
+                to_py(existing_booking_ids.take_payload(booking_ranks)),
+                to_py(columns.choice(order_status_choices, count)),
+                to_py(columns.choice(payment_methods, count)),
+                to_py(columns.choice(payment_statuses, count)),
+            )
+
+    async def insert_orders(cur, batch):
+        # Заказ и его позиции/платежи - в одной транзакции на одном соединении,
+        # так что внешние ключи дочерних строк видят только что вставленные заказы
+        _, chunk_order_ids, order_batch = batch
+        if replay:
+            for table in ("dbo.OrdersItem", "dbo.Payments", "dbo.Orders"):
+                await delete_key_range(cur, table, "OrderID", chunk_order_ids[0], chunk_order_ids[-1])
+        result = await bulk_insert(cur, "dbo.Orders", ORDER_COLUMNS, order_batch.orders, BATCH_SIZE, BULK_INSERT_MODE,
+                                   identity_insert=True,
+                                   tuner=tuner_for("dbo.Orders", ORDER_COLUMNS))
+        failed_order_ids = set()
+        for order_data_tuple, e_order in result.failed:
+            failed_order_ids.add(order_data_tuple[0])
+            print(f"  Error inserting order for booking {order_data_tuple[1]}: {e_order}")
+
+        child_results = []
+        for table, child_columns, rows in (("dbo.OrdersItem", ORDER_ITEM_COLUMNS, order_batch.items), ("dbo.Payments", PAYMENT_COLUMNS, order_batch.payments)):
+            final_rows = [row for row in rows if row[0] not in failed_order_ids]
+            child_result = await bulk_insert(cur, table, child_columns, final_rows, BATCH_SIZE, BULK_INSERT_MODE,
+                                             tuner=tuner_for(table, child_columns))
+            for row, e in child_result.failed:
+                print(f"    Error inserting {table} row for order {row[0]}: {e}")
+            child_results.append(child_result)
+        return result, child_results
+
+    def orders_committed(batch, results):
+        nonlocal orders_created_count, items_created_count, payments_created_count
+        result, (items_result, payments_result) = results
+        for order_data_tuple in result.inserted:
+            existing_order_ids.append(order_data_tuple[0])
+        orders_created_count += len(result.inserted)
+        items_created_count += len(items_result.inserted)
+        payments_created_count += len(payments_result.inserted)
+
+    await insert_stream(pool, "orders", order_batches(), insert_orders, orders_committed)
+    if engine.skipped:
+        print(f"    Skipped {engine.skipped} orders: the booked restaurant has no menu items.")
+    print(f"    Inserted {items_created_count} order items and {payments_created_count} payments.")
     print(f"  Generated/inserted {orders_created_count} orders and their related items/payments.")
+    return orders_created_count
 
 
-async def generate_reviews(pool, avg_reviews_param):
-    num_reviews_target = NUM_CLIENTS_TO_GENERATE
-    if not existing_client_ids or not existing_restaurant_ids: return
-    if num_reviews_target == 0 and avg_reviews_param > 0:
-        num_reviews_target = int(min(len(existing_client_ids), len(existing_restaurant_ids) * 10) * avg_reviews_param)
-    if num_reviews_target == 0: return
+async def generate_reviews(pool, num_reviews_target):
+    if not existing_client_ids or not existing_restaurant_ids: return 0
+    if num_reviews_target == 0: return 0
 
     print(f"Generating {num_reviews_target} reviews...")
-    reviews_data = []
-
-    for _ in range(num_reviews_target):
-        if not existing_client_ids or not existing_restaurant_ids: break
-        client_id = random.choice(existing_client_ids)
-        restaurant_id = random.choice(existing_restaurant_ids)
-        rating = random.randint(1, 5)
-        comment = fake.text(max_nb_chars=DB_REVIEW_COMMENT_MAX_LEN)
-        review_date = fake.date_time_this_decade(before_now=True, after_now=False) 
-        reviews_data.append((client_id, restaurant_id, rating, comment, review_date))
-
-    if not reviews_data: return
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            inserted_count = 0
-            for review_tuple in reviews_data:
-                try:
-                    await cur.execute(
-                        "SET NOCOUNT ON; INSERT INTO dbo.Review (ClientID, RestaurantID, Rating, Comment, ReviewDate) VALUES (?, ?, ?, ?, ?); SELECT SCOPE_IDENTITY();",
-                        *review_tuple
-                    )
-                    new_id_row = await cur.fetchone()
-                    if new_id_row and new_id_row[0] is not None:
-                         existing_review_ids.append(int(new_id_row[0]))
-                    inserted_count += 1
-                except Exception as e:
-                    print(f"  Error inserting review (Client: {review_tuple[0]}, Rest: {review_tuple[1]}): {e}")
-            if inserted_count > 0: await conn.commit()
-            else: await conn.rollback()
-            print(f"  Generated/inserted {inserted_count} reviews.")
-
-
-async def main_generate():
+    inserted_count = 0
+
+    num_reviews_target, review_ids = await begin_phase("reviews", num_reviews_target, lambda: id_allocator.reserve("dbo.Review", num_reviews_target))
+    replay = checkpoint.is_replaying("reviews")
+    client_ids_col = id_column(existing_client_ids)
+    restaurant_ids_col = id_column(existing_restaurant_ids)
+    window_start, window_end = phase_window()
+
+    async def review_batches():
+        async for index, offset, fields_chunk in synth_chunks("review", "reviews", num_reviews_target):
+            count = len(fields_chunk)
+            columns = ColumnGenerator(batch_seed("reviews", index, "columns"))
+            yield index, list(zip(
+                review_ids[offset:offset + count],
+                to_py(columns.choice(client_ids_col, count)),
+                to_py(columns.choice(restaurant_ids_col, count)),
+                to_py(columns.integers(1, 5, count)),
+                (comment for (comment,) in fields_chunk),
+                to_py(columns.datetimes(window_start, window_end, count)),
+            ))
+
+    async def insert_reviews(cur, batch):
+        _, reviews_data = batch
+        if replay:
+            await delete_key_range(cur, "dbo.Review", "ReviewID", reviews_data[0][0], reviews_data[-1][0])
+        result = await bulk_insert(cur, "dbo.Review", REVIEW_COLUMNS, reviews_data, BATCH_SIZE, BULK_INSERT_MODE,
+                                   identity_insert=True,
+                                   tuner=tuner_for("dbo.Review", REVIEW_COLUMNS))
+        for review_tuple, e in result.failed:
+            print(f"  Error inserting review (Client: {review_tuple[1]}, Rest: {review_tuple[2]}): {e}")
+        return result
+
+    def reviews_committed(batch, result):
+        nonlocal inserted_count
+        for review_tuple in result.inserted:
+            existing_review_ids.append(review_tuple[0])
+        inserted_count += len(result.inserted)
+
+    await insert_stream(pool, "reviews", review_batches(), insert_reviews, reviews_committed)
+    print(f"  Generated/inserted {inserted_count} reviews.")
+    return inserted_count
+
+
+def generation_plan(scale_factor):
+    """Объемы новых строк по таблицам для scale_factor (см. sizing.py)."""
+    return build_plan(scale_factor, NUM_CLIENTS_TO_GENERATE, NUM_RESTAURANTS_TO_GENERATE,
+                      AVG_TABLES_PER_RESTAURANT, AVG_MENU_ITEMS_PER_RESTAURANT,
+                      AVG_BOOKINGS_PER_CLIENT_OR_TABLE, CHANCE_BOOKING_HAS_ORDER,
+                      AVG_ITEMS_PER_ORDER, AVG_REVIEWS_PER_RESTAURANT_OR_CLIENT)
+
+
+def incremental_generation_plan(window):
+    """Объемы инкрементальной дельты за window (см. incremental.py)."""
+    return build_incremental_plan(window, len(existing_client_ids), INCREMENTAL_CLIENTS, INCREMENTAL_RESTAURANTS,
+                                  AVG_TABLES_PER_RESTAURANT, AVG_MENU_ITEMS_PER_RESTAURANT,
+                                  AVG_BOOKINGS_PER_CLIENT_PER_YEAR, AVG_ORDERS_PER_BOOKING,
+                                  AVG_ITEMS_PER_ORDER, REVIEW_PROBABILITY_PER_BOOKING)
+
+
+def describe_plan(plan):
+    return ", ".join(f"{table.replace('dbo.', '')} {rows}" for table, rows in plan.items())
+
+
+def generation_params(plan, window=None):
+    """Параметры, от которых зависят объемы фаз и границы пачек: --resume допустим только при тех же значениях."""
+    return {
+        "plan": plan, "window": window, "items": AVG_ITEMS_PER_ORDER,
+        "chunk_rows": SYNTH_CHUNK_ROWS, "vocab": (USE_VOCAB_CACHE, VOCAB_POOL_SIZE, VOCAB_SEED),
+    }
+
+
+def generator_state():
+    """
+    Глобальное состояние генератора для контрольной точки. Плоский словарь: реестры
+    и словари кэшей сохраняются в журнал приращениями (checkpoint.py).
+    """
+    return {
+        "client_ids": existing_client_ids, "restaurant_ids": existing_restaurant_ids, "table_ids": existing_table_ids,
+        "menu_ids": existing_menu_ids, "booking_ids": existing_booking_ids, "order_ids": existing_order_ids,
+        "review_ids": existing_review_ids,
+        "booking_status_ids": existing_booking_status_ids,
+        "restaurant_menu_items": restaurant_menu_items_cache,
+        "menu_item_prices": menu_item_prices_cache,
+        "table_restaurant": table_restaurant_cache,
+        "table_capacity": table_capacity_cache,
+        "counters": (next_available_client_id_counter, next_available_restaurant_id_counter,
+                     next_available_table_id_counter, next_available_booking_status_id_counter),
+        "reference_time": reference_time,
+    }
+
+
+def restore_generator_state(state):
+    """Восстанавливает состояние из контрольной точки вместо fetch_existing_ids_and_cache."""
+    global existing_client_ids, existing_restaurant_ids, existing_table_ids, existing_menu_ids
+    global existing_booking_ids, existing_order_ids, existing_review_ids, existing_booking_status_ids
+    global restaurant_menu_items_cache, menu_item_prices_cache, table_restaurant_cache, table_capacity_cache
+    global next_available_client_id_counter, next_available_restaurant_id_counter
+    global next_available_table_id_counter, next_available_booking_status_id_counter, reference_time
+    existing_client_ids = state["client_ids"]
+    existing_restaurant_ids = state["restaurant_ids"]
+    existing_table_ids = state["table_ids"]
+    existing_menu_ids = state["menu_ids"]
+    existing_booking_ids = state["booking_ids"]
+    existing_order_ids = state["order_ids"]
+    existing_review_ids = state["review_ids"]
+    existing_booking_status_ids = state["booking_status_ids"]
+    restaurant_menu_items_cache = state["restaurant_menu_items"]
+    menu_item_prices_cache = state["menu_item_prices"]
+    table_restaurant_cache = state["table_restaurant"]
+    table_capacity_cache = state.get("table_capacity", {})
+    (next_available_client_id_counter, next_available_restaurant_id_counter,
+     next_available_table_id_counter, next_available_booking_status_id_counter) = state["counters"]
+    reference_time = state.get("reference_time") or reference_time
+    canonicalize_generated_state()
+
+
+def canonicalize_generated_state():
+    """
+    Приводит реестры ключей и списки блюд ресторанов к порядку ключей. Вставщики
+    коммитят пачки в порядке завершения, а внешние ключи выбираются по рангу в реестре:
+    без этого данные следующих фаз зависели бы от числа вставщиков и процессов синтеза.
+    """
+    for registry in (existing_client_ids, existing_restaurant_ids, existing_table_ids, existing_menu_ids,
+                     existing_booking_ids, existing_order_ids, existing_review_ids):
+        registry.sort()
+    for menu_ids in restaurant_menu_items_cache.values():
+        menu_ids.sort()
+
+
+def resumable(phase_name, func):
+    """Фаза, завершенная по контрольной точке, пропускается; после успешного выполнения отмечается."""
+    async def run(*args):
+        if checkpoint.is_phase_done(phase_name):
+            print(f"Phase '{phase_name}' already completed in the checkpoint, skipping.")
+            return 0
+        result = await func(*args)
+        # До запуска зависимых фаз: они выбирают ключи этой фазы по рангу
+        canonicalize_generated_state()
+        checkpoint.mark_phase_done(phase_name)
+        return result
+    return run
+
+
+def create_fast_load(pool):
+    return FastLoad(pool, FAST_LOAD_TABLES, FAST_LOAD_REBUILD_STREAMS, FAST_LOAD_RECOVERY_MODEL,
+                    FAST_LOAD_STATE_PATH)
+
+
+async def main_fast_load_finish():
+    """--fast-load-finish: перестроить индексы и проверить ограничения после прерванного прогона."""
+    pool = await get_db_pool()
+    try:
+        loader = create_fast_load(pool)
+        await loader.finish()
+        loader.print_report()
+    finally:
+        pool.close()
+        await pool.wait_closed()
+
+
+async def main_generate(resume=False, emit_dir=None, scale_factor=SCALE_FACTOR, use_fast_load=False, incremental=False,
+                        take_snapshot=False, seed=GENERATOR_SEED, reference=GENERATOR_REFERENCE_TIME):
     start_time = time.time()
     print(f"[{datetime.datetime.now()}] Data generation script started.")
-    pool = await get_db_pool()
-    if not pool: return
+    global id_allocator, synth_executor, vocabulary, checkpoint, fast_load, generator_metrics, generation_window
+    global reference_time
+    succeeded = False   # True - все фазы прошли; иначе код возврата 1
+    plan = generation_plan(scale_factor)
+    generation_window = None
+    if not incremental:
+        print(f"Scale factor {scale_factor:g}: {describe_plan(plan)}")
+    if emit_dir and incremental:
+        print("--incremental appends to the database and cannot be combined with --emit-files.")
+        return False
+    if emit_dir and take_snapshot:
+        # Выгрузка в файлы сама является снимком: ее загружает load_files.py
+        print("--snapshot captures the database; --emit-files output can be reloaded with load_files.py as is.")
+        return False
+    if emit_dir and use_fast_load:
+        # Файлы грузятся через BULK INSERT: быстрая загрузка включается в load_files.py --fast-load
+        print("--fast-load applies to the database load; use it with load_files.py for --emit-files output.")
+        return False
+    if emit_dir:
+        # Режим выгрузки в файлы: без ODBC, ключи считаются с 1 - файлы грузятся
+        # в пустую базу (load_files.py). Повторить пачку в файле нельзя, поэтому без --resume
+        if resume:
+            print("--resume is not supported together with --emit-files.")
+            return False
+        print(f"File-emit mode: writing bulk-load files to {emit_dir}.")
+        pool = FileEmitPool(emit_dir, EMIT_FILE_PARTITIONS)
+        id_allocator = LocalKeyAllocator()
+    else:
+        pool = await get_db_pool()
+        if not pool: return False
+        id_allocator = KeyRangeAllocator(pool)
+    generator_metrics = GeneratorMetrics()
+    progress_task = asyncio.create_task(generator_metrics.report_progress(METRICS_PROGRESS_SEC)) if METRICS_PROGRESS_SEC else None
+    if USE_VOCAB_CACHE:
+        vocabulary = load_or_build_vocabulary(VOCAB_CACHE_PATH, VOCAB_POOL_SIZE, VOCAB_SEED, TEXT_MAX_LENS)
+    elif SYNTH_PROCESSES > 0:
+        synth_executor = concurrent.futures.ProcessPoolExecutor(max_workers=SYNTH_PROCESSES)
 
     try:
-        # fetch_existing_ids_and_cache должен быть первым, чтобы инициализировать счетчики
-        await fetch_existing_ids_and_cache(pool)
-        # populate_booking_statuses использует свой счетчик или вставляет по ID из target_statuses
-        await populate_booking_statuses(pool)
-
-        if NUM_CLIENTS_TO_GENERATE > 0:
-            await generate_clients(pool, NUM_CLIENTS_TO_GENERATE)
-        if NUM_RESTAURANTS_TO_GENERATE > 0:
-            await generate_restaurants(pool, NUM_RESTAURANTS_TO_GENERATE)
-        if AVG_TABLES_PER_RESTAURANT > 0 and existing_restaurant_ids: # AVG_TABLES_PER_RESTAURANT из конфига
-            await generate_restaurant_tables(pool, AVG_TABLES_PER_RESTAURANT)
-        
-        if AVG_MENU_ITEMS_PER_RESTAURANT > 0 and existing_restaurant_ids: # AVG_MENU_ITEMS_PER_RESTAURANT из конфига
-            await generate_menu_items(pool, AVG_MENU_ITEMS_PER_RESTAURANT)
-        
-        if AVG_BOOKINGS_PER_CLIENT_OR_TABLE > 0 and existing_client_ids and existing_table_ids and existing_booking_status_ids:
-            await generate_bookings(pool, AVG_BOOKINGS_PER_CLIENT_OR_TABLE)
-        
-        if CHANCE_BOOKING_HAS_ORDER > 0 and AVG_ITEMS_PER_ORDER > 0 and existing_booking_ids and existing_menu_ids and existing_booking_status_ids:
-            await generate_orders_and_related(pool, CHANCE_BOOKING_HAS_ORDER, AVG_ITEMS_PER_ORDER)
-        
-        if AVG_REVIEWS_PER_RESTAURANT_OR_CLIENT > 0 and existing_client_ids and existing_restaurant_ids:
-            await generate_reviews(pool, AVG_REVIEWS_PER_RESTAURANT_OR_CLIENT)
+        if resume and CHECKPOINT_PATH and os.path.exists(CHECKPOINT_PATH):
+            # Реестры, кэши и счетчики берутся из контрольной точки - таблицы не перечитываются
+            # Инкрементальная дельта продолжается со своими объемами и периодом из файла:
+            # пересчитанные сейчас они бы уже не совпали (время ушло вперед)
+            params = None if incremental else generation_params(plan)
+            checkpoint = GenerationCheckpoint.load(CHECKPOINT_PATH, params, generator_state, CHECKPOINT_INTERVAL_SEC)
+            if incremental:
+                if checkpoint.params.get("window") is None:
+                    raise ValueError(f"Checkpoint {CHECKPOINT_PATH} belongs to a full run; resume it without --incremental")
+                plan, generation_window = checkpoint.params["plan"], checkpoint.params["window"]
+            restore_generator_state(checkpoint.saved_state)
+            print(f"Resuming from checkpoint {CHECKPOINT_PATH} (seed {checkpoint.seed}).")
+        else:
+            if resume:
+                print(f"No checkpoint at {CHECKPOINT_PATH}, starting a new run.")
+            if seed is None:
+                seed = random.SystemRandom().getrandbits(63)
+            reference_time = (reference or datetime.datetime.now()).replace(microsecond=0)
+            checkpoint_path = None if emit_dir else CHECKPOINT_PATH
+            last_booking_date = None
+            if not emit_dir:
+                # fetch_existing_ids_and_cache должен быть первым, чтобы инициализировать счетчики
+                last_booking_date = await fetch_existing_ids_and_cache(pool, incremental)
+            if incremental:
+                generation_window = incremental_window(last_booking_date, DATA_START_DATE, DATA_END_DATE)
+                plan = incremental_generation_plan(generation_window)
+            checkpoint = GenerationCheckpoint(checkpoint_path, generation_params(plan, generation_window), seed,
+                                              generator_state, CHECKPOINT_INTERVAL_SEC)
+            checkpoint.save()
+        # Семя и момент отсчета полностью определяют данные при тех же объемах, SYNTH_CHUNK_ROWS
+        # и режиме словаря - число процессов синтеза и вставщиков на них не влияет
+        print(f"Seed {checkpoint.seed}, reference time {reference_time}: rebuild the same data with "
+              f"--seed {checkpoint.seed} --reference-time '{reference_time}'.")
+        if incremental:
+            print(f"Incremental delta for {generation_window[0]} .. {generation_window[1]}: {describe_plan(plan)}")
+
+        # Фазы и их зависимости: независимые фазы (клиенты и рестораны, столики и меню)
+        # выполняются параллельно. Условия when проверяются в момент запуска фазы.
+        scheduler = PhaseScheduler()
+        statuses_phase = emit_booking_statuses if emit_dir else populate_booking_statuses
+        scheduler.add("statuses", resumable("statuses", statuses_phase), pool, provides=("statuses",))
+        scheduler.add("clients", resumable("clients", generate_clients), pool, plan["dbo.Client"],
+                      provides=("clients",), when=lambda: plan["dbo.Client"] > 0)
+        scheduler.add("restaurants", resumable("restaurants", generate_restaurants), pool, plan["dbo.Restaraunt"],
+                      provides=("restaurants",), when=lambda: plan["dbo.Restaraunt"] > 0)
+        scheduler.add("tables", resumable("tables", generate_restaurant_tables), pool, plan["dbo.RestaurantTable"],
+                      requires=("restaurants",), provides=("tables",),
+                      when=lambda: plan["dbo.RestaurantTable"] > 0 and existing_restaurant_ids)
+        scheduler.add("menu", resumable("menu", generate_menu_items), pool, plan["dbo.Menu"],
+                      requires=("restaurants",), provides=("menu",),
+                      when=lambda: plan["dbo.Menu"] > 0 and existing_restaurant_ids)
+        scheduler.add("bookings", resumable("bookings", generate_bookings), pool, plan["dbo.Booking"],
+                      requires=("clients", "tables", "statuses"), provides=("bookings",),
+                      when=lambda: plan["dbo.Booking"] > 0 and existing_client_ids and existing_table_ids and existing_booking_status_ids)
+        scheduler.add("orders", resumable("orders", generate_orders_and_related), pool, plan["dbo.Orders"], AVG_ITEMS_PER_ORDER,
+                      requires=("bookings", "menu"), provides=("orders",),
+                      when=lambda: plan["dbo.Orders"] > 0 and AVG_ITEMS_PER_ORDER > 0 and existing_booking_ids and existing_menu_ids and existing_booking_status_ids)
+        scheduler.add("reviews", resumable("reviews", generate_reviews), pool, plan["dbo.Review"],
+                      requires=("clients", "restaurants"), provides=("reviews",),
+                      when=lambda: plan["dbo.Review"] > 0 and existing_client_ids and existing_restaurant_ids)
+        if use_fast_load:
+            fast_load = create_fast_load(pool)
+        try:
+            if fast_load is not None:
+                # Индексы и ограничения отключаются один раз до всех фаз: тяжелые фазы идут параллельно с легкими
+                await fast_load.prepare()
+            await scheduler.run()
+        finally:
+            scheduler.print_report()
+            # Последнее состояние пишется и при ошибке, и при прерывании
+            checkpoint.flush()
+            if fast_load is not None:
+                # И после упавшей фазы: индексы, ограничения и модель восстановления возвращаются сразу;
+                # если не дошло и до этого (процесс убит), шаг повторяется через --fast-load-finish
+                await fast_load.finish()
+                fast_load.print_report()
+        # Упавшая фаза поднимает PhaseFailedError выше: снимок не снимается
         
         print("Data generation phase complete.")
+        if take_snapshot:
+            await capture_snapshot(pool)
+        succeeded = True
     except Exception as e:
         print(f"Error in main_generate: {e}")
         traceback.print_exc()
     finally:
+        if progress_task is not None:
+            progress_task.cancel()
+        if batch_tuners and not emit_dir:
+            # В файлы строки пишутся без операторов INSERT: подбирать нечего
+            print("Tuned rows per INSERT: " + ", ".join(f"{t.table} {t.size}" for t in batch_tuners.values()))
+            generator_metrics.batch_tuning = {table: t.to_dict() for table, t in batch_tuners.items()}
+        if pool and not emit_dir:
+            pool.stats.print_report()
+            generator_metrics.pool = pool.stats.to_dict()
+        if METRICS_REPORT_PATH:
+            generator_metrics.write_report(METRICS_REPORT_PATH)
+        if synth_executor is not None:
+            synth_executor.shutdown(cancel_futures=True)
         if pool:
             print("Closing connection pool...")
             pool.close()
@@ -678,6 +1199,7 @@ async def main_generate():
             print("Connection pool closed.")
     end_time = time.time()
     print(f"[{datetime.datetime.now()}] Script finished. Total time: {end_time - start_time:.2f}s.")
+    return succeeded
 
 if __name__ == "__main__":
     print(f"Using DATE_RANGE_YEARS = {DATE_RANGE_YEARS} for data span.")
@@ -697,10 +1219,53 @@ if __name__ == "__main__":
     print(f"Client.Name will be trimmed to {DB_CLIENT_NAME_MAX_LEN} chars.")
 
 
+    parser = argparse.ArgumentParser(description="Generate test data for the restaurant database.")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the run recorded in CHECKPOINT_PATH instead of starting a new one")
+    parser.add_argument("--emit-files", metavar="DIR", default=None,
+                        help="write bulk-load files to DIR instead of inserting over ODBC (load them with load_files.py)")
+    parser.add_argument("--scale-factor", type=float, default=SCALE_FACTOR,
+                        help="multiplier for all table sizes (default SCALE_FACTOR from config_generator.py)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="print expected row counts, data size and load time for the scale factor and exit")
+    parser.add_argument("--fast-load", action="store_true",
+                        help="disable nonclustered indexes and constraints of FAST_LOAD_TABLES during the load, "
+                             "rebuild and re-validate them afterwards")
+    parser.add_argument("--fast-load-finish", action="store_true",
+                        help="only rebuild disabled indexes, re-validate constraints and restore the recovery model "
+                             "left by an interrupted --fast-load run")
+    parser.add_argument("--incremental", action="store_true",
+                        help="append a delta sized by INCREMENTAL_* from config.py for the period since the last booking, "
+                             "reading only high-water marks of the large tables")
+    parser.add_argument("--seed", type=int, default=GENERATOR_SEED,
+                        help="base seed of all random streams (default GENERATOR_SEED; random if unset)")
+    parser.add_argument("--reference-time", type=datetime.datetime.fromisoformat, default=GENERATOR_REFERENCE_TIME,
+                        help="'now' of the generated data, e.g. '2025-01-01 00:00:00' (default: current time); "
+                             "with the same --seed and scale the data is identical on any machine and worker count")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="after the run, capture the dataset with snapshot.py (SNAPSHOT_MODE) "
+                             "so that `python snapshot.py restore` can reset the database to it")
+    args = parser.parse_args()
+
+    if args.fast_load_finish:
+        asyncio.run(main_fast_load_finish())
+        raise SystemExit(0)
+
+    if args.estimate:
+        print_estimate(generation_plan(args.scale_factor), args.scale_factor,
+                       ESTIMATE_INSERT_ROWS_PER_SEC, ESTIMATE_BULK_ROWS_PER_SEC)
+        raise SystemExit(0)
+
     try:
-        asyncio.run(main_generate())
+        succeeded = asyncio.run(main_generate(resume=args.resume, emit_dir=args.emit_files, scale_factor=args.scale_factor,
+                                              use_fast_load=args.fast_load, incremental=args.incremental,
+                                              take_snapshot=args.snapshot, seed=args.seed, reference=args.reference_time))
     except KeyboardInterrupt:
         print("\nData generation interrupted.")
+        succeeded = False
     except Exception as e_main:
         print(f"Unhandled exception in __main__: {e_main}")
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+        succeeded = False
+    # Код возврата 1 - прогон не завершен: упала фаза или неверные параметры
+    raise SystemExit(0 if succeeded else 1)
\ No newline at end of file
@@ -0,0 +1,234 @@
+# id_registry.py
+# Компактный реестр ключей для выбора внешних ключей генератором.
+# Ключи хранятся отрезками подряд идущих значений (array('q')), поэтому плотные
+# IDENTITY-ключи и заранее выданные диапазоны занимают O(число отрезков) памяти,
+# а не по объекту int на каждую строку. Случайная выборка идет по рангу.
+# Реестр может хранить одно целое значение на ключ (payload), например
+# RestaurantID бронирования; оно лежит в array по рангу ключа.
+from array import array
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class IdRegistry:
+    """Мультимножество ключей, закодированное отрезками [start, start + длина)."""
+
+    def __init__(self, ids=(), payload_typecode=None):
+        self._starts = array('q')   # первое значение отрезка
+        self._cum = array('q')      # накопленное число ключей по конец отрезка включительно
+        self._payload = array(payload_typecode) if payload_typecode else None
+        self._rank_index = None     # (сдвиг, первый отрезок каждой корзины рангов), строится лениво
+        self.extend(ids)
+
+    def __len__(self):
+        return self._cum[-1] if self._cum else 0
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        prev = 0
+        for start, cum in zip(self._starts, self._cum):
+            yield from range(start, start + cum - prev)
+            prev = cum
+
+    def __getstate__(self):
+        # Индекс рангов не сохраняется (контрольная точка): он строится заново при выборке
+        state = self.__dict__.copy()
+        state["_rank_index"] = None
+        return state
+
+    @property
+    def run_count(self):
+        return len(self._starts)
+
+    @property
+    def has_payload(self):
+        return self._payload is not None
+
+    def append(self, key, payload=0):
+        if self._starts and key == self._starts[-1] + self._run_length(-1):
+            self._cum[-1] += 1
+        else:
+            self._starts.append(key)
+            self._cum.append(len(self) + 1)
+        if self._payload is not None:
+            self._payload.append(payload)
+        self._rank_index = None
+
+    def extend(self, keys):
+        if isinstance(keys, range) and keys.step == 1:
+            self.add_range(keys.start, keys.stop)
+            return
+        for key in keys:
+            self.append(key)
+
+    def add_range(self, start, stop, payload=0):
+        """Добавляет ключи start..stop-1 одним отрезком (или продлевает последний)."""
+        count = stop - start
+        if count <= 0:
+            return
+        self._add_run(start, count)
+        if self._payload is not None:
+            self._payload.extend(array(self._payload.typecode, [payload]) * count)
+        self._rank_index = None
+
+    def _add_run(self, start, count):
+        if self._starts and start == self._starts[-1] + self._run_length(-1):
+            self._cum[-1] += count
+        else:
+            self._starts.append(start)
+            self._cum.append(len(self) + count)
+
+    def tail(self, rank):
+        """Ключи с рангами от rank до конца (вместе с payload) отдельным реестром - приращение для журнала."""
+        tail = IdRegistry(payload_typecode=self._payload.typecode if self._payload is not None else None)
+        for run in range(bisect_right(self._cum, rank), len(self._starts)):
+            run_rank = self._cum[run - 1] if run else 0
+            skip = max(0, rank - run_rank)
+            tail._add_run(self._starts[run] + skip, self._cum[run] - run_rank - skip)
+        if self._payload is not None:
+            tail._payload.extend(self._payload[rank:])
+        return tail
+
+    def append_registry(self, other):
+        """Дописывает ключи (и payload) другого реестра в его порядке."""
+        for run, start in enumerate(other._starts):
+            self._add_run(start, other._run_length(run))
+        if self._payload is not None:
+            self._payload.extend(other._payload)
+        self._rank_index = None
+
+    def clear(self):
+        del self._starts[:]
+        del self._cum[:]
+        if self._payload is not None:
+            del self._payload[:]
+        self._rank_index = None
+
+    def sort(self):
+        """
+        Упорядочивает ключи (вместе с payload) по возрастанию. Ключи уникальны, поэтому
+        переставляются целые отрезки; уже упорядоченный реестр не меняется.
+        """
+        starts, cum = self._starts, self._cum
+        if all(starts[i - 1] < starts[i] for i in range(1, len(starts))):
+            return
+        # (начало, ранг первого ключа, длина) каждого отрезка
+        runs = sorted((start, cum[i - 1] if i else 0, self._run_length(i)) for i, start in enumerate(starts))
+        payload = self._payload
+        self._payload = None
+        self.clear()
+        for start, _, length in runs:
+            self.add_range(start, start + length)
+        if payload is not None:
+            self._payload = array(payload.typecode)
+            for _, first_rank, length in runs:
+                self._payload.extend(payload[first_rank:first_rank + length])
+
+    def _run_length(self, index):
+        index %= len(self._cum)
+        return self._cum[index] - (self._cum[index - 1] if index else 0)
+
+    def max_id(self):
+        if not self._starts:
+            return None
+        return max(start + self._run_length(i) - 1 for i, start in enumerate(self._starts))
+
+    def _build_rank_index(self):
+        # Ранги делятся на корзины по 2**shift (не длиннее средней длины отрезка),
+        # для каждой корзины запоминается отрезок, в котором она начинается.
+        # Тогда поиск отрезка по рангу просматривает лишь отрезки одной корзины.
+        total = len(self)
+        shift = max(0, (total // max(1, len(self._cum))).bit_length() - 1)
+        first_runs = array('q')
+        run = 0
+        for bucket_start in range(0, total, 1 << shift):
+            while self._cum[run] <= bucket_start:
+                run += 1
+            first_runs.append(run)
+        first_runs.append(len(self._cum) - 1)
+        self._rank_index = (shift, first_runs)
+        return self._rank_index
+
+    def _run_of(self, rank):
+        shift, first_runs = self._rank_index or self._build_rank_index()
+        bucket = rank >> shift
+        return bisect_right(self._cum, rank, first_runs[bucket], first_runs[bucket + 1] + 1)
+
+    def value_at(self, rank):
+        """Ключ с порядковым номером rank (0 <= rank < len); в среднем O(1)."""
+        run = self._run_of(rank)
+        prev = self._cum[run - 1] if run else 0
+        return self._starts[run] + rank - prev
+
+    def payload_at(self, rank):
+        return self._payload[rank]
+
+    def take(self, ranks):
+        """Ключи для массива рангов; с NumPy - векторно через searchsorted."""
+        if np is not None and isinstance(ranks, np.ndarray):
+            cum = np.frombuffer(self._cum, dtype=np.int64)
+            starts = np.frombuffer(self._starts, dtype=np.int64)
+            run = np.searchsorted(cum, ranks, side="right")
+            prev = np.where(run > 0, cum[np.maximum(run - 1, 0)], 0)
+            return starts[run] + (ranks - prev)
+        return [self.value_at(rank) for rank in ranks]
+
+    def take_payload(self, ranks):
+        """Значения payload для массива рангов (те же ранги, что в take)."""
+        if np is not None and isinstance(ranks, np.ndarray):
+            return np.frombuffer(self._payload, dtype=self._payload.typecode)[ranks]
+        return [self._payload[rank] for rank in ranks]
+
+    def sample(self, rng):
+        """Один случайный ключ (rng - random.Random)."""
+        return self.value_at(rng.randrange(len(self)))
+
+
+async def load_registry(registry, cur, table, column, fetch_rows):
+    """
+    Добавляет в registry ключи column из table и возвращает MAX(column) (None для пустой таблицы).
+    Если ключи плотные (COUNT = MAX - MIN + 1), столбец не читается вовсе - добавляется
+    один отрезок; иначе ключи читаются потоком по fetch_rows строк в порядке возрастания.
+    """
+    await cur.execute(f"SELECT MIN({column}), MAX({column}), COUNT_BIG(*) FROM {table}")
+    row = await cur.fetchone()
+    if not row or not row[2]:
+        return None
+    low, high, count = row
+    if count == high - low + 1:
+        registry.add_range(low, high + 1)
+        return high
+    await cur.execute(f"SELECT {column} FROM {table} ORDER BY {column}")
+    while True:
+        rows = await cur.fetchmany(fetch_rows)
+        if not rows:
+            break
+        for (key,) in rows:
+            registry.append(key)
+    return high
+
+
+async def load_key_range(registry, cur, table, column, fetch_rows):
+    """
+    То же, что load_registry, но без COUNT_BIG по таблице: MIN/MAX берутся поиском
+    по ключу, а число строк - из метаданных sys.partitions. Для многомиллиардных
+    таблиц это чтение одних "отметок уровня"; ключи читаются потоком, только если диапазон с дырами.
+    """
+    await cur.execute(f"SELECT MIN({column}), MAX({column}) FROM {table}")
+    row = await cur.fetchone()
+    if not row or row[1] is None:
+        return None
+    low, high = row
+    await cur.execute("SELECT SUM(rows) FROM sys.partitions WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)", table)
+    count_row = await cur.fetchone()
+    if count_row and count_row[0] == high - low + 1:
+        registry.add_range(low, high + 1)
+        return high
+    print(f"  {table}.{column} has gaps, reading the keys.")
+    return await load_registry(registry, cur, table, column, fetch_rows)
@@ -0,0 +1,65 @@
+# incremental.py
+# Инкрементальный режим генератора (generate_data.py --incremental): вместо
+# полного набора к уже загруженным данным дописывается "дельта" за последний
+# период - INCREMENTAL_CLIENTS клиентов и INCREMENTAL_RESTAURANTS ресторанов
+# (из config.py) плюс бронирования, заказы и отзывы за время с предыдущего
+# прогона. Из больших таблиц читаются только отметки уровня (MAX ключа, дата
+# последнего бронирования), поэтому ночное пополнение многомиллиардного набора
+# занимает время, пропорциональное дельте, а не всему объему.
+import datetime
+
+# Дата последнего бронирования - по последним вставленным строкам (поиск по
+# ключу), без просмотра всей таблицы по BookingDate. Брони позже конца периода
+# данных не в счет: симулятор создает их на 1-30 дней вперед, и отметка по ним
+# сделала бы окно дельты пустым на месяц
+LAST_BOOKING_DATE_SQL = (
+    "SELECT MAX(BookingDate) FROM "
+    "(SELECT TOP (?) BookingDate FROM dbo.Booking WHERE BookingDate <= ? ORDER BY BookingID DESC) AS recent"
+)
+HIGH_WATER_SAMPLE_ROWS = 10000
+
+# Окно не длиннее года: после долгого перерыва дельта не разрастается до полного набора
+MAX_WINDOW_DAYS = 365
+
+
+async def read_last_booking_date(cur, data_end):
+    await cur.execute(LAST_BOOKING_DATE_SQL, HIGH_WATER_SAMPLE_ROWS, data_end)
+    row = await cur.fetchone()
+    return row[0] if row else None
+
+
+def incremental_window(last_booking_date, data_start, data_end, max_days=MAX_WINDOW_DAYS):
+    """
+    Период дельты: от последнего бронирования (или от data_end - max_days, если
+    бронирований нет) до data_end, но не раньше data_start и не длиннее max_days.
+    """
+    end = data_end.replace(microsecond=0)
+    earliest = max(data_start, end - datetime.timedelta(days=max_days))
+    start = max(last_booking_date or earliest, earliest)
+    return min(start, end).replace(microsecond=0), end
+
+
+def build_incremental_plan(window, existing_clients, new_clients, new_restaurants, tables_per_restaurant,
+                           menu_items_per_restaurant, bookings_per_client_per_year, orders_per_booking,
+                           items_per_order, review_probability):
+    """
+    Объемы дельты в том же виде, что sizing.build_plan. Бронирования делают все
+    клиенты (старые и новые) с частотой bookings_per_client_per_year за длину окна.
+    """
+    start, end = window
+    years = (end - start).total_seconds() / (365 * 24 * 3600)
+    clients = new_clients
+    restaurants = new_restaurants
+    bookings = round((existing_clients + clients) * bookings_per_client_per_year * years)
+    orders = round(bookings * orders_per_booking)
+    return {
+        "dbo.Client": clients,
+        "dbo.Restaraunt": restaurants,
+        "dbo.RestaurantTable": round(restaurants * tables_per_restaurant),
+        "dbo.Menu": round(restaurants * menu_items_per_restaurant),
+        "dbo.Booking": bookings,
+        "dbo.Orders": orders,
+        "dbo.OrdersItem": round(orders * items_per_order),
+        "dbo.Payments": orders,
+        "dbo.Review": round(bookings * review_probability),
+    }
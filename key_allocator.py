@@ -0,0 +1,78 @@
+# key_allocator.py
+# Резервирование непрерывных диапазонов IDENTITY-ключей на стороне клиента.
+# Вместо "INSERT ...; SELECT SCOPE_IDENTITY()" на каждую строку генератор
+# один раз сдвигает счетчик IDENTITY на count значений (DBCC CHECKIDENT RESEED),
+# а затем сам подставляет ключи из зарезервированного окна через IDENTITY_INSERT.
+# Так дочерние строки (OrdersItem, Payments) можно собрать до любой вставки.
+import asyncio
+
+# Таблицы с IDENTITY-ключом, для которых генератор резервирует ключи
+IDENTITY_KEY_COLUMNS = {
+    "dbo.Menu": "MenuID",
+    "dbo.Booking": "BookingID",
+    "dbo.Orders": "OrderID",
+    "dbo.Review": "ReviewID",
+}
+
+# TABLOCKX + HOLDLOCK не дают другим сессиям получить IDENTITY-значение,
+# пока счетчик не сдвинут за конец резервируемого окна. Окно считается только
+# от MAX(ключа): IDENT_CURRENT у таблицы, куда еще не вставляли строк, равен
+# затравке (1), и первый ключ вышел бы 2. У такой таблицы (last_value IS NULL)
+# следующая строка после RESEED получает само значение RESEED, а не RESEED + 1,
+# поэтому счетчик ставится на единицу дальше.
+RESERVE_KEY_RANGE_SQL = """
+SET NOCOUNT ON;
+DECLARE @count BIGINT = ?;
+DECLARE @last BIGINT;
+SELECT @last = ISNULL(MAX({key_column}), 0) FROM {table} WITH (TABLOCKX, HOLDLOCK);
+DECLARE @new_seed BIGINT = @last + @count;
+IF (SELECT last_value FROM sys.identity_columns WHERE object_id = OBJECT_ID('{table}')) IS NULL
+    SET @new_seed = @new_seed + 1;
+DBCC CHECKIDENT ('{table}', RESEED, @new_seed) WITH NO_INFOMSGS;
+SELECT @last + 1;
+"""
+
+
+class KeyRangeAllocator:
+    """Выдает непрерывные блоки IDENTITY-ключей; безопасен при конкурентных вызовах."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = asyncio.Lock()
+
+    async def reserve(self, table, count):
+        """Резервирует count ключей таблицы table и возвращает их как range."""
+        if count <= 0:
+            return range(0)
+        key_column = IDENTITY_KEY_COLUMNS[table]
+        sql = RESERVE_KEY_RANGE_SQL.format(table=table, key_column=key_column)
+        async with self._lock:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    try:
+                        await cur.execute(sql, count)
+                        row = await cur.fetchone()
+                        await conn.commit()
+                    except Exception:
+                        await conn.rollback()
+                        raise
+        first_key = int(row[0])
+        return range(first_key, first_key + count)
+
+
+class LocalKeyAllocator:
+    """
+    Выдача ключей без базы (режим выгрузки в файлы, bulk_files.py): у каждой таблицы
+    свой счетчик с first_key, т.е. файлы рассчитаны на загрузку в пустые таблицы.
+    """
+
+    def __init__(self, first_key=1):
+        self.first_key = first_key
+        self._next_keys = {}
+
+    async def reserve(self, table, count):
+        if count <= 0:
+            return range(0)
+        first_key = self._next_keys.get(table, self.first_key)
+        self._next_keys[table] = first_key + count
+        return range(first_key, first_key + count)
@@ -0,0 +1,83 @@
+import asyncio
+import aioodbc
+import argparse
+import datetime
+import time
+import traceback
+from bulk_files import load_directory
+from fast_load import FastLoad
+
+# Загрузка выгрузки generate_data.py --emit-files DIR в базу через BULK INSERT
+try:
+    from config_generator import (
+        DB_CONN_STR, BULK_LOAD_STREAMS, BULK_LOAD_BATCH_ROWS, FAST_LOAD_TABLES, FAST_LOAD_REBUILD_STREAMS,
+        FAST_LOAD_RECOVERY_MODEL, FAST_LOAD_STATE_PATH
+    )
+except ImportError:
+    print("WARNING: config_generator.py not found or incomplete. Using default load parameters.")
+    DB_CONN_STR = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=ACER;DATABASE=TestDB;Trusted_Connection=yes;"
+    BULK_LOAD_STREAMS = 4
+    BULK_LOAD_BATCH_ROWS = 100000
+    FAST_LOAD_TABLES = ("dbo.Booking", "dbo.Orders", "dbo.OrdersItem", "dbo.Review")
+    FAST_LOAD_REBUILD_STREAMS = 4
+    FAST_LOAD_RECOVERY_MODEL = "BULK_LOGGED"
+    FAST_LOAD_STATE_PATH = "fast_load_state.txt"
+
+
+async def main_load(directory, server_directory, streams, use_fast_load=False, finish_only=False):
+    start_time = time.time()
+    print(f"[{datetime.datetime.now()}] Bulk load of {directory} started ({streams} parallel streams).")
+    succeeded = False   # Код возврата 1, если загрузка или ее завершение упали
+    pool = await aioodbc.create_pool(dsn=DB_CONN_STR, minsize=1,
+                                     maxsize=max(streams, FAST_LOAD_REBUILD_STREAMS) + 1, autocommit=False)
+    fast_load = FastLoad(pool, FAST_LOAD_TABLES, FAST_LOAD_REBUILD_STREAMS, FAST_LOAD_RECOVERY_MODEL,
+                         FAST_LOAD_STATE_PATH)
+    try:
+        if finish_only:
+            await fast_load.finish()
+            fast_load.print_report()
+            return True
+        if use_fast_load:
+            await fast_load.prepare()
+        timings = await load_directory(pool, directory, server_directory, streams, BULK_LOAD_BATCH_ROWS)
+        total_rows = sum(rows for rows, _ in timings.values())
+        print(f"Loaded {total_rows} rows into {len(timings)} tables.")
+        if use_fast_load:
+            await fast_load.finish()
+            fast_load.print_report()
+        succeeded = True
+    except Exception as e:
+        print(f"Error in main_load: {e}")
+        traceback.print_exc()
+    finally:
+        pool.close()
+        await pool.wait_closed()
+    print(f"[{datetime.datetime.now()}] Script finished. Total time: {time.time() - start_time:.2f}s.")
+    return succeeded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load files written by generate_data.py --emit-files with BULK INSERT.")
+    parser.add_argument("directory", help="directory with manifest.json and table partitions")
+    parser.add_argument("--server-dir", default=None,
+                        help="the same directory as seen by SQL Server (defaults to the local absolute path)")
+    parser.add_argument("--streams", type=int, default=BULK_LOAD_STREAMS,
+                        help="partitions of one heap table loaded in parallel (tables with a clustered index load one partition at a time)")
+    parser.add_argument("--fast-load", action="store_true",
+                        help="disable nonclustered indexes and constraints of FAST_LOAD_TABLES during the load, "
+                             "rebuild and re-validate them afterwards")
+    parser.add_argument("--fast-load-finish", action="store_true",
+                        help="only rebuild disabled indexes, re-validate constraints and restore the recovery model "
+                             "left by an interrupted --fast-load run")
+    args = parser.parse_args()
+    try:
+        succeeded = asyncio.run(main_load(args.directory, args.server_dir, args.streams, args.fast_load,
+                                          args.fast_load_finish))
+    except KeyboardInterrupt:
+        print("\nBulk load interrupted.")
+        succeeded = False
+    except Exception as e_main:
+        print(f"Unhandled exception in __main__: {e_main}")
+        traceback.print_exc()
+        succeeded = False
+    raise SystemExit(0 if succeeded else 1)
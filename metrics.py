@@ -0,0 +1,237 @@
+# metrics.py
+# Метрики генератора по фазам: строки в секунду, гистограмма задержки пачек,
+# раскладка времени (синтез строк, ожидание соединения пула, работа БД,
+# простои очереди) и ошибки по классам исключений. Во время прогона печатаются
+# строки прогресса, в конце пишется отчет JSON.
+import asyncio
+import collections
+import json
+import math
+import time
+
+
+class Histogram:
+    """
+    Гистограмма с логарифмическими корзинами: граница корзины i - min_value * growth**i,
+    так что относительная погрешность перцентиля не больше growth - 1 (~9% при 2**(1/8))
+    при любом разбросе значений. Память - одна запись на непустую корзину.
+    """
+
+    def __init__(self, min_value=1e-6, growth=2 ** (1 / 8)):
+        self.min_value = min_value
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value):
+        if value <= self.min_value:
+            return 0
+        return math.ceil(math.log(value / self.min_value) / self._log_growth)
+
+    def _upper_bound(self, bucket):
+        return self.min_value * self.growth ** bucket
+
+    def record(self, value):
+        self.buckets[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Верхняя граница корзины, в которую попадает q-й перцентиль (q от 0 до 100)."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self._upper_bound(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "min": self.min or 0.0,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max or 0.0,
+        }
+
+    def to_dict(self):
+        """Сводка плюс корзины {верхняя граница: число значений} для построения графиков."""
+        data = self.summary()
+        data["buckets"] = {f"{self._upper_bound(b):.6g}": n for b, n in sorted(self.buckets.items())}
+        return data
+
+
+class PhaseMetrics:
+    """
+    Счетчики одной фазы. Время раскладывается так:
+    synth_sec - генератор пачек считал следующую пачку (синтез строк, выборка ключей);
+    backpressure_sec - готовая пачка ждала места в очереди: вставщики не успевают (упор в сервер);
+    idle_sec - вставщик ждал пачку из пустой очереди: синтез не успевает (упор в клиент);
+    pool_wait_sec - ожидание соединения из пула; db_sec - вставка и коммит пачек.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.target = 0
+        self.rows = 0
+        self.related_rows = 0   # строки дочерних таблиц (позиции и платежи заказов)
+        self.batches = 0
+        self.failed_batches = 0
+        self.synth_sec = 0.0
+        self.backpressure_sec = 0.0
+        self.idle_sec = 0.0
+        self.pool_wait_sec = 0.0
+        self.db_sec = 0.0
+        self.batch_latency = Histogram()
+        self.errors = collections.Counter()   # имя класса исключения -> число
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        if self.started_at is None:
+            self.started_at = time.perf_counter()
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def rows_per_sec(self):
+        """Все записанные строки, включая дочерние таблицы, в секунду."""
+        return (self.rows + self.related_rows) / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def running(self):
+        return self.started_at is not None and self.finished_at is None
+
+    # Точки замера для bulk_writer.stream_insert
+    def record_synth(self, seconds):
+        self.synth_sec += seconds
+
+    def record_backpressure(self, seconds):
+        self.backpressure_sec += seconds
+
+    def record_idle(self, seconds):
+        self.idle_sec += seconds
+
+    def record_pool_wait(self, seconds):
+        self.pool_wait_sec += seconds
+
+    def record_batch(self, seconds):
+        self.batches += 1
+        self.db_sec += seconds
+        self.batch_latency.record(seconds)
+
+    def record_error(self, exc, count=1):
+        self.errors[type(exc).__name__] += count
+
+    def record_failed_batch(self, seconds, exc):
+        self.failed_batches += 1
+        self.db_sec += seconds
+        self.record_error(exc)
+
+    def record_rows(self, count, related=0):
+        self.rows += count
+        self.related_rows += related
+
+    def bound_by(self):
+        """Грубый вывод, во что упирается фаза: кто кого дольше ждал."""
+        if self.backpressure_sec > self.idle_sec:
+            return "server"
+        if self.idle_sec > self.backpressure_sec:
+            return "client"
+        return "unknown"
+
+    def progress_line(self):
+        latency = self.batch_latency
+        target = f"/{self.target}" if self.target else ""
+        related = f" (+{self.related_rows} related)" if self.related_rows else ""
+        return (f"  [progress] {self.name}: {self.rows}{target} rows{related}, {self.rows_per_sec:.0f} rows/s, "
+                f"batch p50 {latency.percentile(50) * 1000:.0f}ms p99 {latency.percentile(99) * 1000:.0f}ms, "
+                f"errors {sum(self.errors.values())}")
+
+    def to_dict(self):
+        return {
+            "target_rows": self.target,
+            "rows": self.rows,
+            "related_rows": self.related_rows,
+            "elapsed_sec": self.elapsed,
+            "rows_per_sec": self.rows_per_sec,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "time_sec": {
+                "synth": self.synth_sec,
+                "backpressure": self.backpressure_sec,
+                "worker_idle": self.idle_sec,
+                "pool_wait": self.pool_wait_sec,
+                "db": self.db_sec,
+            },
+            "bound_by": self.bound_by(),
+            "batch_latency_sec": self.batch_latency.to_dict(),
+            "errors": dict(self.errors),
+        }
+
+
+class GeneratorMetrics:
+    def __init__(self):
+        self.phases = {}
+        self.batch_tuning = {}   # table -> состояние BatchTuner в конце прогона
+        self.pool = None         # замеры пула соединений (db_pool.PoolStats.to_dict)
+        self.started_at = time.perf_counter()
+
+    def phase(self, name):
+        metrics = self.phases.get(name)
+        if metrics is None:
+            metrics = self.phases[name] = PhaseMetrics(name)
+        return metrics
+
+    async def report_progress(self, interval_sec):
+        """Фоновая задача: раз в interval_sec печатает строку по каждой идущей фазе."""
+        while True:
+            await asyncio.sleep(interval_sec)
+            for metrics in self.phases.values():
+                if metrics.running:
+                    print(metrics.progress_line())
+
+    def to_dict(self):
+        return {
+            "elapsed_sec": time.perf_counter() - self.started_at,
+            "phases": {name: m.to_dict() for name, m in self.phases.items()},
+            "batch_tuning": self.batch_tuning,
+            "pool": self.pool,
+        }
+
+    def write_report(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        print(f"Metrics report written to {path}.")
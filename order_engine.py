@@ -0,0 +1,55 @@
+# order_engine.py
+# Сборка заказов: у каждого заказа 1..N позиций из меню того ресторана, где
+# сделано бронирование, Price_At_Order берется из цены блюда, а total_price -
+# сумма позиций. Позиции и платежи создаются сразу с OrderID заказа, поэтому
+# сборка пачки линейна по числу строк.
+import collections
+import random
+from decimal import Decimal, ROUND_HALF_UP
+
+# Пачка заказов вместе с их позициями и платежами - единица потоковой вставки
+OrderBatch = collections.namedtuple("OrderBatch", ["orders", "items", "payments"])
+
+
+def order_price(menu_price):
+    """Цена блюда (Decimal) -> Price_At_Order: в OrdersItem и Orders цены целые."""
+    return int(Decimal(menu_price).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+class OrderEngine:
+    """
+    restaurant_menu_items - {RestaurantID: [MenuID, ...]}, menu_prices - {MenuID: Decimal}.
+    Число позиций равномерно в 1..2*avg_items_per_order-1, т.е. в среднем avg_items_per_order.
+    """
+
+    def __init__(self, restaurant_menu_items, menu_prices, avg_items_per_order):
+        self.restaurant_menu_items = restaurant_menu_items
+        self.menu_prices = menu_prices
+        self.max_items = max(1, int(round(2 * avg_items_per_order)) - 1)
+        self.skipped = 0   # бронирования, у ресторана которых нет меню
+
+    def build(self, seed, order_ids, booking_ids, restaurant_ids, statuses, methods, payment_statuses):
+        """
+        Собирает OrderBatch; состав заказов определяется seed пачки, а не порядком вызовов.
+        Все входные последовательности одной длины; restaurant_ids[i] -
+        ресторан бронирования booking_ids[i]. Заказы для бронирований без меню пропускаются
+        (их OrderID не используется).
+        """
+        rng = random.Random(seed)
+        orders, items, payments = [], [], []
+        for order_id, booking_id, rest_id, status, method, payment_status in zip(
+                order_ids, booking_ids, restaurant_ids, statuses, methods, payment_statuses):
+            menu = self.restaurant_menu_items.get(rest_id)
+            if not menu:
+                self.skipped += 1
+                continue
+            # Одно блюдо не повторяется в заказе: sample без возвращения
+            dishes = rng.sample(menu, min(rng.randint(1, self.max_items), len(menu)))
+            total_price = 0
+            for menu_id in dishes:
+                price = order_price(self.menu_prices[menu_id])
+                items.append((order_id, menu_id, price))
+                total_price += price
+            orders.append((order_id, booking_id, status, total_price))
+            payments.append((order_id, method, payment_status))
+        return OrderBatch(orders, items, payments)
@@ -0,0 +1,138 @@
+# phase_scheduler.py
+# Небольшой планировщик фаз генерации в виде DAG: каждая фаза объявляет,
+# какие данные ей нужны (requires) и какие она производит (provides).
+# Готовые фазы запускаются параллельно, а в конце печатается отчет
+# с критическим путем - цепочкой фаз, которая определила общее время.
+# Если фаза упала, run() доводит до конца независимые от нее фазы и
+# поднимает PhaseFailedError: вызывающий не должен считать прогон успешным.
+import asyncio
+import time
+
+
+class PhaseFailedError(RuntimeError):
+    """Одна или несколько фаз упали; failed - имена упавших фаз (без не запущенных из-за них)."""
+
+    def __init__(self, failed):
+        super().__init__(f"Phases failed: {', '.join(failed)}")
+        self.failed = failed
+
+
+class Phase:
+    def __init__(self, name, func, args=(), requires=(), provides=(), when=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.requires = tuple(requires)
+        self.provides = tuple(provides) or (name,)
+        self.when = when          # callable() -> bool, проверяется в момент запуска
+        self.started_at = None
+        self.finished_at = None
+        self.status = "pending"   # pending / done / skipped / failed
+
+    @property
+    def duration(self):
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+class PhaseScheduler:
+    def __init__(self):
+        self.phases = []
+        self._started_at = None
+
+    def add(self, name, func, *args, requires=(), provides=(), when=None):
+        phase = Phase(name, func, args, requires, provides, when)
+        self.phases.append(phase)
+        return phase
+
+    def _producers(self, phase):
+        """Фазы, которые производят данные, нужные phase."""
+        return [p for p in self.phases if set(p.provides) & set(phase.requires)]
+
+    def _validate(self):
+        provided = {item for p in self.phases for item in p.provides}
+        for phase in self.phases:
+            missing = [item for item in phase.requires if item not in provided]
+            if missing:
+                raise ValueError(f"Phase '{phase.name}' requires {missing}, but no phase provides them")
+
+    async def _run_phase(self, phase):
+        phase.started_at = time.perf_counter() - self._started_at
+        try:
+            if phase.when is not None and not phase.when():
+                phase.status = "skipped"
+                return
+            await phase.func(*phase.args)
+            phase.status = "done"
+        except Exception as e:
+            phase.status = "failed"
+            print(f"  Phase '{phase.name}' failed: {e}")
+            raise
+        finally:
+            phase.finished_at = time.perf_counter() - self._started_at
+
+    async def run(self):
+        """
+        Запускает все фазы, соблюдая зависимости. Фазы, зависящие от упавшей, не запускаются;
+        после завершения остальных поднимается PhaseFailedError (причина - первая ошибка).
+        """
+        self._validate()
+        self._started_at = time.perf_counter()
+        available = set()
+        failed_items = set()
+        errors = []   # (фаза, исключение) в порядке падения
+        pending = list(self.phases)
+        running = {}
+
+        while pending or running:
+            for phase in list(pending):
+                if set(phase.requires) & failed_items:
+                    print(f"  Phase '{phase.name}' not started: an upstream phase failed.")
+                    phase.status = "failed"
+                    failed_items.update(phase.provides)
+                    pending.remove(phase)
+                elif set(phase.requires) <= available:
+                    pending.remove(phase)
+                    running[asyncio.create_task(self._run_phase(phase))] = phase
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                phase = running.pop(task)
+                if task.exception() is None:
+                    available.update(phase.provides)
+                else:
+                    failed_items.update(phase.provides)
+                    errors.append((phase, task.exception()))
+        if errors:
+            raise PhaseFailedError([phase.name for phase, _ in errors]) from errors[0][1]
+
+    def critical_path(self):
+        """Цепочка фаз, закончившаяся последней: от нее идем назад по самому позднему предку."""
+        finished = [p for p in self.phases if p.finished_at is not None]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda p: p.finished_at)]
+        while True:
+            parents = [p for p in self._producers(path[-1]) if p.finished_at is not None]
+            if not parents:
+                break
+            path.append(max(parents, key=lambda p: p.finished_at))
+        path.reverse()
+        return path
+
+    def print_report(self):
+        critical = self.critical_path()
+        critical_names = {p.name for p in critical}
+        print("Phase timing report (seconds from scheduler start):")
+        print(f"  {'phase':<12} {'status':<8} {'start':>8} {'end':>8} {'duration':>9}")
+        for phase in sorted(self.phases, key=lambda p: (p.started_at is None, p.started_at or 0)):
+            marker = " *" if phase.name in critical_names else ""
+            start = f"{phase.started_at:.2f}" if phase.started_at is not None else "-"
+            end = f"{phase.finished_at:.2f}" if phase.finished_at is not None else "-"
+            print(f"  {phase.name:<12} {phase.status:<8} {start:>8} {end:>8} {phase.duration:>9.2f}{marker}")
+        if critical:
+            total = critical[-1].finished_at
+            print(f"  Critical path (*): {' -> '.join(p.name for p in critical)} = {total:.2f}s wall-clock")
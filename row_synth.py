@@ -0,0 +1,59 @@
+# row_synth.py
+# Синтез "текстового" содержимого строк через Faker.
+# Модуль намеренно не импортирует aioodbc/pyodbc: synthesize_chunk выполняется
+# в процессах ProcessPoolExecutor, и рабочему процессу достаточно импортировать только его.
+# Ключи, внешние ключи, даты, цены и рейтинги добавляет генератор в основном
+# процессе целыми столбцами (см. columnar.py).
+import datetime
+import random
+from faker import Faker
+
+CUISINES = ["итальянская", "китайская", "мексиканская", "японская", "французская", "индийская"]
+
+# Один экземпляр Faker на процесс: создание Faker('ru_RU') заметно дороже, чем seed_instance
+_process_fake = None
+
+
+def _seeded_fake(seed):
+    global _process_fake
+    if _process_fake is None:
+        _process_fake = Faker('ru_RU')
+    _process_fake.seed_instance(seed)
+    return _process_fake
+
+
+def decade_window(reference_time):
+    """[начало десятилетия, reference_time] - окно дат регистрации, как у Faker date_time_this_decade."""
+    return datetime.datetime(reference_time.year - reference_time.year % 10, 1, 1), reference_time
+
+
+def synthesize_chunk(kind, count, seed, max_lens, reference_time):
+    """
+    Возвращает count кортежей полей для сущности kind. Результат полностью
+    определяется seed и reference_time ("сейчас" прогона), поэтому не зависит
+    ни от того, какой процесс его посчитал, ни от дня запуска.
+    max_lens - словарь ограничений длины полей (см. TEXT_MAX_LENS в generate_data.py).
+    """
+    fake = _seeded_fake(seed)
+    rng = random.Random(seed)
+    if kind == "client":
+        # Дата - от rng, а не fake.date_time_this_decade: та отсчитывается от текущего времени
+        start, end = decade_window(reference_time)
+        span_seconds = int((end - start).total_seconds())
+        return [(
+            fake.name()[:max_lens["client_name"]],
+            fake.msisdn()[:max_lens["client_phone"]],
+            fake.email()[:max_lens["client_email"]],
+            start + datetime.timedelta(seconds=rng.randint(0, span_seconds)),
+        ) for _ in range(count)]
+    if kind == "restaurant":
+        return [(
+            fake.company()[:max_lens["restaurant_name"]],
+            fake.address().replace("\n", ", ")[:max_lens["restaurant_addres"]],
+            rng.choice(CUISINES)[:max_lens["restaurant_cuisine"]],
+        ) for _ in range(count)]
+    if kind == "menu":
+        return [(fake.word().capitalize()[:max_lens["menu_dishname"]],) for _ in range(count)]
+    if kind == "review":
+        return [(fake.text(max_nb_chars=max_lens["review_comment"]),) for _ in range(count)]
+    raise ValueError(f"Unknown synthesis kind: {kind}")
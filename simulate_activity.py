@@ -1,5 +1,6 @@
 import asyncio
-import aioodbc 
+import argparse
+import concurrent.futures
 import pyodbc 
 import random
 import time
@@ -7,16 +8,22 @@ import datetime
 import traceback
 from faker import Faker
 from decimal import Decimal # Для корректной работы с ценами перед преобразованием в строку
+from activity_metrics import ActivityMetrics, CapacityCurve
+from db_pool import create_pool
 
 try:
-    from config import (DB_CONN_STR, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+    from config import (DB_CONN_STR, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_EXECUTOR_WORKERS,
                         SIMULATION_DURATION_SECONDS, NUM_CONCURRENT_USERS,
-                        MIN_USER_WAIT_SECONDS, MAX_USER_WAIT_SECONDS, QUERY_WEIGHTS)
+                        MIN_USER_WAIT_SECONDS, MAX_USER_WAIT_SECONDS, QUERY_WEIGHTS,
+                        ACTIVITY_REPORT_PATH, TARGET_OPS_PER_SEC, ARRIVAL_PROCESS, MAX_IN_FLIGHT_OPERATIONS,
+                        RAMP_USER_LEVELS, RAMP_RATE_LEVELS, RAMP_WARMUP_SECONDS, RAMP_STEP_SECONDS,
+                        RAMP_P99_LIMIT_MS, RAMP_MIN_GAIN, RAMP_MAX_SHORTFALL, RAMP_REPORT_PATH, SIMULATION_PROCESSES)
 except ImportError:
     print("WARNING: config.py not found or incomplete. Using default simulation parameters.")
     DB_CONN_STR = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=ACER;DATABASE=TestDB;Trusted_Connection=yes;" # Обновлено
     DB_POOL_MIN_SIZE = 2
     DB_POOL_MAX_SIZE = 10
+    DB_EXECUTOR_WORKERS = None
     SIMULATION_DURATION_SECONDS = 180 
     NUM_CONCURRENT_USERS = 20     
     MIN_USER_WAIT_SECONDS = 0.5
@@ -31,9 +38,25 @@ except ImportError:
         "update_menu_item_price": 2,
         "delete_review": 3, "cancel_booking": 5, "remove_menu_item": 1,
     }
+    ACTIVITY_REPORT_PATH = "activity_metrics.json"
+    TARGET_OPS_PER_SEC = None
+    ARRIVAL_PROCESS = "poisson"
+    MAX_IN_FLIGHT_OPERATIONS = 500
+    RAMP_USER_LEVELS = (10, 10, 200)
+    RAMP_RATE_LEVELS = (50, 50, 2000)
+    RAMP_WARMUP_SECONDS = 10
+    RAMP_STEP_SECONDS = 30
+    RAMP_P99_LIMIT_MS = 500
+    RAMP_MIN_GAIN = 0.5
+    RAMP_MAX_SHORTFALL = 0.05
+    RAMP_REPORT_PATH = "capacity_curve.json"
+    SIMULATION_PROCESSES = 1
 
 fake = Faker('ru_RU')
 
+# Задержки и ошибки по операциям текущего прогона (activity_metrics.py)
+activity_metrics = ActivityMetrics()
+
 
 DB_BOOKING_STATUS_NAME_MAX_LEN = 10
 DB_CLIENT_NAME_MAX_LEN = 50
@@ -60,6 +83,21 @@ ACTIVE_MENU_IDS = []
 ACTIVE_TABLE_IDS = [] # Будут ID из RestaurantTable
 ACTIVE_REVIEW_IDS = []
 
+
+def active_id_sets():
+    """Рабочие наборы ID по именам списков - для передачи в процессы нагрузки."""
+    return {"ACTIVE_CLIENT_IDS": ACTIVE_CLIENT_IDS, "ACTIVE_RESTAURANT_IDS": ACTIVE_RESTAURANT_IDS,
+            "ACTIVE_BOOKING_IDS": ACTIVE_BOOKING_IDS, "ACTIVE_ORDER_IDS": ACTIVE_ORDER_IDS,
+            "ACTIVE_MENU_IDS": ACTIVE_MENU_IDS, "ACTIVE_TABLE_IDS": ACTIVE_TABLE_IDS,
+            "ACTIVE_REVIEW_IDS": ACTIVE_REVIEW_IDS}
+
+
+def load_active_id_sets(id_sets):
+    # Содержимое заменяется на месте: операции обращаются к тем же объектам списков
+    current = active_id_sets()
+    for name, ids in id_sets.items():
+        current[name][:] = ids
+
 async def fetch_initial_ids(pool):
     global ACTIVE_CLIENT_IDS, ACTIVE_RESTAURANT_IDS, ACTIVE_BOOKING_IDS, ACTIVE_ORDER_IDS, ACTIVE_MENU_IDS, ACTIVE_TABLE_IDS, ACTIVE_REVIEW_IDS
     print("Fetching initial IDs for simulation...")
@@ -476,20 +514,59 @@ QUERY_FUNCTION_MAP = {
     "remove_menu_item": remove_menu_item,
 }
 
-# --- Функция симуляции одного пользователя ---
+ARRIVAL_FIXED = "fixed"       # операции через равные интервалы 1/rate
+ARRIVAL_POISSON = "poisson"   # пуассоновский поток: экспоненциальные интервалы со средним 1/rate
+
+
+def valid_queries():
+    """Имена операций из QUERY_WEIGHTS, для которых есть функция, и их веса."""
+    names = [name for name in QUERY_WEIGHTS.keys() if name in QUERY_FUNCTION_MAP]
+    return names, [QUERY_WEIGHTS[name] for name in names]
+
+
+async def run_operation(pool, action_name, who, started):
+    """
+    Выполняет одну операцию в своей транзакции и записывает ее задержку от started
+    (time.perf_counter()) по коммит включительно, вместе с ожиданием соединения из пула.
+    """
+    action_func = QUERY_FUNCTION_MAP[action_name]
+    conn = None
+    try:
+        conn = await pool.acquire()
+        async with conn.cursor() as cursor:
+             # print(f"{who}: -> {action_name}") # Детальный лог
+             await action_func(cursor)
+             await conn.commit()
+        activity_metrics.record(action_name, time.perf_counter() - started)
+    except pyodbc.Error as db_err: # ИЗМЕНЕНО: Ловим pyodbc.Error
+        activity_metrics.record_error(action_name, db_err)
+        print(f"{who}: *** DB ERROR ({action_name}): {db_err} ***")
+        if conn:
+             try: await conn.rollback()
+             except Exception as rb_exc: print(f"{who}: Rollback error: {rb_exc}")
+    except Exception as e:
+        activity_metrics.record_error(action_name, e)
+        print(f"{who}: *** GENERAL ERROR ({action_name}): {e} ***")
+        traceback.print_exc()
+        if conn:
+             try: await conn.rollback()
+             except Exception as rb_exc: print(f"{who}: Rollback error: {rb_exc}")
+    finally:
+         if conn:
+             await pool.release(conn)
+
+
+# --- Функция симуляции одного пользователя (замкнутый цикл) ---
 async def simulate_user_activity(pool, user_id, stop_event):
     # print(f"User {user_id}: Started simulation.") # Можно раскомментировать для детального лога
     initial_delay = random.uniform(0.01, 0.5)
     await asyncio.sleep(initial_delay)
 
-    valid_query_names = [name for name in QUERY_WEIGHTS.keys() if name in QUERY_FUNCTION_MAP]
+    valid_query_names, valid_query_weights = valid_queries()
     if not valid_query_names:
         print(f"User {user_id}: ERROR - No valid actions. Check QUERY_WEIGHTS & QUERY_FUNCTION_MAP. Stopping.")
         return
 
-    valid_query_weights = [QUERY_WEIGHTS[name] for name in valid_query_names]
-    action_count = 0
-
     while not stop_event.is_set():
         chosen_action_name = None
         try:
@@ -498,34 +575,12 @@ async def simulate_user_activity(pool, user_id, stop_event):
                  await asyncio.sleep(1)
                  continue
             chosen_action_name = random.choices(valid_query_names, weights=valid_query_weights, k=1)[0]
-            action_func = QUERY_FUNCTION_MAP[chosen_action_name]
         except Exception as e_choice: # Ловим ошибки выбора действия
             print(f"User {user_id}: ERROR choosing action (names: {len(valid_query_names)}, weights: {len(valid_query_weights)}): {e_choice}")
             await asyncio.sleep(1)
             continue
 
-        conn = None
-        try:
-            conn = await pool.acquire()
-            async with conn.cursor() as cursor:
-                 # print(f"User {user_id}: -> {chosen_action_name}") # Детальный лог
-                 await action_func(cursor)
-                 await conn.commit()
-                 action_count += 1
-        except pyodbc.Error as db_err: # ИЗМЕНЕНО: Ловим pyodbc.Error
-            print(f"User {user_id}: *** DB ERROR ({chosen_action_name}): {db_err} ***")
-            if conn:
-                 try: await conn.rollback()
-                 except Exception as rb_exc: print(f"User {user_id}: Rollback error: {rb_exc}")
-        except Exception as e:
-            print(f"User {user_id}: *** GENERAL ERROR ({chosen_action_name}): {e} ***")
-            traceback.print_exc()
-            if conn:
-                 try: await conn.rollback()
-                 except Exception as rb_exc: print(f"User {user_id}: Rollback error: {rb_exc}")
-        finally:
-             if conn:
-                 await pool.release(conn)
+        await run_operation(pool, chosen_action_name, f"User {user_id}", time.perf_counter())
 
         if stop_event.is_set(): break
         user_think_time = random.uniform(MIN_USER_WAIT_SECONDS, MAX_USER_WAIT_SECONDS)
@@ -534,19 +589,271 @@ async def simulate_user_activity(pool, user_id, stop_event):
             break
         except asyncio.TimeoutError:
             pass
-    # print(f"User {user_id}: Exited. Actions: {action_count}.") # Детальный лог
+
+
+# --- Открытый цикл: операции по расписанию прибытия ---
+async def acquire_slot(slots, stop_event):
+    """Ждет свободный слот или остановку - что раньше. True - слот занят; при остановке слот не берется."""
+    if stop_event.is_set():
+        return False
+    if not slots.locked():
+        await slots.acquire()
+        return True
+    acquire = asyncio.ensure_future(slots.acquire())
+    stopped = asyncio.ensure_future(stop_event.wait())
+    try:
+        await asyncio.wait((acquire, stopped), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopped.cancel()
+        if not acquire.done():
+            acquire.cancel()
+    if acquire.done() and not acquire.cancelled() and acquire.exception() is None:
+        if not stop_event.is_set():
+            return True
+        slots.release()
+    return False
+
+
+async def simulate_arrivals(pool, stop_event, rate, arrival=ARRIVAL_POISSON, max_in_flight=MAX_IN_FLIGHT_OPERATIONS):
+    """
+    Запускает операции с заданной интенсивностью rate (операций/с) независимо от того,
+    успевает ли база: в замкнутом цикле медленная база сама снижает нагрузку, и
+    перцентили выглядят лучше, чем есть (coordinated omission). Задержка считается
+    от запланированного момента, поэтому и ожидание слота, и отставание расписания
+    входят в нее. Одновременно выполняется не больше max_in_flight операций:
+    когда лимит исчерпан, расписание копится и догоняется после освобождения слотов.
+    """
+    names, weights = valid_queries()
+    if not names:
+        print("Open loop: ERROR - No valid actions. Check QUERY_WEIGHTS & QUERY_FUNCTION_MAP. Stopping.")
+        return
+    slots = asyncio.Semaphore(max(1, max_in_flight))
+    tasks = set()
+
+    async def dispatch(action_name, intended):
+        try:
+            await run_operation(pool, action_name, "Open loop", intended)
+        finally:
+            slots.release()
+
+    next_arrival = time.perf_counter()
+    while not stop_event.is_set():
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay)
+                break
+            except asyncio.TimeoutError:
+                pass
+        intended = next_arrival
+        next_arrival += random.expovariate(rate) if arrival == ARRIVAL_POISSON else 1.0 / rate
+        action_name = random.choices(names, weights=weights, k=1)[0]
+        # Все слоты заняты зависшими операциями - остановка не должна ждать их освобождения
+        if not await acquire_slot(slots, stop_event):
+            next_arrival = intended
+            break
+        activity_metrics.record_start_delay(time.perf_counter() - intended)
+        task = asyncio.create_task(dispatch(action_name, intended))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    # Отставшее расписание не должно пропасть из отчета молча: без этих операций перцентили занижены
+    activity_metrics.unstarted += max(0, int((time.perf_counter() - next_arrival) * rate))
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# --- Ступенчатый подъем нагрузки до насыщения ---
+RAMP_USERS = "users"   # ступени - число пользователей замкнутого цикла
+RAMP_RATE = "rate"     # ступени - интенсивность открытого цикла, ops/s
+
+
+def ramp_levels(start, step, maximum):
+    levels = []
+    level = start
+    while level <= maximum:
+        levels.append(level)
+        level += step
+    return levels
+
+
+async def run_ramp(pool, ramp, arrival=ARRIVAL_PROCESS, max_in_flight=MAX_IN_FLIGHT_OPERATIONS):
+    """
+    Поднимает нагрузку ступенями без остановки между ними: пользователи добавляются
+    к уже работающим, а расписание прибытия переключается на новую интенсивность.
+    Первые RAMP_WARMUP_SECONDS каждой ступени не учитываются (переходный процесс),
+    следующие RAMP_STEP_SECONDS измеряются. Возвращает CapacityCurve.
+    """
+    global activity_metrics
+    levels = ramp_levels(*(RAMP_USER_LEVELS if ramp == RAMP_USERS else RAMP_RATE_LEVELS))
+    curve = CapacityCurve("users" if ramp == RAMP_USERS else "ops/s", RAMP_P99_LIMIT_MS / 1000, RAMP_MIN_GAIN,
+                          RAMP_MAX_SHORTFALL)
+    stop_event = asyncio.Event()   # останавливает всех пользователей в конце подъема
+    tasks = []
+    arrivals_stop = None
+    print(f"\n[{datetime.datetime.now()}] Ramp over {len(levels)} levels of {curve.unit}: "
+          f"{RAMP_WARMUP_SECONDS}s warm-up + {RAMP_STEP_SECONDS}s measurement each, "
+          f"stop at p99 > {RAMP_P99_LIMIT_MS} ms or when throughput stops following the load.")
+    try:
+        for level in levels:
+            # Операции прогрева пишутся в отдельный объект, который потом отбрасывается
+            activity_metrics = ActivityMetrics()
+            if ramp == RAMP_USERS:
+                for user_id in range(len(tasks) + 1, level + 1):
+                    tasks.append(asyncio.create_task(simulate_user_activity(pool, user_id, stop_event)))
+            else:
+                # Прежнее расписание останавливается, его операции в полете дорабатывают в прогреве новой ступени
+                if arrivals_stop is not None:
+                    arrivals_stop.set()
+                arrivals_stop = asyncio.Event()
+                tasks.append(asyncio.create_task(simulate_arrivals(pool, arrivals_stop, level, arrival, max_in_flight)))
+            await asyncio.sleep(RAMP_WARMUP_SECONDS)
+            activity_metrics = ActivityMetrics()
+            activity_metrics.load_profile = {"mode": "ramp", "ramp": ramp, "level": level}
+            activity_metrics.start()
+            await asyncio.sleep(RAMP_STEP_SECONDS)
+            activity_metrics.finish()
+            stop_reason = curve.add_step(level, activity_metrics, level if ramp == RAMP_RATE else None)
+            step = curve.steps[-1]
+            print(f"[{datetime.datetime.now()}] Level {level:g} {curve.unit}: {step['ops_per_sec']:.1f} ops/s, "
+                  f"p99 {step['p99_sec'] * 1000:.1f} ms, {step['errors_per_sec']:.1f} errors/s")
+            if stop_reason:
+                break
+    finally:
+        stop_event.set()
+        if arrivals_stop is not None:
+            arrivals_stop.set()
+        activity_metrics = ActivityMetrics()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return curve
+
+
+async def run_simulation(pool, user_ids, rate, arrival, max_in_flight):
+    """
+    Один прогон длиной SIMULATION_DURATION_SECONDS в текущем процессе: пользователи
+    замкнутого цикла user_ids или открытый цикл с интенсивностью rate. Пишет в activity_metrics.
+    """
+    stop_event = asyncio.Event()
+    user_tasks = []
+    activity_metrics.start()
+    if rate:
+        user_tasks.append(asyncio.create_task(simulate_arrivals(pool, stop_event, rate, arrival, max_in_flight)))
+    else:
+        for user_id in user_ids:
+            task = asyncio.create_task(simulate_user_activity(pool, user_id, stop_event))
+            user_tasks.append(task)
+
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout=SIMULATION_DURATION_SECONDS)
+        # print(f"\n[{datetime.datetime.now()}] Stop event set or timeout early.")
+    except asyncio.TimeoutError:
+        print(f"\n[{datetime.datetime.now()}] Simulation duration ({SIMULATION_DURATION_SECONDS}s) elapsed.")
+
+    if not stop_event.is_set():
+         print(f"[{datetime.datetime.now()}] Setting stop event to terminate user tasks...")
+         stop_event.set()
+
+    print(f"[{datetime.datetime.now()}] Waiting for user tasks to complete...")
+    results = await asyncio.gather(*user_tasks, return_exceptions=True)
+    activity_metrics.finish()
+    print(f"[{datetime.datetime.now()}] All user tasks completed.")
+
+    errors_count = sum(1 for r in results if isinstance(r, Exception))
+    if errors_count > 0:
+        print(f"[{datetime.datetime.now()}] Warning: {errors_count} user tasks finished with errors.")
+        # for i, r_exc in enumerate(results): # Для детального вывода ошибок по задачам
+        #     if isinstance(r_exc, Exception):
+        #         print(f"  Error in user task {i+1}: {r_exc}")
+
+
+# --- Несколько процессов нагрузки ---
+# Один цикл событий упирается в клиент раньше, чем в базу: Faker, random.choices
+# и потоки исполнителя aioodbc делят один GIL. Каждый процесс запускает свою долю
+# пользователей (или интенсивности) со своим циклом событий и пулом, а родитель
+# сливает их гистограммы и счетчики.
+WORKER_START_GRACE_SECONDS = 5   # время на запуск процессов и пулов до общего старта
+
+
+async def worker_main(user_ids, rate, arrival, max_in_flight, start_at):
+    global activity_metrics
+    pool = await create_pool(
+        DB_CONN_STR,
+        DB_POOL_MIN_SIZE,
+        max(DB_POOL_MAX_SIZE, len(user_ids) + 5),
+        DB_EXECUTOR_WORKERS,
+        autocommit=False
+    )
+    try:
+        # Общий момент старта: иначе процессы, поднявшие пул раньше, нагружают базу в одиночку
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        activity_metrics = ActivityMetrics()
+        await run_simulation(pool, user_ids, rate, arrival, max_in_flight)
+        activity_metrics.pool = pool.stats
+        return activity_metrics
+    finally:
+        pool.close()
+        await pool.wait_closed()
+
+
+def run_worker(id_sets, user_ids, rate, arrival, max_in_flight, start_at):
+    """
+    Точка входа процесса нагрузки. Все процессы начинают с одних и тех же наборов ID,
+    выбранных родителем (созданные процессом ID остаются в его наборах).
+    Возвращает ActivityMetrics процесса.
+    """
+    # После fork у всех процессов одинаковое состояние random и Faker - иначе они повторяли бы одни и те же операции
+    random.seed()
+    fake.seed_instance(random.getrandbits(64))
+    load_active_id_sets(id_sets)
+    return asyncio.run(worker_main(user_ids, rate, arrival, max_in_flight, start_at))
+
+
+async def run_processes(processes, rate, arrival, max_in_flight):
+    """Раскладывает нагрузку по processes процессам и возвращает слитые ActivityMetrics."""
+    id_sets = {name: list(ids) for name, ids in active_id_sets().items()}
+    start_at = time.time() + WORKER_START_GRACE_SECONDS
+    loop = asyncio.get_running_loop()
+    merged = ActivityMetrics()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = []
+        for index in range(processes):
+            # Пользователи - через один, интенсивность и лимит в полете делятся поровну
+            user_ids = [] if rate else list(range(index + 1, NUM_CONCURRENT_USERS + 1, processes))
+            worker_rate = rate / processes if rate else None
+            worker_in_flight = -(-max_in_flight // processes)
+            futures.append(loop.run_in_executor(executor, run_worker, id_sets, user_ids, worker_rate,
+                                                arrival, worker_in_flight, start_at))
+        results = await asyncio.gather(*futures, return_exceptions=True)
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            print(f"[{datetime.datetime.now()}] Warning: load process {index + 1} failed: {result}")
+        else:
+            merged.merge(result)
+    return merged
+
+
+def max_users(rate, ramp):
+    """Сколько пользователей замкнутого цикла может работать одновременно (для размера пула)."""
+    if ramp == RAMP_USERS:
+        return max(ramp_levels(*RAMP_USER_LEVELS), default=0)
+    if rate or ramp == RAMP_RATE:
+        return 0
+    return NUM_CONCURRENT_USERS
+
 
 # --- Основная функция запуска симуляции ---
-async def main():
+async def main(rate=TARGET_OPS_PER_SEC, arrival=ARRIVAL_PROCESS, max_in_flight=MAX_IN_FLIGHT_OPERATIONS, ramp=None,
+               processes=SIMULATION_PROCESSES):
+    global activity_metrics
     pool = None
     start_time_main = time.time()
     print(f"[{datetime.datetime.now()}] Simulation script started.")
     try:
         print(f"[{datetime.datetime.now()}] Creating connection pool (Min: {DB_POOL_MIN_SIZE}, Max: {DB_POOL_MAX_SIZE})...")
-        pool = await aioodbc.create_pool(
-            dsn=DB_CONN_STR,
-            minsize=DB_POOL_MIN_SIZE,
-            maxsize=max(DB_POOL_MAX_SIZE, NUM_CONCURRENT_USERS + 5), # Немного больше для запаса
+        pool = await create_pool(
+            DB_CONN_STR,
+            DB_POOL_MIN_SIZE,
+            max(DB_POOL_MAX_SIZE, (max_users(rate, ramp) if processes <= 1 else 0) + 5), # Немного больше для запаса
+            DB_EXECUTOR_WORKERS,
             autocommit=False
         )
         print(f"[{datetime.datetime.now()}] Connection pool created successfully.")
@@ -562,52 +869,39 @@ async def main():
         #     print(f"[{datetime.datetime.now()}] Exiting simulation due to failure/lack of initial IDs.")
         #     return
 
-        stop_event = asyncio.Event()
-        user_tasks = []
-        print(f"\n[{datetime.datetime.now()}] Starting simulation: {NUM_CONCURRENT_USERS} users, {SIMULATION_DURATION_SECONDS}s duration...")
+        if ramp:
+            curve = await run_ramp(pool, ramp, arrival, max_in_flight)
+            curve.print_report()
+            pool.stats.print_report()
+            if RAMP_REPORT_PATH:
+                curve.write_report(RAMP_REPORT_PATH)
+            return
+
+        if rate:
+            print(f"\n[{datetime.datetime.now()}] Starting open-loop simulation: {rate:g} ops/s ({arrival} arrivals), "
+                  f"at most {max_in_flight} in flight, {SIMULATION_DURATION_SECONDS}s duration, {processes} process(es)...")
+            load_profile = {"mode": "open", "target_ops_per_sec": rate, "arrival": arrival,
+                            "max_in_flight": max_in_flight}
+        else:
+            print(f"\n[{datetime.datetime.now()}] Starting simulation: {NUM_CONCURRENT_USERS} users, "
+                  f"{SIMULATION_DURATION_SECONDS}s duration, {processes} process(es)...")
+            load_profile = {"mode": "closed", "users": NUM_CONCURRENT_USERS,
+                            "think_time_sec": [MIN_USER_WAIT_SECONDS, MAX_USER_WAIT_SECONDS]}
+        load_profile["processes"] = processes
         sim_start_time = time.time()
-        for i in range(NUM_CONCURRENT_USERS):
-            task = asyncio.create_task(simulate_user_activity(pool, i + 1, stop_event))
-            user_tasks.append(task)
-
-        try:
-            await asyncio.wait_for(stop_event.wait(), timeout=SIMULATION_DURATION_SECONDS)
-            # print(f"\n[{datetime.datetime.now()}] Stop event set or timeout early.")
-        except asyncio.TimeoutError:
-            print(f"\n[{datetime.datetime.now()}] Simulation duration ({SIMULATION_DURATION_SECONDS}s) elapsed.")
-
-        if not stop_event.is_set():
-             print(f"[{datetime.datetime.now()}] Setting stop event to terminate user tasks...")
-             stop_event.set()
-
-        print(f"[{datetime.datetime.now()}] Waiting for user tasks to complete...")
-        results = await asyncio.gather(*user_tasks, return_exceptions=True)
-        print(f"[{datetime.datetime.now()}] All user tasks completed.")
-
-        errors_count = sum(1 for r in results if isinstance(r, Exception))
-        if errors_count > 0:
-            print(f"[{datetime.datetime.now()}] Warning: {errors_count} user tasks finished with errors.")
-            # for i, r_exc in enumerate(results): # Для детального вывода ошибок по задачам
-            #     if isinstance(r_exc, Exception):
-            #         print(f"  Error in user task {i+1}: {r_exc}")
-
+        if processes > 1:
+            activity_metrics = await run_processes(processes, rate, arrival, max_in_flight)
+        else:
+            activity_metrics = ActivityMetrics()
+            await run_simulation(pool, range(1, NUM_CONCURRENT_USERS + 1), rate, arrival, max_in_flight)
+            activity_metrics.pool = pool.stats
+        activity_metrics.load_profile = load_profile
 
         sim_end_time = time.time()
-        # Сбор статистики по action_count может быть сложным, если задачи завершились с ошибкой до инициализации action_count
-        # Этот способ примерный и может не сработать для всех случаев.
-        total_actions_sim = 0
-        for task in user_tasks:
-            try:
-                # Пытаемся получить результат, чтобы убедиться, что задача не упала до того, как action_count был доступен
-                task.result() # Это выбросит исключение, если оно было в задаче
-                # Доступ к f_locals очень интроспективный и может быть ненадежным/измениться
-                if hasattr(task.get_coro(), 'cr_frame') and task.get_coro().cr_frame is not None:
-                     action_count_val = task.get_coro().cr_frame.f_locals.get('action_count', 0)
-                     total_actions_sim += action_count_val
-            except Exception: # Если задача упала, ее action_count не учитываем или считаем 0
-                pass
-
-        print(f"\n[{datetime.datetime.now()}] Simulation finished. Actual duration: {sim_end_time - sim_start_time:.2f} seconds. Approx total actions: {total_actions_sim}")
+        print(f"\n[{datetime.datetime.now()}] Simulation finished. Actual duration: {sim_end_time - sim_start_time:.2f} seconds. Total actions: {activity_metrics.total().count}")
+        activity_metrics.print_report()
+        if ACTIVITY_REPORT_PATH:
+            activity_metrics.write_report(ACTIVITY_REPORT_PATH)
 
     except Exception as e:
         print(f"[{datetime.datetime.now()}] *** An error occurred in the main simulation loop: {e} ***")
@@ -628,8 +922,27 @@ if __name__ == "__main__":
     # Убедитесь, что config.py существует и содержит актуальные DB_CONN_STR и QUERY_WEIGHTS
     # а также что структура БД (имена таблиц, столбцов, типы, длины, IDENTITY)
     # соответствует ожиданиям этого симулятора.
+    parser = argparse.ArgumentParser(description="Simulate user activity against the restaurant database.")
+    parser.add_argument("--rate", type=float, default=TARGET_OPS_PER_SEC,
+                        help="open loop: start operations at this many ops/s regardless of response times "
+                             "(default TARGET_OPS_PER_SEC; unset - closed loop of NUM_CONCURRENT_USERS users)")
+    parser.add_argument("--arrival", choices=(ARRIVAL_POISSON, ARRIVAL_FIXED), default=ARRIVAL_PROCESS,
+                        help="open-loop arrival schedule: exponential or equal gaps")
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT_OPERATIONS,
+                        help="open loop: cap on operations running at once")
+    parser.add_argument("--ramp", choices=(RAMP_USERS, RAMP_RATE), default=None,
+                        help="step the load up (RAMP_USER_LEVELS users or RAMP_RATE_LEVELS ops/s) until p99 exceeds "
+                             "RAMP_P99_LIMIT_MS or throughput stops growing; prints the capacity curve")
+    parser.add_argument("--processes", type=int, default=SIMULATION_PROCESSES,
+                        help="split the users (or the open-loop rate) across this many processes, "
+                             "each with its own event loop and pool; metrics are merged (default SIMULATION_PROCESSES)")
+    args = parser.parse_args()
+    if args.processes < 1:
+        parser.error("--processes must be at least 1")
+    if args.ramp and args.processes > 1:
+        parser.error("--ramp runs in a single process; drop --processes")
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.rate, args.arrival, args.max_in_flight, args.ramp, args.processes))
     except KeyboardInterrupt:
         print("\nSimulation interrupted by user (Ctrl+C). Exiting gracefully...")
     except Exception as e_global: # Глобальный отловщик на всякий случай
@@ -0,0 +1,85 @@
+# sizing.py
+# Модель объемов в духе TPC: один коэффициент масштаба (scale factor) задает
+# число клиентов и ресторанов, а объемы остальных таблиц выводятся из
+# объявленных соотношений (столиков на ресторан, бронирований на клиента и т.д.).
+# Плюс оценка до запуска: строки, байты и ожидаемое время загрузки.
+
+# Служебные байты строки SQL Server: заголовок 4, битовая карта NULL ~3,
+# счетчик и смещения столбцов переменной длины ~2 + 2 на столбец
+ROW_OVERHEAD_BYTES = 11
+
+# Средний размер данных строки по столбцам (int 4, datetime 8, decimal(10,2) 9,
+# nvarchar - 2 байта на символ при типичной длине сгенерированного значения)
+COLUMN_BYTES = {
+    "dbo.Client": (4, 2 * 24, 2 * 10, 2 * 20, 8),          # ClientID, Name, phone, email, registration_date
+    "dbo.Restaraunt": (4, 2 * 24, 2 * 50, 2 * 11),         # RestarauntID, Name, addres, cuisine
+    "dbo.RestaurantTable": (4, 4, 4),                      # TableID, RestaurantID, max
+    "dbo.Menu": (4, 4, 2 * 9, 9),                          # MenuID, RestaurantID, DishName, Price
+    "dbo.Booking": (4, 4, 4, 4, 8),                        # BookingID, ClientID, StatusID, TableID, BookingDate
+    "dbo.Orders": (4, 4, 4, 4),                            # OrderID, BookingID, StatusOrder, total_price
+    "dbo.OrdersItem": (4, 4, 4),                           # OrderID, MenuID, Price_At_Order
+    "dbo.Payments": (4, 2 * 7, 2 * 9),                     # OrderID, Method, Payment_Status
+    "dbo.Review": (4, 4, 4, 4, 2 * 500, 8),                # ReviewID, ClientID, RestaurantID, Rating, Comment, ReviewDate
+}
+
+# Порядок строк отчета
+PLAN_TABLES = tuple(COLUMN_BYTES)
+
+
+def row_bytes(table):
+    return sum(COLUMN_BYTES[table]) + ROW_OVERHEAD_BYTES
+
+
+def build_plan(scale_factor, clients_per_scale, restaurants_per_scale, tables_per_restaurant,
+               menu_items_per_restaurant, bookings_per_client, orders_per_booking,
+               items_per_order, reviews_per_client):
+    """
+    Число новых строк каждой таблицы при данном scale factor. Клиенты и рестораны
+    растут линейно с масштабом, остальное - через соотношения к своим "родителям".
+    """
+    clients = round(scale_factor * clients_per_scale)
+    restaurants = round(scale_factor * restaurants_per_scale)
+    bookings = round(clients * bookings_per_client)
+    orders = round(bookings * orders_per_booking)
+    return {
+        "dbo.Client": clients,
+        "dbo.Restaraunt": restaurants,
+        "dbo.RestaurantTable": round(restaurants * tables_per_restaurant),
+        "dbo.Menu": round(restaurants * menu_items_per_restaurant),
+        "dbo.Booking": bookings,
+        "dbo.Orders": orders,
+        # Ожидаемое значение: позиций на заказ в среднем items_per_order (см. order_engine.py)
+        "dbo.OrdersItem": round(orders * items_per_order),
+        "dbo.Payments": orders,
+        "dbo.Review": round(clients * reviews_per_client),
+    }
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+def print_estimate(plan, scale_factor, insert_rows_per_sec, bulk_rows_per_sec):
+    """Отчет до запуска: строки и объем данных по таблицам, время загрузки обоими путями."""
+    print(f"Sizing estimate for scale factor {scale_factor:g}:")
+    print(f"  {'table':<20} {'rows':>14} {'row bytes':>10} {'data MB':>10}")
+    total_rows = 0
+    total_bytes = 0
+    for table in PLAN_TABLES:
+        rows = plan[table]
+        size = rows * row_bytes(table)
+        total_rows += rows
+        total_bytes += size
+        print(f"  {table:<20} {rows:>14,} {row_bytes(table):>10} {size / 2**20:>10.1f}")
+    print(f"  {'total':<20} {total_rows:>14,} {'':>10} {total_bytes / 2**20:>10.1f}")
+    print("  Data size excludes nonclustered indexes and free space on pages.")
+    print(f"  Expected load time: {_format_duration(total_rows / insert_rows_per_sec)} via ODBC inserts "
+          f"(~{insert_rows_per_sec:,} rows/s), {_format_duration(total_rows / bulk_rows_per_sec)} via "
+          f"--emit-files + BULK INSERT (~{bulk_rows_per_sec:,} rows/s)")
+    return total_rows, total_bytes
@@ -0,0 +1,312 @@
+# snapshot.py
+# Снимок набора данных между прогонами simulate_activity.py: симуляция удаляет
+# отзывы и блюда, отменяет брони и меняет цены, поэтому прогоны подряд несравнимы,
+# а генерация заново через Faker идет долго. Два способа:
+#  - "files": все десять таблиц выгружаются в каталог в формате bulk_files.py
+#    (секции bcp -c без потерь, сжатые gzip); восстановление очищает таблицы и вливает
+#    секции параллельным BULK INSERT, как load_files.py;
+#  - "database": снимок базы SQL Server (CREATE DATABASE ... AS SNAPSHOT OF),
+#    возврат к нему - RESTORE DATABASE ... FROM DATABASE_SNAPSHOT за секунды
+#    при любом объеме. Снимок живет на том же сервере и, пока существует,
+#    копирует каждую изменяемую страницу - это немного замедляет запись.
+# Снимок стоит снимать, когда симуляция не запущена: таблицы читаются
+# параллельно без общей транзакции.
+import asyncio
+import aioodbc
+import argparse
+import concurrent.futures
+import datetime
+import gzip
+import ntpath
+import os
+import shutil
+import time
+import traceback
+from bulk_files import LOAD_ORDER, MANIFEST_NAME, FileEmitPool, data_file_path, load_directory, read_manifest
+from fast_load import FastLoad
+
+try:
+    from config_generator import (
+        DB_CONN_STR, FETCH_BATCH_ROWS, BULK_LOAD_STREAMS, BULK_LOAD_BATCH_ROWS, FAST_LOAD_TABLES,
+        FAST_LOAD_REBUILD_STREAMS, FAST_LOAD_RECOVERY_MODEL, FAST_LOAD_STATE_PATH, SNAPSHOT_MODE, SNAPSHOT_DIR,
+        SNAPSHOT_PARTITIONS, SNAPSHOT_COMPRESS, SNAPSHOT_DATABASE_NAME
+    )
+except ImportError:
+    print("WARNING: config_generator.py not found or incomplete. Using default snapshot parameters.")
+    DB_CONN_STR = "DRIVER={ODBC Driver 17 for SQL Server};SERVER=ACER;DATABASE=TestDB;Trusted_Connection=yes;"
+    FETCH_BATCH_ROWS = 50000
+    BULK_LOAD_STREAMS = 4
+    BULK_LOAD_BATCH_ROWS = 100000
+    FAST_LOAD_TABLES = ("dbo.Booking", "dbo.Orders", "dbo.OrdersItem", "dbo.Review")
+    FAST_LOAD_REBUILD_STREAMS = 4
+    FAST_LOAD_RECOVERY_MODEL = "BULK_LOGGED"
+    FAST_LOAD_STATE_PATH = "fast_load_state.txt"
+    SNAPSHOT_MODE = "files"
+    SNAPSHOT_DIR = "snapshot"
+    SNAPSHOT_PARTITIONS = 8
+    SNAPSHOT_COMPRESS = True
+    SNAPSHOT_DATABASE_NAME = None
+
+MODE_FILES = "files"
+MODE_DATABASE = "database"
+
+COLUMNS_SQL = "SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?) AND is_computed = 0 ORDER BY column_id"
+IDENTITY_COLUMN_SQL = "SELECT name FROM sys.identity_columns WHERE object_id = OBJECT_ID(?)"
+DATA_FILES_SQL = "SELECT name, physical_name FROM sys.database_files WHERE type = 0 ORDER BY file_id"
+DATABASE_SNAPSHOTS_SQL = "SELECT name FROM sys.databases WHERE source_database_id = DB_ID()"
+
+
+def _quote(name):
+    return "[" + name.replace("]", "]]") + "]"
+
+
+#  Снимок в файлы
+
+async def _capture_table(pool, semaphore, emit_pool, table, fetch_rows_count):
+    async with semaphore:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(COLUMNS_SQL, table)
+                columns = [row[0] for row in await cur.fetchall()]
+                # В порядке первого столбца (ключа): при восстановлении кластерный индекс заполняется с конца
+                await cur.execute(f"SELECT {', '.join(map(_quote, columns))} FROM {table} ORDER BY 1")
+                while rows := await cur.fetchmany(fetch_rows_count):
+                    emit_pool.write_batch(table, columns, [tuple(row) for row in rows])
+                await conn.commit()
+    # Пустая таблица тоже попадает в манифест - при восстановлении она останется пустой
+    emit_pool.tables.setdefault(table, {"columns": columns, "files": [], "sorted": [], "rows": 0})
+
+
+def _remove_previous_snapshot(directory):
+    """Секции прошлого снимка в том же каталоге удаляются: иначе старые файлы с большими номерами остались бы рядом."""
+    if not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        return
+    for info in read_manifest(directory).values():
+        for rel_path in info["files"]:
+            path = os.path.join(directory, *rel_path.split("/"))
+            if os.path.exists(path):
+                os.remove(path)
+
+
+async def capture_files(pool, directory, partitions=SNAPSHOT_PARTITIONS, compress=SNAPSHOT_COMPRESS,
+                        streams=BULK_LOAD_STREAMS, fetch_rows_count=FETCH_BATCH_ROWS):
+    """Выгружает все таблицы LOAD_ORDER в directory (streams таблиц одновременно). Возвращает {table: строк}."""
+    started = time.perf_counter()
+    _remove_previous_snapshot(directory)
+    # Снимок восстанавливается без потерь: табуляции и переводы строк в тексте, пустые строки
+    emit_pool = FileEmitPool(directory, partitions, compress, lossless=True)
+    semaphore = asyncio.Semaphore(max(1, streams))
+    try:
+        await asyncio.gather(*(_capture_table(pool, semaphore, emit_pool, table, fetch_rows_count) for table in LOAD_ORDER))
+    finally:
+        emit_pool.close()
+    elapsed = time.perf_counter() - started
+    size = sum(os.path.getsize(os.path.join(directory, *rel_path.split("/")))
+               for info in emit_pool.tables.values() for rel_path in info["files"])
+    total_rows = sum(info["rows"] for info in emit_pool.tables.values())
+    print(f"Snapshot of {total_rows} rows written to {directory} in {elapsed:.2f}s ({size / 2 ** 20:.1f} MiB).")
+    return {table: info["rows"] for table, info in emit_pool.tables.items()}
+
+
+def _unpack(directory, rel_path):
+    source = os.path.join(directory, *rel_path.split("/"))
+    target = os.path.join(directory, *data_file_path(rel_path).split("/"))
+    with gzip.open(source, "rb") as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    return target
+
+
+async def _unpack_partitions(directory, tables, workers):
+    """Распаковывает сжатые секции рядом с ними (zlib отпускает GIL - потоки идут параллельно)."""
+    compressed = [rel_path for info in tables.values() for rel_path in info["files"] if data_file_path(rel_path) != rel_path]
+    if not compressed:
+        return []
+    loop = asyncio.get_running_loop()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return await asyncio.gather(*(loop.run_in_executor(executor, _unpack, directory, rel_path)
+                                      for rel_path in compressed))
+
+
+async def _clear_tables(pool):
+    """Удаляет строки всех таблиц, дочерние раньше родительских (TRUNCATE запрещен для таблиц с внешними ключами)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            for table in reversed(LOAD_ORDER):
+                try:
+                    await cur.execute(f"DELETE FROM {table} WITH (TABLOCK)")
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+
+async def _reseed_identities(pool):
+    """Счетчики IDENTITY возвращаются к максимальному ключу снимка: новые строки получают те же ключи, что после снятия."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            for table in LOAD_ORDER:
+                await cur.execute(IDENTITY_COLUMN_SQL, table)
+                row = await cur.fetchone()
+                if row is None:
+                    continue
+                await cur.execute(f"SELECT COALESCE(MAX({_quote(row[0])}), 0) FROM {table}")
+                max_key = (await cur.fetchone())[0]
+                await cur.execute(f"DBCC CHECKIDENT ('{table}', RESEED, {int(max_key)}) WITH NO_INFOMSGS")
+            await conn.commit()
+
+
+async def restore_files(pool, directory, server_directory=None, streams=BULK_LOAD_STREAMS,
+                        batch_rows=BULK_LOAD_BATCH_ROWS, use_fast_load=False):
+    """Очищает таблицы и загружает снимок directory через BULK INSERT."""
+    started = time.perf_counter()
+    tables = read_manifest(directory)
+    unpacked = await _unpack_partitions(directory, tables, streams)
+    try:
+        await _clear_tables(pool)
+        fast_load = FastLoad(pool, FAST_LOAD_TABLES, FAST_LOAD_REBUILD_STREAMS, FAST_LOAD_RECOVERY_MODEL,
+                         FAST_LOAD_STATE_PATH)
+        if use_fast_load:
+            await fast_load.prepare()
+        timings = await load_directory(pool, directory, server_directory, streams, batch_rows)
+        if use_fast_load:
+            await fast_load.finish()
+            fast_load.print_report()
+        await _reseed_identities(pool)
+    finally:
+        # Распакованные копии нужны только на время BULK INSERT
+        for path in unpacked:
+            os.remove(path)
+    total_rows = sum(rows for rows, _ in timings.values())
+    print(f"Restored {total_rows} rows from {directory} in {time.perf_counter() - started:.2f}s.")
+    return timings
+
+
+#  Снимок базы SQL Server
+
+async def _connect_autocommit():
+    # CREATE/RESTORE DATABASE нельзя выполнять внутри транзакции
+    return await aioodbc.connect(dsn=DB_CONN_STR, autocommit=True)
+
+
+async def _fetch_scalar_list(cur, sql, *params):
+    await cur.execute(sql, *params)
+    return [row[0] for row in await cur.fetchall()]
+
+
+async def capture_database(snapshot_name=SNAPSHOT_DATABASE_NAME):
+    """Создает (или пересоздает) снимок текущей базы. Возвращает имя снимка."""
+    conn = await _connect_autocommit()
+    try:
+        async with conn.cursor() as cur:
+            database = (await _fetch_scalar_list(cur, "SELECT DB_NAME()"))[0]
+            snapshot_name = snapshot_name or f"{database}_snapshot"
+            if snapshot_name in await _fetch_scalar_list(cur, DATABASE_SNAPSHOTS_SQL):
+                await cur.execute(f"DROP DATABASE {_quote(snapshot_name)}")
+            elif await _fetch_scalar_list(cur, "SELECT name FROM sys.databases WHERE name = ?", snapshot_name):
+                raise ValueError(f"Database {snapshot_name} exists and is not a snapshot of {database}")
+            await cur.execute(DATA_FILES_SQL)
+            # Разреженный файл снимка - рядом с файлом данных, на стороне сервера
+            files = ", ".join(
+                f"(NAME = {_quote(name)}, FILENAME = '{ntpath.splitext(path)[0]}_{snapshot_name}.ss')"
+                for name, path in await cur.fetchall()
+            )
+            started = time.perf_counter()
+            await cur.execute(f"CREATE DATABASE {_quote(snapshot_name)} ON {files} AS SNAPSHOT OF {_quote(database)}")
+    finally:
+        await conn.close()
+    print(f"Database snapshot {snapshot_name} of {database} created in {time.perf_counter() - started:.2f}s.")
+    return snapshot_name
+
+
+async def restore_database(snapshot_name=SNAPSHOT_DATABASE_NAME):
+    """Возвращает текущую базу к снимку. Остальные снимки базы должны быть удалены заранее."""
+    conn = await _connect_autocommit()
+    try:
+        async with conn.cursor() as cur:
+            database = (await _fetch_scalar_list(cur, "SELECT DB_NAME()"))[0]
+            snapshot_name = snapshot_name or f"{database}_snapshot"
+            snapshots = await _fetch_scalar_list(cur, DATABASE_SNAPSHOTS_SQL)
+            if snapshot_name not in snapshots:
+                raise ValueError(f"No database snapshot {snapshot_name} of {database}; capture it first")
+            others = [name for name in snapshots if name != snapshot_name]
+            if others:
+                raise ValueError(f"RESTORE FROM DATABASE_SNAPSHOT requires a single snapshot; drop {', '.join(others)}")
+            started = time.perf_counter()
+            # Возврат требует монопольного доступа: остальные сессии базы обрываются
+            await cur.execute("USE master")
+            await cur.execute(f"ALTER DATABASE {_quote(database)} SET SINGLE_USER WITH ROLLBACK IMMEDIATE")
+            try:
+                await cur.execute(f"RESTORE DATABASE {_quote(database)} FROM DATABASE_SNAPSHOT = '{snapshot_name}'")
+            finally:
+                await cur.execute(f"ALTER DATABASE {_quote(database)} SET MULTI_USER")
+    finally:
+        await conn.close()
+    print(f"Database {database} reverted to snapshot {snapshot_name} in {time.perf_counter() - started:.2f}s.")
+
+
+async def capture_snapshot(pool, mode=SNAPSHOT_MODE, directory=SNAPSHOT_DIR):
+    """Снимок после прогона генератора (generate_data.py --snapshot)."""
+    if mode == MODE_DATABASE:
+        await capture_database()
+    else:
+        await capture_files(pool, directory)
+
+
+async def main_snapshot(action, mode, directory, server_directory, streams, use_fast_load=False):
+    start_time = time.time()
+    print(f"[{datetime.datetime.now()}] Snapshot {action} ({mode}) started.")
+    succeeded = False   # Код возврата 1, если снимок не снят или не восстановлен
+    if mode == MODE_DATABASE:
+        try:
+            if action == "capture":
+                await capture_database()
+            else:
+                await restore_database()
+            succeeded = True
+        except Exception as e:
+            print(f"Error in main_snapshot: {e}")
+            traceback.print_exc()
+        print(f"[{datetime.datetime.now()}] Script finished. Total time: {time.time() - start_time:.2f}s.")
+        return succeeded
+    pool = await aioodbc.create_pool(dsn=DB_CONN_STR, minsize=1,
+                                     maxsize=max(streams, FAST_LOAD_REBUILD_STREAMS) + 1, autocommit=False)
+    try:
+        if action == "capture":
+            await capture_files(pool, directory, streams=streams)
+        else:
+            await restore_files(pool, directory, server_directory, streams, use_fast_load=use_fast_load)
+        succeeded = True
+    except Exception as e:
+        print(f"Error in main_snapshot: {e}")
+        traceback.print_exc()
+    finally:
+        pool.close()
+        await pool.wait_closed()
+    print(f"[{datetime.datetime.now()}] Script finished. Total time: {time.time() - start_time:.2f}s.")
+    return succeeded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Capture the generated dataset or reset the database to it.")
+    parser.add_argument("action", choices=("capture", "restore"))
+    parser.add_argument("--mode", choices=(MODE_FILES, MODE_DATABASE), default=SNAPSHOT_MODE,
+                        help="compressed table files reloaded with BULK INSERT, or a SQL Server database snapshot")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR, help="snapshot directory for --mode files")
+    parser.add_argument("--server-dir", default=None,
+                        help="the same directory as seen by SQL Server (defaults to the local absolute path)")
+    parser.add_argument("--streams", type=int, default=BULK_LOAD_STREAMS,
+                        help="tables captured / partitions loaded in parallel")
+    parser.add_argument("--fast-load", action="store_true",
+                        help="on restore, disable nonclustered indexes and constraints of FAST_LOAD_TABLES during the load")
+    args = parser.parse_args()
+    try:
+        succeeded = asyncio.run(main_snapshot(args.action, args.mode, args.dir, args.server_dir, args.streams,
+                                              args.fast_load))
+    except KeyboardInterrupt:
+        print("\nSnapshot interrupted.")
+        succeeded = False
+    except Exception as e_main:
+        print(f"Unhandled exception in __main__: {e_main}")
+        traceback.print_exc()
+        succeeded = False
+    raise SystemExit(0 if succeeded else 1)
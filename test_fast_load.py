@@ -0,0 +1,205 @@
+# test_fast_load.py
+# Последовательность операторов режима быстрой загрузки (fast_load.py) на
+# записывающем фейковом пуле: каталог (индексы, ограничения, модель
+# восстановления) задается словарем, а каждый оператор попадает в журнал.
+# Запуск: python -m unittest test_fast_load  (или python -m pytest)
+import asyncio
+import os
+import tempfile
+import unittest
+
+from fast_load import CONSTRAINTS_SQL, NONCLUSTERED_INDEXES_SQL, RECOVERY_MODEL_SQL, FastLoad
+
+
+class RecordingCursor:
+    def __init__(self, pool):
+        self.pool = pool
+        self.rows = []
+
+    async def execute(self, sql, *params):
+        self.pool.log.append(sql)
+        self.pool.autocommit_log.append(self.pool.current_autocommit)
+        self.rows = self.pool.catalog(sql, params)
+
+    async def fetchall(self):
+        return self.rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    @property
+    def autocommit(self):
+        return self.pool.current_autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self.pool.current_autocommit = value
+
+    def cursor(self):
+        return RecordingCursor(self.pool)
+
+    async def commit(self):
+        pass
+
+
+class _Acquire:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def __aenter__(self):
+        return RecordingConnection(self.pool)
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+class RecordingPool:
+    """
+    indexes / constraints - {таблица: [[имя, отключен(, непроверен)], ...]}; ALTER INDEX ... DISABLE,
+    REBUILD и ALTER TABLE ... CHECK меняют их, как сервер, - finish() видит результат prepare().
+    """
+
+    def __init__(self, indexes, constraints, recovery_model="FULL"):
+        self.indexes = indexes
+        self.constraints = constraints
+        self.recovery_model = recovery_model
+        self.log = []
+        self.autocommit_log = []
+        self.current_autocommit = False
+
+    def acquire(self):
+        return _Acquire(self)
+
+    def catalog(self, sql, params):
+        if sql == NONCLUSTERED_INDEXES_SQL:
+            return [tuple(index) for index in self.indexes.get(params[0], [])]
+        if sql == CONSTRAINTS_SQL:
+            return [tuple(constraint) for constraint in self.constraints.get(params[0], [])]
+        if sql == RECOVERY_MODEL_SQL:
+            return [(self.recovery_model,)]
+        for table, indexes in self.indexes.items():
+            for index in indexes:
+                if sql.startswith(f"ALTER INDEX [{index[0]}] ON {table} "):
+                    index[1] = sql.endswith("DISABLE")
+        for table, constraints in self.constraints.items():
+            for constraint in constraints:
+                if sql.startswith(f"ALTER TABLE {table} NOCHECK CONSTRAINT [{constraint[0]}]"):
+                    constraint[1:] = [True, True]
+                elif sql.startswith(f"ALTER TABLE {table} WITH CHECK CHECK CONSTRAINT [{constraint[0]}]"):
+                    constraint[1:] = [False, False]
+        if sql.startswith("ALTER DATABASE CURRENT SET RECOVERY "):
+            self.recovery_model = sql.rsplit(" ", 1)[1]
+        return []
+
+    def statements(self):
+        """Журнал без запросов к каталогу."""
+        return [sql for sql in self.log if sql.startswith("ALTER ")]
+
+
+def make_pool():
+    return RecordingPool(
+        indexes={
+            "dbo.Booking": [["IX_Booking_Client", False], ["IX_Booking_Date", True]],
+            "dbo.Orders": [["IX_Orders_Booking", False]],
+        },
+        constraints={
+            "dbo.Booking": [["FK_Booking_Client", False, False], ["FK_Booking_Table", False, True]],
+            "dbo.Orders": [["FK_Orders_Booking", False, False]],
+        },
+    )
+
+
+class FastLoadSequenceTest(unittest.TestCase):
+    def test_prepare_disables_enabled_indexes_and_constraints(self):
+        pool = make_pool()
+        loader = FastLoad(pool, ("dbo.Booking", "dbo.Orders"))
+        asyncio.run(loader.prepare())
+        self.assertEqual(pool.statements(), [
+            "ALTER DATABASE CURRENT SET RECOVERY BULK_LOGGED",
+            "ALTER INDEX [IX_Booking_Client] ON dbo.Booking DISABLE",
+            "ALTER TABLE dbo.Booking NOCHECK CONSTRAINT [FK_Booking_Client]",
+            "ALTER TABLE dbo.Booking NOCHECK CONSTRAINT [FK_Booking_Table]",
+            "ALTER INDEX [IX_Orders_Booking] ON dbo.Orders DISABLE",
+            "ALTER TABLE dbo.Orders NOCHECK CONSTRAINT [FK_Orders_Booking]",
+        ])
+
+    def test_finish_rebuilds_revalidates_and_restores_recovery_model(self):
+        pool = make_pool()
+        loader = FastLoad(pool, ("dbo.Booking", "dbo.Orders"), rebuild_streams=1)
+        asyncio.run(loader.prepare())
+        del pool.log[:]
+        asyncio.run(loader.finish())
+        self.assertEqual(pool.statements(), [
+            "ALTER INDEX [IX_Booking_Client] ON dbo.Booking REBUILD WITH (SORT_IN_TEMPDB = ON)",
+            "ALTER INDEX [IX_Booking_Date] ON dbo.Booking REBUILD WITH (SORT_IN_TEMPDB = ON)",
+            "ALTER INDEX [IX_Orders_Booking] ON dbo.Orders REBUILD WITH (SORT_IN_TEMPDB = ON)",
+            "ALTER TABLE dbo.Booking WITH CHECK CHECK CONSTRAINT [FK_Booking_Client]",
+            "ALTER TABLE dbo.Booking WITH CHECK CHECK CONSTRAINT [FK_Booking_Table]",
+            "ALTER TABLE dbo.Orders WITH CHECK CHECK CONSTRAINT [FK_Orders_Booking]",
+            "ALTER DATABASE CURRENT SET RECOVERY FULL",
+        ])
+        self.assertEqual(pool.recovery_model, "FULL")
+
+    def test_ddl_runs_outside_a_transaction(self):
+        pool = make_pool()
+        loader = FastLoad(pool, ("dbo.Booking", "dbo.Orders"))
+        asyncio.run(loader.prepare())
+        asyncio.run(loader.finish())
+        for sql, autocommit in zip(pool.log, pool.autocommit_log):
+            self.assertEqual(autocommit, sql.startswith("ALTER "), sql)
+        self.assertFalse(pool.current_autocommit)
+
+    def test_finish_is_repeatable_from_the_catalog(self):
+        # --fast-load-finish после сбоя: новый объект без истории prepare()
+        pool = make_pool()
+        asyncio.run(FastLoad(pool, ("dbo.Booking", "dbo.Orders"), recovery_model=None).prepare())
+        del pool.log[:]
+        asyncio.run(FastLoad(pool, ("dbo.Booking", "dbo.Orders"), recovery_model=None).finish())
+        self.assertEqual(len(pool.statements()), 6)
+        del pool.log[:]
+        asyncio.run(FastLoad(pool, ("dbo.Booking", "dbo.Orders"), recovery_model=None).finish())
+        self.assertEqual(pool.statements(), [])
+
+    def test_new_instance_restores_recovery_model_saved_by_prepare(self):
+        # Процесс упал после prepare(): --fast-load-finish берет исходную модель из файла состояния
+        pool = make_pool()
+        with tempfile.TemporaryDirectory() as directory:
+            state_path = os.path.join(directory, "fast_load_state.txt")
+            asyncio.run(FastLoad(pool, ("dbo.Booking", "dbo.Orders"), state_path=state_path).prepare())
+            self.assertEqual(pool.recovery_model, "BULK_LOGGED")
+            self.assertTrue(os.path.exists(state_path))
+            del pool.log[:]
+            asyncio.run(FastLoad(pool, ("dbo.Booking", "dbo.Orders"), state_path=state_path).finish())
+            self.assertEqual(pool.statements()[-1], "ALTER DATABASE CURRENT SET RECOVERY FULL")
+            self.assertEqual(pool.recovery_model, "FULL")
+            self.assertFalse(os.path.exists(state_path))
+
+    def test_repeated_prepare_keeps_saved_recovery_model(self):
+        # Повторный prepare() видит BULK_LOGGED прошлого прогона и не должен затереть FULL в файле
+        pool = make_pool()
+        with tempfile.TemporaryDirectory() as directory:
+            state_path = os.path.join(directory, "fast_load_state.txt")
+            asyncio.run(FastLoad(pool, ("dbo.Booking",), state_path=state_path).prepare())
+            asyncio.run(FastLoad(pool, ("dbo.Booking",), state_path=state_path).prepare())
+            asyncio.run(FastLoad(pool, ("dbo.Booking",), state_path=state_path).finish())
+            self.assertEqual(pool.recovery_model, "FULL")
+
+    def test_simple_recovery_model_is_left_alone(self):
+        pool = make_pool()
+        pool.recovery_model = "SIMPLE"
+        loader = FastLoad(pool, ("dbo.Booking",))
+        asyncio.run(loader.prepare())
+        asyncio.run(loader.finish())
+        self.assertFalse(any("SET RECOVERY" in sql for sql in pool.log))
+
+
+if __name__ == "__main__":
+    unittest.main()
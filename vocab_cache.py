@@ -0,0 +1,97 @@
+# vocab_cache.py
+# Режим "словаря": вместо вызовов Faker на каждую строку один раз строятся пулы
+# имен, телефонов, email, названий, адресов, блюд и комментариев (уже обрезанные
+# до длин столбцов), а строки собираются выборкой по индексам из этих пулов.
+# Пулы сохраняются на диск, поэтому следующие запуски стартуют сразу.
+import datetime
+import os
+import pickle
+import random
+from faker import Faker
+
+from row_synth import CUISINES, decade_window
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен: без него индексы выбираются через random
+    np = None
+
+VOCAB_FORMAT_VERSION = 1
+
+
+def build_vocabulary(pool_size, seed, max_lens):
+    """Строит пулы значений Faker; обрезка по max_lens выполняется здесь, один раз."""
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    return {
+        "client_name": [fake.name()[:max_lens["client_name"]] for _ in range(pool_size)],
+        "client_phone": [fake.msisdn()[:max_lens["client_phone"]] for _ in range(pool_size)],
+        "client_email": [fake.email()[:max_lens["client_email"]] for _ in range(pool_size)],
+        "restaurant_name": [fake.company()[:max_lens["restaurant_name"]] for _ in range(pool_size)],
+        "restaurant_addres": [fake.address().replace("\n", ", ")[:max_lens["restaurant_addres"]] for _ in range(pool_size)],
+        "restaurant_cuisine": [c[:max_lens["restaurant_cuisine"]] for c in CUISINES],
+        "menu_dishname": [fake.word().capitalize()[:max_lens["menu_dishname"]] for _ in range(pool_size)],
+        "review_comment": [fake.text(max_nb_chars=max_lens["review_comment"])[:max_lens["review_comment"]] for _ in range(pool_size)],
+    }
+
+
+def load_or_build_vocabulary(path, pool_size, seed, max_lens):
+    """Загружает пулы из path, если они построены с теми же параметрами, иначе строит и сохраняет."""
+    params = {"version": VOCAB_FORMAT_VERSION, "pool_size": pool_size, "seed": seed, "max_lens": max_lens}
+    if path and os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("params") == params:
+                print(f"  Loaded vocabulary cache from {path}.")
+                return cached["pools"]
+            print(f"  Vocabulary cache {path} was built with other parameters, rebuilding.")
+        except Exception as e:
+            print(f"  Could not read vocabulary cache {path}: {e}. Rebuilding.")
+
+    print(f"  Building vocabulary pools ({pool_size} values each)...")
+    pools = build_vocabulary(pool_size, seed, max_lens)
+    if path:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"params": params, "pools": pools}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        print(f"  Vocabulary cache saved to {path}.")
+    return pools
+
+
+def _pick(pool, count, rng, np_rng):
+    if np_rng is not None:
+        return [pool[i] for i in np_rng.integers(0, len(pool), size=count).tolist()]
+    return rng.choices(pool, k=count)
+
+
+def _decade_datetimes(count, rng, np_rng, reference_time):
+    # То же окно, что у row_synth: от начала десятилетия до "сейчас" прогона
+    decade_start, end = decade_window(reference_time)
+    span_seconds = int((end - decade_start).total_seconds())
+    if np_rng is not None:
+        offsets = np_rng.integers(0, span_seconds + 1, size=count).tolist()
+    else:
+        offsets = [rng.randint(0, span_seconds) for _ in range(count)]
+    return [decade_start + datetime.timedelta(seconds=s) for s in offsets]
+
+
+def sample_chunk(pools, kind, count, seed, reference_time):
+    """Собирает count кортежей полей той же формы, что row_synth.synthesize_chunk, выборкой из пулов."""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed) if np is not None else None
+    if kind == "client":
+        return list(zip(_pick(pools["client_name"], count, rng, np_rng),
+                        _pick(pools["client_phone"], count, rng, np_rng),
+                        _pick(pools["client_email"], count, rng, np_rng),
+                        _decade_datetimes(count, rng, np_rng, reference_time)))
+    if kind == "restaurant":
+        return list(zip(_pick(pools["restaurant_name"], count, rng, np_rng),
+                        _pick(pools["restaurant_addres"], count, rng, np_rng),
+                        _pick(pools["restaurant_cuisine"], count, rng, np_rng)))
+    if kind == "menu":
+        return [(name,) for name in _pick(pools["menu_dishname"], count, rng, np_rng)]
+    if kind == "review":
+        return [(comment,) for comment in _pick(pools["review_comment"], count, rng, np_rng)]
+    raise ValueError(f"Unknown synthesis kind: {kind}")